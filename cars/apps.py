@@ -6,5 +6,14 @@ class CarsConfig(AppConfig):
     name = 'cars'
 
     def ready(self):
+        from django.core import checks
+
+        from cars.utils.stats_refresh import check_refresh_cache
+
+        checks.register(check_refresh_cache)
+
         # Регистрируем сигналы при старте приложения
-        import cars.signals.audit_signals  # noqa
\ No newline at end of file
+        import cars.signals.audit_signals  # noqa
+        import cars.signals.counter_signals  # noqa
+        import cars.signals.refresh_signals  # noqa
+        import cars.signals.fingerprint_signals  # noqa
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cars.utils.audit_queue import audit_queue_metrics, consume_audit_queue, get_audit_queue
+
+
+class Command(BaseCommand):
+    help = "Состояние очереди аудита (AUDIT_ASYNC) и ее ручной разбор"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', action='store_true',
+                            help="Перенести записи из очереди в AuditLog без Celery")
+
+    def handle(self, *args, **options):
+        audit_queue = get_audit_queue()
+        if options['drain']:
+            result = consume_audit_queue(audit_queue)
+            self.stdout.write(self.style.SUCCESS(
+                f"Сохранено записей: {result['written']} (порций: {result['batches']})"
+            ))
+
+        metrics = audit_queue_metrics(audit_queue)
+        for name in ('depth', 'oldest_age_seconds', 'enqueued', 'written', 'backpressure'):
+            self.stdout.write(f"{name}: {metrics.get(name, 0)}")
+        if metrics['oldest_age_seconds'] > settings.AUDIT_LAG_WARNING_SECONDS:
+            self.stdout.write(self.style.WARNING("Потребитель очереди аудита отстает"))
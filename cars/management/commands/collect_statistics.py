@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from cars.utils.task_lock import run_metrics
+from cars_project.tasks import STATISTICS_LOCK, collect_and_save_stats
+
+
+class Command(BaseCommand):
+    help = "Внеплановый расчет статистики (объединяется с уже идущим расчетом)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Пересчитать, даже если каталог не менялся")
+        parser.add_argument('--metrics', action='store_true',
+                            help="Только показать счетчики блокировки расчета")
+
+    def handle(self, *args, **options):
+        if not options['metrics']:
+            result = collect_and_save_stats.delay(full=options['full'])
+            self.stdout.write(self.style.SUCCESS(f"Расчет статистики поставлен в очередь: {result.id}"))
+
+        metrics = run_metrics(STATISTICS_LOCK)
+        for name in ('runs', 'waits', 'wait_seconds', 'skipped', 'follow_ups'):
+            self.stdout.write(f"{name}: {metrics.get(name, 0)}")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from cars.utils.statistics_retention import compact_statistics
+
+
+class Command(BaseCommand):
+    help = "Прореживание истории снимков статистики и перевод старых снимков в дельты"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-days', type=int, default=None,
+                            help="Сколько дней хранить все снимки (по умолчанию из настроек)")
+        parser.add_argument('--daily-days', type=int, default=None,
+                            help="Сколько дней хранить дневные снимки (по умолчанию из настроек)")
+
+    def handle(self, *args, **options):
+        report = compact_statistics(raw_days=options['raw_days'], daily_days=options['daily_days'])
+
+        self.stdout.write(f"Удалено снимков: {report['rows_deleted']}")
+        self.stdout.write(f"Свернуто в дневные/недельные: {report['rows_rolled_up']}")
+        self.stdout.write(f"Переведено в дельты: {report['rows_delta_encoded']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Объем JSON: {report['bytes_before']} -> {report['bytes_after']} байт "
+            f"(освобождено {report['bytes_reclaimed']})"
+        ))
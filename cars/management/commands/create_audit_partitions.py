@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.utils.audit_partitions import ensure_partitions, list_partitions, partitioning_enabled
+
+
+class Command(BaseCommand):
+    help = "Создание помесячных разделов журнала аудита (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help="На сколько месяцев вперед создать разделы (по умолчанию из настроек)")
+
+    def handle(self, *args, **options):
+        if not partitioning_enabled():
+            raise CommandError("Журнал аудита не секционирован (нужен PostgreSQL и миграция 0009)")
+
+        created = ensure_partitions(months_ahead=options['months'])
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f"Создан раздел {name}"))
+
+        partitions = list_partitions()
+        self.stdout.write(f"Разделов в базе: {len(partitions['attached'])}")
+        if partitions['detached']:
+            self.stdout.write(self.style.WARNING(
+                f"Отключены, но не заархивированы: {', '.join(partitions['detached'].values())}"
+            ))
+        if partitions['default_rows']:
+            self.stdout.write(self.style.WARNING(
+                f"Строк в разделе по умолчанию: {partitions['default_rows']}"
+            ))
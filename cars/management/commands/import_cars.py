@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.utils.audit_summary import audit_summary
+from cars.utils.bulk_import import CarBulkImporter, serialize_results
+from cars.utils.copy_import import PostgresCopyImporter
+from cars.utils.delta_import import DeltaCarImporter
+from cars.utils.parallel_import import run_parallel_import
+from cars.utils.xml_stream import iter_modifications
+
+
+class Command(BaseCommand):
+    help = "Импорт XML каталога в текущем процессе (для разработки и замеров движков)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к XML файлу")
+        parser.add_argument('--engine', choices=('orm', 'copy'), default='orm',
+                            help="orm - пакетный bulk_create, copy - COPY в staging таблицу PostgreSQL")
+        parser.add_argument('--delta', action='store_true',
+                            help="Пропускать записи с неизменившимся отпечатком")
+        parser.add_argument('--shards', type=int, default=1,
+                            help="Количество шардов для пула процессов (только engine=orm)")
+        parser.add_argument('--chunk-size', type=int, default=CarBulkImporter.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        engine = options['engine']
+        if engine == 'copy' and (options['delta'] or options['shards'] > 1):
+            raise CommandError("--engine=copy не совместим с --delta и --shards")
+
+        start_time = time.time()
+
+        with audit_summary(options['path']) as summary:
+            if engine == 'copy':
+                results = PostgresCopyImporter().import_records(iter_modifications(options['path']))
+            elif options['shards'] > 1:
+                results = run_parallel_import(
+                    options['path'], options['shards'],
+                    chunk_size=options['chunk_size'], delta=options['delta']
+                )
+            else:
+                importer_class = DeltaCarImporter if options['delta'] else CarBulkImporter
+                importer = importer_class(chunk_size=options['chunk_size'])
+                results = importer.import_records(
+                    iter_modifications(options['path'], digest=options['delta'])
+                )
+            summary.results = results
+
+        execution_time = time.time() - start_time
+        results = serialize_results(results)
+        self.stdout.write(self.style.SUCCESS(
+            f"Импорт ({engine}) завершен за {execution_time:.2f} с: "
+            f"создано {results['cars_processed']}, пропущено {results['skipped']}, "
+            f"некорректных {results['invalid_entries']}, ошибок {results['errors']}"
+        ))
+        if 'unchanged' in results:
+            self.stdout.write(f"Без изменений (дельта): {results['unchanged']}")
+        self.stdout.write(f"Бренды: {', '.join(results['processed_brands'])}")
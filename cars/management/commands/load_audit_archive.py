@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.utils.audit_partitions import iter_archived_entries, parse_month, restore_archived_month
+
+
+class Command(BaseCommand):
+    help = "Чтение заархивированного месяца журнала аудита или его возврат в базу"
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', help="Месяц в формате YYYY-MM")
+        parser.add_argument('--model', help="Только записи этой модели (model_name)")
+        parser.add_argument('--object-id', type=int, help="Только записи этого объекта")
+        parser.add_argument('--action', help="Только записи с этим действием")
+        parser.add_argument('--archive-dir', default=None,
+                            help="Каталог архива (по умолчанию AUDIT_ARCHIVE_DIR)")
+        parser.add_argument('--restore', action='store_true',
+                            help="Загрузить месяц обратно в базу отдельным разделом")
+
+    def handle(self, *args, **options):
+        try:
+            month = parse_month(options['month'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        try:
+            if options['restore']:
+                rows = restore_archived_month(month, options['archive_dir'])
+                self.stdout.write(self.style.SUCCESS(f"Месяц {month:%Y-%m} восстановлен: {rows} записей"))
+                return
+
+            entries = iter_archived_entries(
+                month, options['archive_dir'],
+                model_name=options['model'], object_id=options['object_id'], action=options['action']
+            )
+            # Вывод в NDJSON, как в файле архива
+            for entry in entries:
+                self.stdout.write(json.dumps(entry, ensure_ascii=False))
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from cars.utils.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчет счетчиков каталога по таблицам и отчет о расхождениях"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Только показать расхождения, не исправляя счетчики")
+
+    def handle(self, *args, **options):
+        fix = not options['dry_run']
+        drift = reconcile_counters(fix=fix)
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Счетчики каталога совпадают с данными"))
+            return
+
+        for scope, object_id, current, expected in drift:
+            self.stdout.write(f"{scope}[{object_id}]: сохранено {current}, ожидается {expected}")
+
+        message = f"Расхождений: {len(drift)}" + (", исправлено" if fix else " (dry run)")
+        self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.utils.write_behind import RedisWriteQueue, WriteCoalescer
+
+
+class Command(BaseCommand):
+    help = "Сброс очереди отложенной записи одиночных JSON запросов порциями"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.CARS_WRITE_BEHIND_BATCH_SIZE,
+                            help="Максимальный размер порции")
+        parser.add_argument('--max-wait', type=float, default=settings.CARS_WRITE_BEHIND_MAX_WAIT,
+                            help="Максимальное ожидание заполнения порции, секунды")
+        parser.add_argument('--consumer', default=settings.CARS_WRITE_BEHIND_CONSUMER,
+                            help="Имя потребителя, уникальное для каждого запущенного процесса; "
+                                 "после перезапуска с тем же именем неподтвержденная порция обрабатывается снова")
+
+    def handle(self, *args, **options):
+        if settings.CARS_WRITE_BEHIND_BACKEND == 'memory':
+            raise CommandError(
+                "Очередь memory сбрасывается внутри web процесса, "
+                "для отдельного потребителя используйте CARS_WRITE_BEHIND_BACKEND=redis"
+            )
+
+        if not options['consumer']:
+            raise CommandError(
+                "Укажите имя потребителя (--consumer или CARS_WRITE_BEHIND_CONSUMER), "
+                "постоянное для процесса и уникальное среди запущенных"
+            )
+
+        write_queue = RedisWriteQueue(settings.CARS_WRITE_BEHIND_REDIS_URL, consumer=options['consumer'])
+        if not write_queue.claim():
+            raise CommandError(f"Потребитель {options['consumer']} уже запущен")
+        coalescer = WriteCoalescer(
+            write_queue, batch_size=options['batch_size'], max_wait=options['max_wait']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Сброс очереди ({write_queue.consumer}): порции до {coalescer.batch_size} записей, "
+            f"ожидание до {coalescer.max_wait} с"
+        ))
+        try:
+            coalescer.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Остановлено")
+        finally:
+            write_queue.release()
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_name_keys(apps, schema_editor):
+    """Заполняет name_key для существующих записей (как normalize_name)"""
+    for model_name in ('Brand', 'CarModel', 'BodyType'):
+        model = apps.get_model('cars', model_name)
+        batch = []
+        for obj in model.objects.only('pk', 'name').iterator(chunk_size=BACKFILL_BATCH_SIZE):
+            obj.name_key = obj.name.strip().casefold() if obj.name else ''
+            batch.append(obj)
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                model.objects.bulk_update(batch, ['name_key'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bodytype',
+            name='name_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='brand',
+            name='name_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='carmodel',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['brand', 'name_key'], name='cars_carmod_brand_i_4222cb_idx'),
+        ),
+    ]
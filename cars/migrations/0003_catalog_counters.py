@@ -0,0 +1,54 @@
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    """Заполняет счетчики по существующим данным (как cars.utils.counters.scan_counters)"""
+    Brand = apps.get_model('cars', 'Brand')
+    CarModel = apps.get_model('cars', 'CarModel')
+    BodyType = apps.get_model('cars', 'BodyType')
+    Car = apps.get_model('cars', 'Car')
+    CatalogCounter = apps.get_model('cars', 'CatalogCounter')
+
+    counters = [
+        CatalogCounter(scope='brands', value=Brand.objects.count()),
+        CatalogCounter(scope='models', value=CarModel.objects.count()),
+        CatalogCounter(scope='cars', value=Car.objects.count()),
+        CatalogCounter(scope='body_types', value=BodyType.objects.count()),
+    ]
+    grouped = (
+        ('brand_cars', Brand.objects.annotate(value=Count('carmodel__car'))),
+        ('brand_models', Brand.objects.annotate(value=Count('carmodel'))),
+        ('body_type_cars', BodyType.objects.annotate(value=Count('car'))),
+    )
+    for scope, queryset in grouped:
+        counters.extend(
+            CatalogCounter(scope=scope, object_id=object_id, value=value)
+            for object_id, value in queryset.order_by().values_list('pk', 'value')
+        )
+    CatalogCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0002_normalized_name_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('brands', 'Total brands'), ('models', 'Total models'), ('cars', 'Total cars'), ('body_types', 'Total body types'), ('brand_cars', 'Cars per brand'), ('brand_models', 'Models per brand'), ('body_type_cars', 'Cars per body type')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField(default=0)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', '-value'], name='cars_catalo_scope_c5fc63_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'object_id'), name='cars_catalogcounter_scope_object_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
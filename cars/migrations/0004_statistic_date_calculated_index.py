@@ -0,0 +1,17 @@
+# Generated by Django 5.1.8 on 2026-10-18 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0003_catalog_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['date_calculated', 'id'], name='cars_statis_date_ca_17ffd9_idx'),
+        ),
+    ]
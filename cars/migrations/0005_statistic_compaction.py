@@ -0,0 +1,24 @@
+# Generated by Django 5.1.8 on 2026-10-18 05:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_statistic_date_calculated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistic',
+            name='base',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='deltas', to='cars.statistic'),
+        ),
+        migrations.AddField(
+            model_name='statistic',
+            name='resolution',
+            field=models.CharField(choices=[('raw', 'Raw'), ('daily', 'Daily rollup'), ('weekly', 'Weekly rollup')], default='raw', max_length=10),
+        ),
+    ]
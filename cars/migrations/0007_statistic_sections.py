@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0005_statistic_compaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistic',
+            name='sections',
+            field=models.JSONField(default=dict),
+        ),
+    ]
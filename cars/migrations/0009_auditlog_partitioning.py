@@ -0,0 +1,108 @@
+# Generated by Django 5.1.8 on 2026-10-18 06:13
+
+from datetime import date, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+TABLE = 'cars_auditlog'
+# Разделы вперед от текущего месяца; дальше их заводит create_audit_partitions
+MONTHS_AHEAD = 3
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _rebuild_table(schema_editor, partitioned):
+    """
+    Пересоздает cars_auditlog секционированной по месяцам timestamp или обычной
+
+    Данные копируются в новую таблицу; внешние ключи, индексы и
+    последовательность id переносятся под прежними именами. Первичный ключ
+    секционированной таблицы обязан включать ключ секционирования, поэтому
+    он (id, timestamp).
+    """
+    old = f'{TABLE}_rebuild'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {old}')
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'", [old]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [old, f'{TABLE}_pkey']
+        )
+        indexes = cursor.fetchall()
+
+        like = f'LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY'
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {TABLE} ({like}) PARTITION BY RANGE ("timestamp")')
+            cursor.execute(f'SELECT min("timestamp") FROM {old}')
+            oldest = cursor.fetchone()[0]
+            month = timezone.now().date().replace(day=1)
+            last = month
+            for _ in range(MONTHS_AHEAD):
+                last = _next_month(last)
+            if oldest is not None:
+                oldest = oldest.astimezone(dt_timezone.utc)
+                month = min(month, date(oldest.year, oldest.month, 1))
+            while month <= last:
+                following = _next_month(month)
+                cursor.execute(
+                    f"CREATE TABLE {TABLE}_y{month.year:04d}m{month.month:02d} PARTITION OF {TABLE} "
+                    f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{following.isoformat()} 00:00:00+00')"
+                )
+                month = following
+            # Страховка на случай, если разделы вперед не созданы вовремя
+            cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+        else:
+            cursor.execute(f'CREATE TABLE {TABLE} ({like})')
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old}')
+        cursor.execute(f'DROP TABLE {old} CASCADE')
+
+        primary_key = 'id, "timestamp"' if partitioned else 'id'
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({primary_key})')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+        for name, definition in indexes:
+            cursor.execute(definition.replace(f'.{old} ', f'.{TABLE} '))
+
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT setval(%s, coalesce(max(id), 0) + 1, false) FROM {TABLE}', [sequence])
+        if sequence.split('.')[-1] != f'{TABLE}_id_seq':
+            cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO {TABLE}_id_seq')
+
+
+def partition_auditlog(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    _rebuild_table(schema_editor, partitioned=True)
+
+
+def unpartition_auditlog(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    _rebuild_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0008_auditlog_event_timestamp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_auditlog, unpartition_auditlog),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='cars_auditl_timesta_91e500_idx'),
+        ),
+    ]
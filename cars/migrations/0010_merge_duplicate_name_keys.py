@@ -0,0 +1,139 @@
+from django.db import migrations
+from django.db.models import Count
+from django.utils import timezone
+
+
+def _duplicate_groups(queryset, fields):
+    """Группы id с одинаковыми значениями fields, первым идет наименьший id"""
+    keys = queryset.values(*fields).annotate(n=Count('pk')).filter(n__gt=1).values_list(*fields)
+    for key in keys:
+        ids = list(queryset.filter(**dict(zip(fields, key))).order_by('pk').values_list('pk', flat=True))
+        yield ids[0], ids[1:]
+
+
+def _move_cars(Car, field, keeper, duplicates, other, deleted):
+    """
+    Переносит автомобили дублей на keeper
+
+    Автомобиль, для которого у keeper уже есть пара по полю other,
+    удаляется: иначе нарушилась бы уникальность (model, body_type). Его
+    отпечаток дельта-импорта остается верным: ключ отпечатка строится
+    по нормализованной тройке, а она совпадает с тройкой оставшегося
+    автомобиля.
+    """
+    taken = set(Car.objects.filter(**{field: keeper}).values_list(other, flat=True))
+    for car_id, value in Car.objects.filter(**{f'{field}__in': duplicates}).order_by('pk').values_list('pk', other):
+        if value is not None and value in taken:
+            Car.objects.filter(pk=car_id).delete()
+            deleted.append(car_id)
+        else:
+            taken.add(value)
+            Car.objects.filter(pk=car_id).update(**{field: keeper})
+
+
+def _merge_models(CarModel, Car, keeper, duplicates, deleted):
+    _move_cars(Car, 'model_id', keeper, duplicates, 'body_type_id', deleted)
+    CarModel.objects.filter(pk__in=duplicates).delete()
+
+
+def _recount(apps):
+    """
+    Пересчитывает счетчики каталога по таблицам
+
+    Слияние идет через исторические модели без сигналов, поэтому счетчики
+    строятся заново теми же запросами, что и в reconcile_counters.
+    """
+    Brand = apps.get_model('cars', 'Brand')
+    CarModel = apps.get_model('cars', 'CarModel')
+    BodyType = apps.get_model('cars', 'BodyType')
+    Car = apps.get_model('cars', 'Car')
+    CatalogCounter = apps.get_model('cars', 'CatalogCounter')
+
+    counters = {
+        ('brands', 0): Brand.objects.count(),
+        ('models', 0): CarModel.objects.count(),
+        ('cars', 0): Car.objects.count(),
+        ('body_types', 0): BodyType.objects.count(),
+    }
+    grouped = (
+        ('brand_cars', Brand.objects.annotate(value=Count('carmodel__car'))),
+        ('brand_models', Brand.objects.annotate(value=Count('carmodel'))),
+        ('body_type_cars', BodyType.objects.annotate(value=Count('car'))),
+    )
+    for scope, queryset in grouped:
+        for object_id, value in queryset.order_by().values_list('pk', 'value'):
+            counters[(scope, object_id)] = value
+
+    CatalogCounter.objects.all().delete()
+    CatalogCounter.objects.bulk_create(
+        [CatalogCounter(scope=scope, object_id=object_id, value=value)
+         for (scope, object_id), value in counters.items()],
+        batch_size=1000
+    )
+
+
+def merge_duplicate_name_keys(apps, schema_editor):
+    """
+    Объединяет записи, различающиеся только регистром или пробелами имени
+
+    Остается запись с наименьшим id (как при прежнем разрешении дублей в
+    импорте), связи дублей переносятся на нее. Сигналы при этом не
+    отправляются, поэтому счетчики каталога пересчитываются здесь же, а
+    в журнал аудита пишется одна запись со всеми объединенными id.
+    Отменить слияние нельзя: обратная операция ничего не делает.
+    """
+    Brand = apps.get_model('cars', 'Brand')
+    CarModel = apps.get_model('cars', 'CarModel')
+    BodyType = apps.get_model('cars', 'BodyType')
+    Car = apps.get_model('cars', 'Car')
+    AuditLog = apps.get_model('cars', 'AuditLog')
+    merged = {'BodyType': {}, 'Brand': {}, 'CarModel': {}}
+    deleted_cars = []
+
+    for keeper, duplicates in _duplicate_groups(BodyType.objects.all(), ['name_key']):
+        _move_cars(Car, 'body_type_id', keeper, duplicates, 'model_id', deleted_cars)
+        BodyType.objects.filter(pk__in=duplicates).delete()
+        merged['BodyType'][keeper] = duplicates
+
+    for keeper, duplicates in _duplicate_groups(Brand.objects.all(), ['name_key']):
+        models = dict(CarModel.objects.filter(brand_id=keeper).values_list('name_key', 'pk'))
+        for model_id, key in CarModel.objects.filter(brand_id__in=duplicates).order_by('pk').values_list('pk', 'name_key'):
+            if key in models:
+                _merge_models(CarModel, Car, models[key], [model_id], deleted_cars)
+                merged['CarModel'][models[key]] = [*merged['CarModel'].get(models[key], []), model_id]
+            else:
+                models[key] = model_id
+                CarModel.objects.filter(pk=model_id).update(brand_id=keeper)
+        Brand.objects.filter(pk__in=duplicates).delete()
+        merged['Brand'][keeper] = duplicates
+
+    for keeper, duplicates in _duplicate_groups(CarModel.objects.all(), ['brand_id', 'name_key']):
+        _merge_models(CarModel, Car, keeper, duplicates, deleted_cars)
+        merged['CarModel'][keeper] = [*merged['CarModel'].get(keeper, []), *duplicates]
+
+    if not any(merged.values()):
+        return
+
+    _recount(apps)
+    AuditLog.objects.create(
+        model_name='Migration',
+        action='merge_duplicate_name_keys',
+        # Оставшийся id -> id объединенных с ним записей
+        changes={
+            'merged': {name: {str(keeper): ids for keeper, ids in groups.items()}
+                       for name, groups in merged.items()},
+            'deleted_cars': deleted_cars,
+        },
+        timestamp=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_auditlog_partitioning'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_name_keys, migrations.RunPython.noop),
+    ]
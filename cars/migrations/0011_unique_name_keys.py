@@ -0,0 +1,31 @@
+# Generated by Django 5.1.8 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0010_merge_duplicate_name_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='carmodel',
+            name='cars_carmod_brand_i_4222cb_idx',
+        ),
+        migrations.AlterField(
+            model_name='bodytype',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=50, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='carmodel',
+            constraint=models.UniqueConstraint(fields=('brand', 'name_key'), name='cars_carmodel_brand_name_key_uniq'),
+        ),
+    ]
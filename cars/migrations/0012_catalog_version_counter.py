@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0011_unique_name_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='catalogcounter',
+            name='scope',
+            field=models.CharField(choices=[('brands', 'Total brands'), ('models', 'Total models'), ('cars', 'Total cars'), ('body_types', 'Total body types'), ('brand_cars', 'Cars per brand'), ('brand_models', 'Models per brand'), ('body_type_cars', 'Cars per body type'), ('catalog_version', 'Catalog version')], max_length=20),
+        ),
+    ]
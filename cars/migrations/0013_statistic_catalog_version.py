@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0012_catalog_version_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistic',
+            name='catalog_version',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
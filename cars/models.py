@@ -1,12 +1,33 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from cars.utils.json_merge import apply_merge_patch
 
 
 User = get_user_model()
 
 
-class Brand(models.Model):
+def normalize_name(value):
+    """Канонический ключ имени для регистронезависимого поиска по индексу"""
+    return value.strip().casefold() if value else ''
+
+
+class NormalizedNameMixin:
+    """Заполняет name_key из name при каждом сохранении"""
+
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_key'}
+        super().save(*args, **kwargs)
+
+
+class Brand(NormalizedNameMixin, models.Model):
     name = models.CharField(max_length=50, unique=True)
+    # Регистронезависимая уникальность, цель ON CONFLICT при импорте
+    name_key = models.CharField(max_length=50, unique=True, editable=False)
 
     class Meta:
         verbose_name = "Brand"
@@ -16,16 +37,21 @@ class Brand(models.Model):
         return self.name
 
 
-class CarModel(models.Model):
+class CarModel(NormalizedNameMixin, models.Model):
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
+    name_key = models.CharField(max_length=100, editable=False)
 
     class Meta:
         unique_together = ('brand', 'name')  # Уникальная пара бренд+модель
+        constraints = [
+            models.UniqueConstraint(fields=['brand', 'name_key'], name='cars_carmodel_brand_name_key_uniq')
+        ]
 
 
-class BodyType(models.Model):
+class BodyType(NormalizedNameMixin, models.Model):
     name = models.CharField(max_length=50, unique=True)
+    name_key = models.CharField(max_length=50, unique=True, editable=False)
 
 
 class Configuration(models.Model):
@@ -41,15 +67,149 @@ class Car(models.Model):
         unique_together = ('model', 'body_type')  # Уникальная комбинация
 
 class Statistic(models.Model):
+    RESOLUTION_CHOICES = [
+        ('raw', 'Raw'),
+        ('daily', 'Daily rollup'),
+        ('weekly', 'Weekly rollup')
+    ]
+
     json_statistics = models.JSONField()  # Поле для хранения статистики в формате JSON
     date_calculated = models.DateTimeField(auto_now_add=True)  # Дата расчета статистики
+    # Снимки старше окна хранения прореживаются до дневных/недельных
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES, default='raw')
+    # Если задан, json_statistics - merge patch (RFC 7386) к полному снимку base
+    base = models.ForeignKey('self', on_delete=models.PROTECT, null=True, related_name='deltas')
+    # Версия каталога (CatalogCounter.CATALOG_VERSION), прочитанная перед расчетом
+    catalog_version = models.BigIntegerField(null=True)
+    # Раздел -> {status: success|error, duration: секунды, error: текст ошибки}
+    sections = models.JSONField(default=dict)
 
     class Meta:
         verbose_name_plural = "Statistics"  # Название модели
+        # История статистики читается диапазонами и страницами по дате расчета
+        indexes = [models.Index(fields=['date_calculated', 'id'])]
 
     def __str__(self):
         return f"Статистика от {self.date_calculated}"
 
+    @property
+    def statistics(self):
+        """Полный JSON статистики (дельта применяется к базовому снимку)"""
+        if self.base_id is None:
+            return self.json_statistics
+        return apply_merge_patch(self.base.json_statistics, self.json_statistics)
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('success', 'Success'),
+        ('failed', 'Failed')
+    ]
+
+    source = models.CharField(max_length=255)  # Путь к импортируемому файлу
+    options = models.JSONField(default=dict)  # Параметры запуска импорта
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    celery_task_id = models.CharField(max_length=255, blank=True)
+    file_sha256 = models.CharField(max_length=64, blank=True)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    bytes_processed = models.PositiveBigIntegerField(default=0)
+    total_bytes = models.PositiveBigIntegerField(null=True)
+    results = models.JSONField(default=dict)  # Последний сохраненный чекпоинт счетчиков
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Импорт #{self.pk} ({self.status})"
+
+    def _elapsed(self):
+        if not self.started_at:
+            return None
+        end = self.finished_at or self.updated_at
+        return max((end - self.started_at).total_seconds(), 0)
+
+    @property
+    def throughput(self):
+        """Скорость обработки, строк в секунду"""
+        elapsed = self._elapsed()
+        if not elapsed:
+            return None
+        return round(self.rows_processed / elapsed, 2)
+
+    @property
+    def eta_seconds(self):
+        """Оценка оставшегося времени по доле прочитанных байтов"""
+        if self.status != 'running':
+            return 0 if self.status in ('success', 'failed') else None
+        elapsed = self._elapsed()
+        if not elapsed or not self.bytes_processed or not self.total_bytes:
+            return None
+        remaining = max(self.total_bytes - self.bytes_processed, 0)
+        return round(elapsed * remaining / self.bytes_processed, 1)
+
+
+class ImportedFile(models.Model):
+    source = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64)  # Хэш содержимого файла
+    size = models.PositiveBigIntegerField()
+    job = models.ForeignKey(ImportJob, on_delete=models.SET_NULL, null=True)
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['source', '-imported_at'])]
+
+    def __str__(self):
+        return f"{self.source} ({self.sha256[:12]})"
+
+
+class ImportFingerprint(models.Model):
+    key = models.CharField(max_length=64, unique=True)  # SHA-256 нормализованной тройки бренд/модель/кузов
+    digest = models.CharField(max_length=40)  # SHA-1 остальных (не ключевых) полей <Modification>
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class CatalogCounter(models.Model):
+    """Счетчик каталога, обновляемый в тех же транзакциях, что и данные"""
+    TOTAL_BRANDS = 'brands'
+    TOTAL_MODELS = 'models'
+    TOTAL_CARS = 'cars'
+    TOTAL_BODY_TYPES = 'body_types'
+    BRAND_CARS = 'brand_cars'
+    BRAND_MODELS = 'brand_models'
+    BODY_TYPE_CARS = 'body_type_cars'
+    CATALOG_VERSION = 'catalog_version'
+    SCOPE_CHOICES = [
+        (TOTAL_BRANDS, 'Total brands'),
+        (TOTAL_MODELS, 'Total models'),
+        (TOTAL_CARS, 'Total cars'),
+        (TOTAL_BODY_TYPES, 'Total body types'),
+        (BRAND_CARS, 'Cars per brand'),
+        (BRAND_MODELS, 'Models per brand'),
+        (BODY_TYPE_CARS, 'Cars per body type'),
+        (CATALOG_VERSION, 'Catalog version')
+    ]
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    object_id = models.PositiveBigIntegerField(default=0)  # id бренда/типа кузова, 0 для итогов
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'object_id'], name='cars_catalogcounter_scope_object_uniq')
+        ]
+        indexes = [models.Index(fields=['scope', '-value'])]
+
+    def __str__(self):
+        return f"{self.scope}[{self.object_id}] = {self.value}"
+
+
 class AuditLog(models.Model):
     ACTION_CHOICES = [
         ('C', 'Created'),
@@ -62,10 +222,13 @@ class AuditLog(models.Model):
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     changes = models.JSONField()
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Время события, а не вставки: записи могут сохраняться пакетами и через очередь
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-timestamp']
+        # На PostgreSQL таблица секционирована по месяцам timestamp (миграция 0009)
+        indexes = [models.Index(fields=['timestamp'])]
 
 
 class Model:
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Данные каталога (бренды, модели, автомобили, типы кузова) изменились.
+# Отправляется после фиксации транзакции, см. cars.utils.stats_refresh
+catalog_changed = Signal()
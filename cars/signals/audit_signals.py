@@ -1,57 +1,87 @@
 import logging
-from datetime import datetime
 
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
-from cars.models import AuditLog, BodyType, Brand, Model, Modification
+from cars.models import BodyType, Brand, Model, Modification
+from cars.utils.audit_buffer import record_audit
+from cars.utils.audit_diff import changed_fields, field_values, forget_original, remember_original
+from cars.utils.audit_summary import summarize_event
 
 
 logger = logging.getLogger(__name__)
 
+@receiver(post_init, sender=Brand)
+@receiver(post_init, sender=Model)
+@receiver(post_init, sender=BodyType)
+@receiver(post_init, sender=Modification)
+def remember_audit_original(sender, instance, **kwargs):
+    """Запоминает значения полей при загрузке, чтобы писать в журнал только изменения"""
+    remember_original(instance)
+
+
+@receiver(pre_save, sender=Brand)
+@receiver(pre_save, sender=Model)
+@receiver(pre_save, sender=BodyType)
+@receiver(pre_save, sender=Modification)
+def check_audit_original(sender, instance, **kwargs):
+    """Исходные значения нового, а не загруженного из базы экземпляра недостоверны"""
+    if instance._state.adding:
+        forget_original(instance)
+
+
 @receiver(post_save, sender=Brand)
 @receiver(post_save, sender=Model)
 @receiver(post_save, sender=BodyType)
 @receiver(post_save, sender=Modification)
-def log_model_save(sender, instance, created, **kwargs):
+def log_model_save(sender, instance, created, update_fields=None, **kwargs):
     """
     Обрабатывает сигнал сохранения модели и создает запись в журнале аудита
 
+    При создании в журнал пишутся все поля, при изменении - только
+    изменившиеся (старое и новое значение). Сохранение без изменений
+    не журналируется.
+
     Args:
         sender: Класс модели, которая вызвала сигнал
         instance: Экземпляр сохраненной модели
         created: Флаг, указывающий, был ли создан новый объект
+        update_fields: Поля, переданные в save(update_fields=...)
     """
     try:
         action = 'create' if created else 'update'
         model_name = sender.__name__
 
-        # Сериализуем объект для журнала
+        changes = None if created else changed_fields(instance, update_fields)
+        if changes == {}:
+            logger.debug(f"Audit log skipped for {model_name} {instance.id}: nothing changed")
+            return
+        remember_original(instance, update_fields)
+
+        # Во время импорта вместо записи по объекту - счетчик в сводке
+        if summarize_event(f'{model_name}_{action}', instance.id):
+            return
+
         instance_data = {
             'id': instance.id,
             'model': model_name,
         }
-
-        # Добавляем атрибуты модели в данные
-        for field in instance._meta.fields:
-            field_name = field.name
-            if field_name != 'id' and hasattr(instance, field_name):
-                value = getattr(instance, field_name)
-                # Обработка связей внешних ключей
-                if field.is_relation and value is not None:
-                    instance_data[field_name] = value.id
-                else:
-                    instance_data[field_name] = str(value) if value is not None else None
-
-        # Создаем запись в журнале аудита
-        AuditLog.objects.create(
+        if changes is None:
+            # Новый объект или объект, не загруженный из базы: все поля
+            instance_data.update(field_values(instance, update_fields))
+        else:
+            instance_data['changes'] = changes
+
+        # Запись в журнал аудита сохраняется пакетом после фиксации транзакции
+        record_audit(
             action=f'{model_name}_{action}',
             changes=instance_data,
-            timestamp=datetime.now()
+            timestamp=timezone.now()
         )
 
-        logger.info(f"Audit log created for {model_name} {action}")
+        logger.debug(f"Audit log queued for {model_name} {action}")
 
     except Exception as e:
         logger.error(f"Failed to create audit log for {sender.__name__}: {str(e)}")
@@ -72,31 +102,24 @@ def log_model_delete(sender, instance, **kwargs):
     try:
         model_name = sender.__name__
 
-        # Сериализуем удаленный объект для журнала
+        if summarize_event(f'{model_name}_delete', instance.id):
+            return
+
+        # Сериализуем удаленный объект для журнала (связи - по *_id)
         instance_data = {
             'id': instance.id,
             'model': model_name,
+            **field_values(instance),
         }
 
-        # Добавляем основные атрибуты модели в данные
-        for field in instance._meta.fields:
-            field_name = field.name
-            if field_name != 'id' and hasattr(instance, field_name):
-                value = getattr(instance, field_name)
-                # Обработка связей
-                if field.is_relation and value is not None:
-                    instance_data[field_name] = value.id
-                else:
-                    instance_data[field_name] = str(value) if value is not None else None
-
-        # Создаем запись в журнале аудита
-        AuditLog.objects.create(
+        # Запись в журнал аудита сохраняется пакетом после фиксации транзакции
+        record_audit(
             action=f'{model_name}_delete',
             changes=instance_data,
-            timestamp=datetime.now()
+            timestamp=timezone.now()
         )
 
-        logger.info(f"Audit log created for {model_name} delete")
+        logger.debug(f"Audit log queued for {model_name} delete")
 
     except Exception as e:
         logger.error(f"Failed to create audit log for {sender.__name__} deletion: {str(e)}")
@@ -126,14 +149,14 @@ def log_user_action(sender, instance, created, **kwargs):
             'date_joined': str(instance.date_joined) if instance.date_joined else None
         }
 
-        # Создаем запись в журнале аудита
-        AuditLog.objects.create(
+        # Запись в журнал аудита сохраняется пакетом после фиксации транзакции
+        record_audit(
             action=f'user_{action}',
             changes=user_data,
-            timestamp=datetime.now()
+            timestamp=timezone.now()
         )
 
-        logger.info(f"Audit log created for User {action}")
+        logger.debug(f"Audit log queued for User {action}")
 
     except Exception as e:
         logger.error(f"Failed to create audit log for User: {str(e)}")
\ No newline at end of file
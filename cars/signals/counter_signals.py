@@ -0,0 +1,150 @@
+import logging
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from cars.models import BodyType, Brand, Car, CarModel, CatalogCounter
+from cars.utils.counters import CATALOG_VERSION_KEY, car_deltas, drop_counters, record_counter_deltas
+
+
+logger = logging.getLogger(__name__)
+
+# Связи строки до изменения, снятые в pre_save: счетчики переносятся по
+# значениям из базы, а не по тем, с которыми экземпляр был загружен
+STORED_ATTR = '_counter_stored'
+
+# Ошибки здесь не перехватываются: счетчик должен откатиться вместе с
+# изменением каталога, а не разойтись с ним. bulk_create сигналов не
+# отправляет, пакетные импорты передают приращения сами (counter_batch).
+# QuerySet.update() тоже обходит сигналы: связи автомобилей и моделей
+# меняются через save(), иначе счетчики поправит только reconcile_counters.
+
+
+@receiver(post_save, sender=Brand)
+def count_brand_save(sender, instance, created, **kwargs):
+    """Учитывает новый бренд и заводит его счетчики с нулем"""
+    if created:
+        record_counter_deltas({
+            (CatalogCounter.TOTAL_BRANDS, 0): 1,
+            (CatalogCounter.BRAND_CARS, instance.pk): 0,
+            (CatalogCounter.BRAND_MODELS, instance.pk): 0,
+        })
+    else:
+        # Имя бренда входит в top_brands снимка статистики
+        record_counter_deltas({CATALOG_VERSION_KEY: 0})
+
+
+@receiver(post_delete, sender=Brand)
+def count_brand_delete(sender, instance, **kwargs):
+    record_counter_deltas({(CatalogCounter.TOTAL_BRANDS, 0): -1})
+    drop_counters([
+        (CatalogCounter.BRAND_CARS, instance.pk),
+        (CatalogCounter.BRAND_MODELS, instance.pk),
+    ])
+
+
+def _changes_field(instance, update_fields, *names):
+    """Может ли save() изменить одно из полей существующей строки"""
+    if instance._state.adding or instance.pk is None:
+        return False
+    return update_fields is None or any(name in update_fields for name in names)
+
+
+@receiver(pre_save, sender=CarModel)
+def remember_model_brand(sender, instance, update_fields=None, **kwargs):
+    if _changes_field(instance, update_fields, 'brand', 'brand_id'):
+        instance.__dict__[STORED_ATTR] = CarModel.objects.filter(pk=instance.pk).values_list(
+            'brand_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=CarModel)
+def count_model_save(sender, instance, created, **kwargs):
+    if created:
+        record_counter_deltas({
+            (CatalogCounter.TOTAL_MODELS, 0): 1,
+            (CatalogCounter.BRAND_MODELS, instance.brand_id): 1,
+        })
+        return
+
+    old_brand_id = instance.__dict__.pop(STORED_ATTR, None)
+    if old_brand_id is None or old_brand_id == instance.brand_id:
+        return
+    # Модель перенесена в другой бренд вместе со своими автомобилями
+    cars = Car.objects.filter(model_id=instance.pk).count()
+    record_counter_deltas({
+        (CatalogCounter.BRAND_MODELS, old_brand_id): -1,
+        (CatalogCounter.BRAND_MODELS, instance.brand_id): 1,
+        (CatalogCounter.BRAND_CARS, old_brand_id): -cars,
+        (CatalogCounter.BRAND_CARS, instance.brand_id): cars,
+    })
+
+
+@receiver(post_delete, sender=CarModel)
+def count_model_delete(sender, instance, **kwargs):
+    record_counter_deltas({
+        (CatalogCounter.TOTAL_MODELS, 0): -1,
+        (CatalogCounter.BRAND_MODELS, instance.brand_id): -1,
+    })
+
+
+@receiver(post_save, sender=BodyType)
+def count_body_type_save(sender, instance, created, **kwargs):
+    if created:
+        record_counter_deltas({
+            (CatalogCounter.TOTAL_BODY_TYPES, 0): 1,
+            (CatalogCounter.BODY_TYPE_CARS, instance.pk): 0,
+        })
+    else:
+        # Распределение по типам кузова отдается по именам: переименование
+        # меняет ответ статистики, значит и версию каталога (ETag)
+        record_counter_deltas({CATALOG_VERSION_KEY: 0})
+
+
+@receiver(post_delete, sender=BodyType)
+def count_body_type_delete(sender, instance, **kwargs):
+    # Автомобили остаются с body_type=NULL (SET_NULL), общее число не меняется
+    record_counter_deltas({(CatalogCounter.TOTAL_BODY_TYPES, 0): -1})
+    drop_counters([(CatalogCounter.BODY_TYPE_CARS, instance.pk)])
+
+
+@receiver(pre_save, sender=Car)
+def remember_car_links(sender, instance, update_fields=None, **kwargs):
+    if _changes_field(instance, update_fields, 'model', 'model_id', 'body_type', 'body_type_id'):
+        instance.__dict__[STORED_ATTR] = Car.objects.filter(pk=instance.pk).values_list(
+            'model__brand_id', 'body_type_id'
+        ).first()
+
+
+@receiver(post_save, sender=Car)
+def count_car_save(sender, instance, created, **kwargs):
+    if created:
+        record_counter_deltas(car_deltas(instance.model.brand_id, instance.body_type_id))
+        return
+
+    stored = instance.__dict__.pop(STORED_ATTR, None)
+    if stored is None:
+        return
+    current = (
+        CarModel.objects.filter(pk=instance.model_id).values_list('brand_id', flat=True).first(),
+        instance.body_type_id,
+    )
+    if current == stored:
+        return
+    # Автомобиль сменил бренд (через модель) или тип кузова: переносим его
+    deltas = defaultdict(int)
+    for key, delta in car_deltas(*stored, sign=-1).items():
+        deltas[key] += delta
+    for key, delta in car_deltas(*current).items():
+        deltas[key] += delta
+    record_counter_deltas({key: delta for key, delta in deltas.items() if delta})
+
+
+@receiver(post_delete, sender=Car)
+def count_car_delete(sender, instance, **kwargs):
+    # При каскадном удалении бренда модель еще существует: Car удаляется раньше
+    brand_id = CarModel.objects.filter(pk=instance.model_id).values_list(
+        'brand_id', flat=True
+    ).first()
+    record_counter_deltas(car_deltas(brand_id, instance.body_type_id, sign=-1))
@@ -0,0 +1,53 @@
+from django.db.models import Q, QuerySet
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from cars.models import BodyType, Brand, Car, CarModel
+from cars.utils.delta_import import forget_fingerprints
+
+
+# pre_delete, а не post_delete: при каскадном удалении бренда или модели
+# имена еще можно прочитать, а автомобили типа кузова еще не получили
+# body_type=NULL. Отпечатки удаляются в той же транзакции, что и данные.
+
+# Путь от автомобиля к объекту, с которого началось удаление
+ORIGIN_PATHS = {Car: 'pk', CarModel: 'model', Brand: 'model__brand'}
+# Id автомобилей, отпечатки которых уже удалены для этого удаления
+FORGOTTEN_ATTR = '_fingerprints_forgotten'
+
+
+def _deleted_cars(instance, origin):
+    """Автомобили удаления, начатого с origin, включая instance"""
+    scope = Q(pk=instance.pk)
+    if isinstance(origin, QuerySet) and origin.model in ORIGIN_PATHS:
+        scope |= Q(**{f'{ORIGIN_PATHS[origin.model]}__in': origin.values('pk')})
+    elif type(origin) in ORIGIN_PATHS:
+        scope |= Q(**{ORIGIN_PATHS[type(origin)]: origin.pk})
+    return Car.objects.filter(scope)
+
+
+@receiver(pre_delete, sender=Car)
+def forget_car_fingerprint(sender, instance, origin=None, **kwargs):
+    # pre_delete приходит на каждый автомобиль, а отпечатки всего удаления
+    # (queryset, бренд или модель с каскадом) снимаются одним запросом
+    forgotten = getattr(origin, FORGOTTEN_ATTR, set())
+    if instance.pk in forgotten:
+        return
+
+    rows = list(_deleted_cars(instance, origin).values_list(
+        'pk', 'model__brand__name', 'model__name', 'body_type__name'
+    ))
+    if origin is not None:
+        setattr(origin, FORGOTTEN_ATTR, forgotten | {pk for pk, *_ in rows})
+    forget_fingerprints(triple for _, *triple in rows if triple[2] is not None)
+
+
+@receiver(pre_delete, sender=BodyType)
+def forget_body_type_fingerprints(sender, instance, **kwargs):
+    # Автомобили остаются с body_type=NULL (SET_NULL) без сигналов удаления
+    forget_fingerprints(
+        (brand, model, instance.name)
+        for brand, model in Car.objects.filter(body_type=instance).values_list(
+            'model__brand__name', 'model__name'
+        )
+    )
@@ -0,0 +1,10 @@
+from django.dispatch import receiver
+
+from cars.signals import catalog_changed
+from cars.utils.stats_refresh import schedule_statistics_refresh
+
+
+@receiver(catalog_changed)
+def refresh_statistics_on_change(sender, **kwargs):
+    """Изменение каталога планирует отложенный пересчет статистики"""
+    schedule_statistics_refresh()
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from cars.models import AuditLog, BodyType, Brand
+from cars.utils.audit_buffer import record_audit, write_audit_entries
+
+
+def logged_names():
+    return sorted(entry['name'] for entry in AuditLog.objects.values_list('changes', flat=True))
+
+
+@override_settings(AUDIT_ASYNC=False, STATISTICS_REFRESH_ON_CHANGE=False)
+class AuditBufferTests(TestCase):
+    def test_entries_are_written_once_after_commit(self):
+        with mock.patch('cars.utils.audit_buffer.write_audit_entries', wraps=write_audit_entries) as write:
+            with self.captureOnCommitCallbacks(execute=True):
+                Brand.objects.create(name='BMW')
+                BodyType.objects.create(name='SUV')
+                self.assertFalse(AuditLog.objects.exists())
+
+        # Записи транзакции сохраняются одним вызовом
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(len(write.call_args.args[0]), 2)
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('action', flat=True)), ['BodyType_create', 'Brand_create']
+        )
+
+    def test_rolled_back_savepoint_discards_its_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Brand.objects.create(name='BMW')
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Brand.objects.create(name='Audi')
+                raise RuntimeError
+            # После отката точки сохранения записи копятся в новом буфере
+            BodyType.objects.create(name='SUV')
+
+        self.assertEqual(logged_names(), ['BMW', 'SUV'])
+
+    def test_committed_savepoint_keeps_its_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Brand.objects.create(name='BMW')
+            Brand.objects.create(name='Audi')
+
+        self.assertEqual(logged_names(), ['Audi', 'BMW'])
+
+    def test_rolled_back_transaction_writes_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Brand.objects.create(name='BMW')
+                raise RuntimeError
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_failed_write_does_not_reach_committed_data(self):
+        with mock.patch('cars.utils.audit_buffer.write_audit_entries', side_effect=DatabaseError('audit down')):
+            with self.assertLogs('cars.utils.audit_buffer', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    Brand.objects.create(name='BMW')
+
+        self.assertTrue(Brand.objects.filter(name='BMW').exists())
+        self.assertFalse(AuditLog.objects.exists())
+
+
+@override_settings(AUDIT_ASYNC=False)
+class AuditWithoutTransactionTests(TransactionTestCase):
+    def test_entry_is_written_immediately(self):
+        record_audit(model_name='Brand', action='Brand_create', changes={'name': 'BMW'})
+
+        self.assertEqual(logged_names(), ['BMW'])
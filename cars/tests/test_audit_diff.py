@@ -0,0 +1,77 @@
+from django.test import TransactionTestCase, override_settings
+
+from cars.models import AuditLog, BodyType, Brand
+from cars.utils.audit_diff import changed_fields
+
+
+@override_settings(AUDIT_ASYNC=False, STATISTICS_REFRESH_ON_CHANGE=False)
+class AuditDiffTests(TransactionTestCase):
+    # Каждое сохранение фиксируется отдельно, как в запросах к API и админке
+
+    def save_and_log(self, instance, **kwargs):
+        """Сохраняет экземпляр и возвращает появившиеся записи аудита"""
+        before = set(AuditLog.objects.values_list('pk', flat=True))
+        instance.save(**kwargs)
+        return list(AuditLog.objects.exclude(pk__in=before).values_list('action', 'changes'))
+
+    def setUp(self):
+        self.brand_id = Brand.objects.create(name='BMW').pk
+        BodyType.objects.create(name='SUV')
+
+    def test_only_changed_fields_are_logged(self):
+        brand = Brand.objects.get(pk=self.brand_id)
+        brand.name = 'Bmw'
+
+        [(action, changes)] = self.save_and_log(brand)
+
+        # name_key не изменился и в журнал не попадает
+        self.assertEqual(action, 'Brand_update')
+        self.assertEqual(changes['changes'], {'name': {'old': 'BMW', 'new': 'Bmw'}})
+
+    def test_noop_save_is_not_logged(self):
+        brand = Brand.objects.get(pk=self.brand_id)
+
+        self.assertEqual(self.save_and_log(brand), [])
+        self.assertEqual(self.save_and_log(brand, update_fields=['name']), [])
+
+    def test_consecutive_saves_diff_against_last_save(self):
+        body_type = BodyType.objects.get(name='SUV')
+        body_type.name = 'Crossover'
+        self.save_and_log(body_type)
+
+        body_type.name = 'Off-road'
+        [(_, changes)] = self.save_and_log(body_type)
+
+        self.assertEqual(changes['changes']['name'], {'old': 'Crossover', 'new': 'Off-road'})
+        # Повторное сохранение без правок после записанной - без записи
+        self.assertEqual(self.save_and_log(body_type), [])
+
+    def test_update_fields_limit_the_diff(self):
+        brand = Brand.objects.get(pk=self.brand_id)
+        brand.name = 'B.M.W.'
+
+        [(_, changes)] = self.save_and_log(brand, update_fields=['name'])
+
+        # NormalizedNameMixin добавляет name_key к update_fields
+        self.assertEqual(set(changes['changes']), {'name', 'name_key'})
+        self.assertEqual(changes['changes']['name_key'], {'old': 'bmw', 'new': 'b.m.w.'})
+
+    def test_instance_built_in_code_logs_all_fields(self):
+        # Исходные значения конструктора не из базы, сравнивать с ними нельзя
+        brand = Brand(pk=self.brand_id, name='BMW')
+
+        [(action, changes)] = self.save_and_log(brand)
+
+        self.assertEqual(action, 'Brand_update')
+        self.assertNotIn('changes', changes)
+        self.assertEqual((changes['name'], changes['name_key']), ('BMW', 'bmw'))
+
+    def test_created_instance_is_tracked_after_save(self):
+        brand = Brand(name='Audi')
+
+        [(action, changes)] = self.save_and_log(brand)
+
+        self.assertEqual(action, 'Brand_create')
+        self.assertEqual(changes['name'], 'Audi')
+        # После создания исходными считаются сохраненные значения
+        self.assertEqual(changed_fields(brand), {})
@@ -0,0 +1,86 @@
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from cars.models import AuditLog
+from cars.utils.audit_partitions import (archive_partitions, archive_path, create_partition, ensure_partitions,
+                                         iter_archived_entries, list_partitions, partition_name,
+                                         partitioning_enabled, restore_archived_month)
+
+
+MONTH = date(2020, 1, 1)
+# Раздел MONTH старше срока хранения, разделы миграции (текущий месяц и вперед) - нет
+NOW = date(2021, 6, 1)
+
+
+def audit_entry(day, action='C'):
+    return AuditLog.objects.create(
+        model_name='Brand', object_id=day, action=action, changes={'name': f'Brand {day}'},
+        timestamp=datetime(MONTH.year, MONTH.month, day, 12, tzinfo=dt_timezone.utc)
+    )
+
+
+def month_entries():
+    return AuditLog.objects.filter(timestamp__year=MONTH.year, timestamp__month=MONTH.month)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'AuditLog is partitioned on PostgreSQL only')
+class AuditPartitionTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = Path(archive_dir.name)
+
+    def test_table_is_partitioned(self):
+        self.assertTrue(partitioning_enabled())
+        self.assertTrue(list_partitions()['attached'])
+
+    def test_create_partition_moves_rows_from_default(self):
+        audit_entry(10)
+        audit_entry(20)
+        self.assertEqual(list_partitions()['default_rows'], 2)
+
+        moved = create_partition(MONTH)
+
+        partitions = list_partitions()
+        self.assertEqual(moved, 2)
+        self.assertEqual(partitions['attached'][MONTH], partition_name(MONTH))
+        self.assertEqual(partitions['default_rows'], 0)
+        self.assertEqual(month_entries().count(), 2)
+
+    def test_ensure_partitions_is_idempotent(self):
+        created = ensure_partitions(months_ahead=1, now=MONTH)
+
+        self.assertEqual(created, [partition_name(MONTH), partition_name(date(2020, 2, 1))])
+        self.assertEqual(ensure_partitions(months_ahead=1, now=MONTH), [])
+
+    def test_archive_and_restore_month(self):
+        audit_entry(10)
+        audit_entry(20, action='D')
+        create_partition(MONTH)
+
+        archived = archive_partitions(retention_months=12, now=NOW, archive_dir=self.archive_dir)
+
+        self.assertEqual([(item['month'], item['rows']) for item in archived], [('2020-01', 2)])
+        self.assertTrue(archive_path(MONTH, self.archive_dir).exists())
+        self.assertNotIn(MONTH, list_partitions()['attached'])
+        self.assertEqual(list_partitions()['detached'], {})
+        self.assertEqual(month_entries().count(), 0)
+        self.assertEqual([entry['object_id'] for entry in iter_archived_entries(
+            MONTH, self.archive_dir, action='D'
+        )], [20])
+
+        restored = restore_archived_month(MONTH, self.archive_dir)
+
+        self.assertEqual(restored, 2)
+        self.assertEqual(sorted(month_entries().values_list('object_id', flat=True)), [10, 20])
+        with self.assertRaises(ValueError):
+            restore_archived_month(MONTH, self.archive_dir)
+
+    def test_missing_archive(self):
+        with self.assertRaises(FileNotFoundError):
+            list(iter_archived_entries(MONTH, self.archive_dir))
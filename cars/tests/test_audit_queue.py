@@ -0,0 +1,119 @@
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock, skipIf
+
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from cars.models import AuditLog
+from cars.utils.audit_buffer import write_audit_entries
+from cars.utils.audit_queue import (RedisAuditQueue, SQLiteAuditSpool, audit_queue_metrics, consume_audit_queue,
+                                    enqueue_audit_entries)
+from cars.utils.task_lock import MemoryTaskLock
+from cars_project.tasks import drain_audit_queue
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis нужен только для тестов очереди Redis
+    fakeredis = None
+
+
+MOMENT = datetime(2026, 1, 10, 12, tzinfo=dt_timezone.utc)
+
+
+def entries(count):
+    return [
+        AuditLog(model_name='Brand', object_id=i, action='Brand_create', changes={'name': f'Brand {i}'},
+                 timestamp=MOMENT)
+        for i in range(count)
+    ]
+
+
+class AuditQueueContract:
+    """Общие проверки очереди; make_queue() задают подклассы"""
+
+    def setUp(self):
+        self.queue = self.make_queue()
+        patcher = mock.patch('cars.utils.audit_queue._audit_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_drain_moves_entries_in_batches(self):
+        self.assertTrue(enqueue_audit_entries(entries(3)))
+        self.assertFalse(AuditLog.objects.exists())
+
+        result = consume_audit_queue(self.queue, batch_size=2, max_seconds=10)
+
+        self.assertEqual((result['written'], result['batches']), (3, 2))
+        self.assertEqual(self.queue.size(), 0)
+        self.assertEqual(sorted(AuditLog.objects.values_list('object_id', flat=True)), [0, 1, 2])
+        self.assertEqual(set(AuditLog.objects.values_list('timestamp', flat=True)), {MOMENT})
+        metrics = audit_queue_metrics(self.queue)
+        self.assertEqual((metrics['depth'], metrics['enqueued'], metrics['written']), (0, 3, 3))
+
+    def test_failed_write_keeps_batch_queued(self):
+        enqueue_audit_entries(entries(2))
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=DatabaseError('db down')):
+            with self.assertRaises(DatabaseError):
+                consume_audit_queue(self.queue, max_seconds=10)
+
+        # Порция не подтверждена и будет сохранена следующим запуском
+        self.assertEqual(self.queue.size(), 2)
+        self.assertEqual(consume_audit_queue(self.queue, max_seconds=10)['written'], 2)
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+    @override_settings(AUDIT_ASYNC=True)
+    @mock.patch('cars.utils.task_lock._task_lock', MemoryTaskLock())
+    def test_drain_task_reports_failure_and_releases_lock(self):
+        enqueue_audit_entries(entries(2))
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=DatabaseError('db down')):
+            with self.assertLogs('cars_project.tasks', 'ERROR'):
+                failed = drain_audit_queue.apply().result
+        drained = drain_audit_queue.apply().result
+
+        self.assertEqual(failed, {'status': 'error', 'error': 'db down'})
+        self.assertEqual((drained['status'], drained['written']), ('success', 2))
+        self.assertEqual(drained['metrics']['depth'], 0)
+
+    @override_settings(AUDIT_QUEUE_MAX_SIZE=2)
+    def test_full_queue_applies_backpressure(self):
+        self.assertTrue(enqueue_audit_entries(entries(2)))
+
+        self.assertFalse(enqueue_audit_entries(entries(1)))
+
+        self.assertEqual(self.queue.size(), 2)
+        self.assertEqual(audit_queue_metrics(self.queue)['backpressure'], 1)
+
+    @override_settings(AUDIT_ASYNC=True, AUDIT_QUEUE_MAX_SIZE=0)
+    def test_rejected_entries_are_written_synchronously(self):
+        write_audit_entries(entries(2))
+
+        self.assertEqual(AuditLog.objects.count(), 2)
+        self.assertEqual(self.queue.size(), 0)
+
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+class RedisAuditQueueTests(AuditQueueContract, TestCase):
+    def make_queue(self):
+        with mock.patch('redis.Redis.from_url', return_value=fakeredis.FakeRedis()):
+            return RedisAuditQueue('redis://test')
+
+
+class SQLiteAuditSpoolTests(AuditQueueContract, TestCase):
+    def make_queue(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        return SQLiteAuditSpool(Path(spool_dir.name) / 'audit_spool.sqlite3')
+
+
+@override_settings(AUDIT_ASYNC=True)
+class UnavailableAuditQueueTests(TestCase):
+    def test_entries_are_written_synchronously(self):
+        with mock.patch('cars.utils.audit_queue.get_audit_queue', side_effect=ConnectionError('redis down')):
+            with self.assertLogs('cars.utils.audit_queue', 'ERROR'):
+                write_audit_entries(entries(2))
+
+        self.assertEqual(AuditLog.objects.count(), 2)
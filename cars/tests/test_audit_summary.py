@@ -0,0 +1,100 @@
+import threading
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from cars.models import AuditLog, Brand
+from cars.utils.audit_summary import SUMMARY_ACTION, audit_summary, summarize_event, suspend_audit
+from cars.utils.bulk_import import CarBulkImporter
+
+
+ROWS = [('BMW', 'X5', 'SUV'), ('BMW', 'X6', 'SUV'), ('Audi', 'A4', 'Sedan')]
+
+
+@override_settings(AUDIT_ASYNC=False, STATISTICS_REFRESH_ON_CHANGE=False)
+class AuditSummaryTests(TestCase):
+    def summaries(self):
+        return list(AuditLog.objects.filter(action=SUMMARY_ACTION).values_list('object_id', 'changes'))
+
+    def test_import_writes_one_summary_entry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with audit_summary('catalog.xml', job_id=7) as summary:
+                importer = CarBulkImporter()
+                summary.results = importer.results
+                importer.import_records(ROWS)
+
+        self.assertEqual(AuditLog.objects.count(), 1)
+        [(job_id, changes)] = self.summaries()
+        self.assertEqual(job_id, 7)
+        self.assertEqual((changes['source'], changes['status'], changes['error']), ('catalog.xml', 'success', None))
+        self.assertEqual(changes['events']['Brand_create']['count'], 2)
+        self.assertEqual(changes['events']['BodyType_create']['count'], 2)
+        self.assertEqual(changes['created']['Car']['count'], 3)
+        self.assertEqual(changes['created']['Brand']['max_id'], max(Brand.objects.values_list('pk', flat=True)))
+        self.assertEqual(changes['results']['cars_processed'], 3)
+        self.assertEqual(changes['results']['brands_count'], 2)
+        self.assertNotIn('processed_brands', changes['results'])
+
+    def test_failed_import_is_summarized_and_reraised(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), audit_summary('catalog.xml'):
+                CarBulkImporter().import_records(ROWS[:1])
+                raise RuntimeError('parser crashed')
+
+        [(_, changes)] = self.summaries()
+        self.assertEqual((changes['status'], changes['error']), ('failed', 'parser crashed'))
+        self.assertEqual(changes['created']['Car']['count'], 1)
+
+    def test_handled_error_is_reported(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with audit_summary('upload:application/xml') as summary:
+                summary.error = 'no element found'
+
+        [(_, changes)] = self.summaries()
+        self.assertEqual((changes['status'], changes['error']), ('failed', 'no element found'))
+
+    def test_nested_summary_joins_outer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with audit_summary('outer') as outer:
+                with audit_summary('inner') as inner:
+                    self.assertIs(inner, outer)
+                    Brand.objects.create(name='BMW')
+
+        [(_, changes)] = self.summaries()
+        self.assertEqual(changes['source'], 'outer')
+        self.assertEqual(changes['events']['Brand_create']['count'], 1)
+
+    def test_per_object_audit_resumes_after_summary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with audit_summary('catalog.xml'):
+                pass
+            Brand.objects.create(name='BMW')
+
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('action', flat=True)), ['Brand_create', SUMMARY_ACTION]
+        )
+
+    def test_summary_is_thread_local(self):
+        summarized = []
+        with audit_summary('catalog.xml'):
+            thread = threading.Thread(target=lambda: summarized.append(summarize_event('Brand_create', 1)))
+            thread.start()
+            thread.join()
+            summarized.append(summarize_event('Brand_create', 2))
+
+        self.assertEqual(summarized, [False, True])
+
+    def test_suspended_audit_writes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with suspend_audit():
+                CarBulkImporter().import_records(ROWS)
+
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_summary_write_failure_does_not_fail_import(self):
+        with mock.patch('cars.utils.audit_summary.record_audit', side_effect=RuntimeError('audit down')):
+            with self.assertLogs('cars.utils.audit_summary', 'ERROR'):
+                with audit_summary('catalog.xml'):
+                    CarBulkImporter().import_records(ROWS)
+
+        self.assertEqual(Brand.objects.count(), 2)
@@ -0,0 +1,121 @@
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from cars.models import Brand, Car, CarModel, CatalogCounter
+from cars.utils.bulk_import import CarBulkImporter
+from cars.utils.counters import get_counter, reconcile_counters
+
+
+ROWS = [
+    ('BMW', 'X5', 'SUV'),
+    ('BMW', 'X5', 'Coupe'),
+    ('bmw', '3 Series', 'Sedan'),
+    ('Audi', 'A4', 'Sedan'),
+    ('Audi', 'A4', 'sedan'),
+]
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class CarBulkImporterTests(TestCase):
+    def test_import_rows_reports_created_and_skipped(self):
+        outcomes = CarBulkImporter().import_rows(ROWS)
+
+        self.assertEqual(outcomes, [True, True, True, True, False])
+        self.assertEqual(Brand.objects.count(), 2)
+        self.assertEqual(CarModel.objects.count(), 3)
+        self.assertEqual(Car.objects.count(), 4)
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+    def test_reimport_changes_nothing(self):
+        CarBulkImporter().import_rows(ROWS)
+        outcomes = CarBulkImporter().import_rows(ROWS)
+
+        self.assertEqual(outcomes, [False] * len(ROWS))
+        self.assertEqual(get_counter(CatalogCounter.TOTAL_CARS), 4)
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+    def test_failed_chunk_drops_only_its_cache_entries(self):
+        importer = CarBulkImporter()
+        importer.import_rows(ROWS)
+
+        with mock.patch('cars.utils.bulk_import.bulk_car_deltas', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                importer.import_chunk([('Lada', 'Niva', 'SUV')])
+
+        # Ключи порции будут разрешены заново, остальной кэш не тронут
+        self.assertNotIn('lada', importer._brands)
+        self.assertNotIn('suv', importer._body_types)
+        self.assertIn('bmw', importer._brands)
+        self.assertIn('sedan', importer._body_types)
+        with mock.patch.object(importer, 'prefetch') as prefetch:
+            self.assertEqual(importer.import_rows([('Lada', 'Niva', 'SUV')]), [True])
+        prefetch.assert_not_called()
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class StaleCacheTests(TransactionTestCase):
+    # Внешние ключи PostgreSQL проверяются при фиксации (DEFERRED), нужна настоящая транзакция
+
+    def test_deleted_brand_is_resolved_again(self):
+        importer = CarBulkImporter()
+        importer.import_rows([('BMW', 'X5', 'SUV')])
+        Brand.objects.get(name='BMW').delete()
+
+        # Строка с удаленным брендом не портит соседние и не остается ошибкой
+        self.assertEqual(importer.import_rows([('BMW', 'X5', 'SUV'), ('Audi', 'A4', 'Sedan')]), [True, True])
+        self.assertEqual(importer.import_rows([('BMW', 'X6', 'SUV')]), [True])
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row-level locking between concurrent transactions')
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class OverlappingImportTests(TransactionTestCase):
+    """Два импорта одних и тех же строк, второй упирается в незафиксированные строки первого"""
+
+    def test_overlapping_imports_count_rows_once(self):
+        first_saved = threading.Event()
+        release_first = threading.Event()
+        outcomes = {}
+
+        def first_import():
+            try:
+                with transaction.atomic():
+                    outcomes['first'] = CarBulkImporter().import_rows(ROWS)
+                    first_saved.set()
+                    release_first.wait(10)
+            finally:
+                first_saved.set()
+                connection.close()
+
+        def second_import(importer):
+            try:
+                outcomes['second'] = importer.import_rows(ROWS)
+            finally:
+                connection.close()
+
+        # Справочники второго импорта загружены до того, как первый что-либо создал
+        importer = CarBulkImporter()
+        importer.prefetch()
+
+        first = threading.Thread(target=first_import)
+        first.start()
+        self.assertTrue(first_saved.wait(10))
+        second = threading.Thread(target=second_import, args=(importer,))
+        second.start()
+        # Второй импорт ждет фиксации строк первого на INSERT ... ON CONFLICT
+        time.sleep(0.5)
+        release_first.set()
+        first.join(10)
+        second.join(10)
+
+        self.assertEqual(outcomes['first'], [True, True, True, True, False])
+        self.assertEqual(outcomes['second'], [False] * len(ROWS))
+        self.assertEqual(get_counter(CatalogCounter.TOTAL_BRANDS), 2)
+        self.assertEqual(get_counter(CatalogCounter.TOTAL_MODELS), 3)
+        self.assertEqual(get_counter(CatalogCounter.TOTAL_CARS), 4)
+        self.assertEqual(reconcile_counters(fix=False), [])
@@ -0,0 +1,74 @@
+from unittest import mock, skipUnless
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cars.models import BodyType, Brand, Car, CarModel
+from cars.utils.bulk_import import CarBulkImporter
+from cars.utils.copy_import import PostgresCopyImporter
+from cars.utils.counters import reconcile_counters
+
+
+ROWS = [
+    ('BMW', 'X5', 'SUV'),
+    ('bmw', 'x5', 'suv'),
+    ('BMW', 'X5', 'Sedan'),
+    ('Audi', 'A4', 'Sedan'),
+    ('Audi', 'A4', ''),
+    ('Kia', 'Rio\tX', 'Hatchback'),
+]
+
+
+def staging_tables():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT tablename FROM pg_tables WHERE tablename LIKE 'cars_import_staging_%%'")
+        return cursor.fetchall()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'COPY import engine requires PostgreSQL')
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class PostgresCopyImporterTests(TestCase):
+    def test_rows_are_loaded_through_staging(self):
+        results = PostgresCopyImporter().import_records(ROWS)
+
+        self.assertEqual(results['cars_processed'], 4)
+        self.assertEqual(results['invalid_entries'], 1)
+        self.assertEqual(results['skipped'], 1)
+        self.assertEqual(results['processed_brands'], {'BMW', 'Audi', 'Kia'})
+        # Табуляция внутри значения экранирована для текстового формата COPY
+        self.assertTrue(Car.objects.filter(model__name='Rio\tX', body_type__name='Hatchback').exists())
+        self.assertEqual(staging_tables(), [])
+
+    def test_case_variants_and_existing_rows_are_deduplicated(self):
+        CarBulkImporter().import_records([('BMW', 'X5', 'SUV')])
+
+        results = PostgresCopyImporter().import_records(ROWS)
+
+        self.assertEqual(results['cars_processed'], 3)
+        self.assertEqual(Brand.objects.filter(name_key='bmw').count(), 1)
+        self.assertEqual(CarModel.objects.filter(name_key='x5').count(), 1)
+        self.assertEqual(BodyType.objects.filter(name_key='suv').count(), 1)
+        self.assertEqual(Car.objects.count(), 4)
+
+    def test_counters_match_tables(self):
+        CarBulkImporter().import_records([('Audi', 'Q7', 'SUV')])
+
+        PostgresCopyImporter().import_records(ROWS)
+        PostgresCopyImporter().import_records(ROWS)
+
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+
+class CopyEngineBackendTests(SimpleTestCase):
+    def test_importer_requires_postgresql(self):
+        with mock.patch.object(connection, 'vendor', 'sqlite'):
+            with self.assertRaises(ImproperlyConfigured):
+                PostgresCopyImporter().import_records(ROWS)
+
+    def test_view_rejects_copy_engine_on_other_backends(self):
+        with mock.patch('cars.views.connection', mock.Mock(vendor='sqlite')):
+            response = self.client.post('/api/add/?engine=copy', b'<Catalog/>', content_type='application/xml')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('PostgreSQL', response.json()['metadata']['message'])
@@ -0,0 +1,84 @@
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cars.models import BodyType, Brand, Car, CarModel, CatalogCounter
+from cars.utils.bulk_import import CarBulkImporter
+from cars.utils.counters import bulk_car_deltas, counter_batch, get_counter, reconcile_counters
+
+
+ROWS = [
+    ('BMW', 'X5', 'SUV'),
+    ('BMW', '3 Series', 'Sedan'),
+    ('Audi', 'A4', 'Sedan'),
+]
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class CounterUpdateTests(TestCase):
+    def setUp(self):
+        CarBulkImporter().import_records(ROWS)
+        self.bmw = Brand.objects.get(name='BMW')
+        self.audi = Brand.objects.get(name='Audi')
+
+    def test_car_body_type_change_moves_counters(self):
+        car = Car.objects.get(model__name='X5')
+        sedan = BodyType.objects.get(name='Sedan')
+
+        car.body_type = sedan
+        car.save()
+
+        self.assertEqual(get_counter(CatalogCounter.BODY_TYPE_CARS, sedan.pk), 3)
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+    def test_car_model_change_moves_brand_counters(self):
+        car = Car.objects.get(model__name='X5')
+
+        car.model = CarModel.objects.get(name='A4')
+        car.save()
+
+        self.assertEqual(get_counter(CatalogCounter.BRAND_CARS, self.audi.pk), 2)
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+    def test_model_brand_change_moves_models_and_cars(self):
+        model = CarModel.objects.get(name='3 Series')
+
+        model.brand = self.audi
+        model.save()
+
+        self.assertEqual(get_counter(CatalogCounter.BRAND_MODELS, self.audi.pk), 2)
+        self.assertEqual(get_counter(CatalogCounter.BRAND_CARS, self.bmw.pk), 1)
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+    def test_unrelated_save_keeps_counters(self):
+        car = Car.objects.get(model__name='X5')
+        version = get_counter(CatalogCounter.CATALOG_VERSION)
+
+        car.save()
+
+        self.assertEqual(get_counter(CatalogCounter.CATALOG_VERSION), version)
+
+    def test_counter_rows_are_updated_in_key_order_with_version_last(self):
+        sedan = BodyType.objects.get(name='Sedan')
+        with CaptureQueriesContext(connection) as queries, counter_batch() as batch:
+            for key, delta in bulk_car_deltas([(self.audi.pk, sedan.pk), (self.bmw.pk, None)]).items():
+                batch[key] += delta
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertIn(CatalogCounter.CATALOG_VERSION, updates[-1])
+        self.assertTrue(all(CatalogCounter.CATALOG_VERSION not in sql for sql in updates[:-1]))
+        if connection.vendor == 'postgresql':
+            locks = [query['sql'] for query in queries if 'FOR UPDATE' in query['sql']]
+            self.assertEqual(len(locks), 1)
+            self.assertIn('ORDER BY', locks[0])
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class AutocommitCounterTests(TransactionTestCase):
+    def test_save_outside_transaction_updates_counters(self):
+        # Сохранение без atomic (автокоммит), как в админке и скриптах
+        brand = Brand.objects.create(name='BMW')
+        Car.objects.create(model=CarModel.objects.create(brand=brand, name='X5'))
+
+        self.assertEqual(get_counter(CatalogCounter.BRAND_CARS, brand.pk), 1)
+        self.assertEqual(get_counter(CatalogCounter.BRAND_MODELS, brand.pk), 1)
@@ -0,0 +1,95 @@
+import io
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cars.models import BodyType, Brand, Car, ImportFingerprint
+from cars.utils.counters import reconcile_counters
+from cars.utils.delta_import import DeltaCarImporter
+from cars.utils.xml_stream import iter_modifications
+
+
+CATALOG = (
+    b'<Catalog>'
+    b'<Modification><Make>BMW</Make><Model>X5</Model><BodyType>SUV</BodyType><Year>2019</Year></Modification>'
+    b'<Modification><Make>BMW</Make><Model>X5</Model><BodyType>SUV</BodyType><Year>2021</Year></Modification>'
+    b'<Modification><Make>Audi</Make><Model>A4</Model><BodyType>Sedan</BodyType></Modification>'
+    b'</Catalog>'
+)
+
+
+def delta_import(data=CATALOG):
+    return DeltaCarImporter().import_records(iter_modifications(io.BytesIO(data), digest=True))
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class DeltaImportTests(TestCase):
+    def test_rows_sharing_a_triple_keep_one_fingerprint(self):
+        first = delta_import()
+        digests = dict(ImportFingerprint.objects.values_list('key', 'digest'))
+
+        second = delta_import()
+
+        self.assertEqual(first['cars_processed'], 2)
+        self.assertEqual(first['skipped'], 1)
+        # Повтор тройки с другим Year не переписывает ее отпечаток
+        self.assertEqual(second['unchanged'], 2)
+        self.assertEqual(second['skipped'], 1)
+        self.assertEqual(dict(ImportFingerprint.objects.values_list('key', 'digest')), digests)
+
+    def test_changed_payload_reaches_database(self):
+        delta_import()
+
+        # У Audi появился Year: запись изменилась и проверяется по базе
+        results = delta_import(CATALOG.replace(b'</BodyType></Modification>', b'</BodyType><Year>2024</Year></Modification>'))
+
+        self.assertEqual(results['unchanged'], 1)
+        self.assertEqual(results['skipped'], 2)
+
+    def test_case_variants_of_key_and_payload_are_unchanged(self):
+        delta_import()
+
+        results = delta_import(CATALOG.replace(b'Audi', b'AUDI').replace(b'BMW', b' bmw '))
+
+        self.assertEqual(results['unchanged'], 2)
+
+    def test_reimport_recreates_deleted_car(self):
+        delta_import()
+        Car.objects.get(model__name='A4').delete()
+
+        results = delta_import()
+
+        self.assertEqual(results['cars_processed'], 1)
+        self.assertTrue(Car.objects.filter(model__name='A4').exists())
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+    def test_cascade_delete_forgets_fingerprints_in_one_query(self):
+        delta_import(CATALOG.replace(b'<Model>X5</Model><BodyType>SUV</BodyType><Year>2021', b'<Model>X6</Model><BodyType>SUV</BodyType><Year>2021'))
+        self.assertEqual(ImportFingerprint.objects.count(), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            Brand.objects.get(name='BMW').delete()
+
+        self.assertEqual(ImportFingerprint.objects.count(), 1)
+        fingerprint_queries = [query for query in queries if 'cars_importfingerprint' in query['sql']]
+        self.assertEqual(len(fingerprint_queries), 1)
+
+    def test_reimport_recreates_cascade_deleted_brand(self):
+        delta_import()
+        Brand.objects.get(name='BMW').delete()
+
+        results = delta_import()
+
+        self.assertEqual(results['cars_processed'], 1)
+        self.assertTrue(Car.objects.filter(model__brand__name='BMW').exists())
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+    def test_reimport_restores_deleted_body_type(self):
+        delta_import()
+        BodyType.objects.get(name='SUV').delete()
+
+        results = delta_import()
+
+        self.assertEqual(results['cars_processed'], 1)
+        self.assertTrue(Car.objects.filter(model__name='X5', body_type__name='SUV').exists())
@@ -0,0 +1,133 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cars.models import ImportJob
+from cars.views import AddCarsFromXML
+from cars_project.tasks import import_cars_from_xml
+
+
+CATALOG = (
+    b'<Catalog>'
+    b'<Modification><Make>BMW</Make><Model>X5</Model><BodyType>SUV</BodyType></Modification>'
+    b'<Modification><Make>Audi</Make><Model>A4</Model><BodyType>Sedan</BodyType></Modification>'
+    b'</Catalog>'
+)
+
+
+def write_catalog(data=CATALOG):
+    handle, path = tempfile.mkstemp(suffix='.xml')
+    with os.fdopen(handle, 'wb') as stream:
+        stream.write(data)
+    return path
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class ImportJobViewTests(TestCase):
+    def get(self, pk):
+        response = self.client.get(reverse('import_job', args=[pk]), HTTP_ACCEPT='application/json')
+        return response.status_code, response.json()
+
+    def test_unknown_job(self):
+        status_code, payload = self.get(999999)
+
+        self.assertEqual(status_code, 404)
+        self.assertEqual(payload['metadata']['message'], 'Задача импорта не найдена')
+
+    def test_pending_job(self):
+        job = ImportJob.objects.create(source='/data/catalog.xml', total_bytes=1000)
+
+        status_code, payload = self.get(job.pk)
+
+        self.assertEqual(status_code, 200)
+        data = payload['data']
+        self.assertEqual((data['job_id'], data['status'], data['rows_processed']), (job.pk, 'pending', 0))
+        self.assertIsNone(data['started_at'])
+        self.assertIsNone(data['throughput_rows_per_sec'])
+        self.assertIsNone(data['eta_seconds'])
+
+    def test_running_job_reports_progress(self):
+        job = ImportJob.objects.create(source='/data/catalog.xml', total_bytes=1000)
+        started_at = timezone.now() - timedelta(seconds=10)
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='running', started_at=started_at, updated_at=started_at + timedelta(seconds=10),
+            rows_processed=500, bytes_processed=250
+        )
+
+        status_code, payload = self.get(job.pk)
+
+        data = payload['data']
+        self.assertEqual(data['status'], 'running')
+        self.assertEqual(data['throughput_rows_per_sec'], 50.0)
+        # Прочитана четверть файла за 10 секунд - осталось около 30
+        self.assertEqual(data['eta_seconds'], 30.0)
+
+    def test_finished_job(self):
+        path = write_catalog()
+        self.addCleanup(os.remove, path)
+        job = ImportJob.objects.create(source=path, total_bytes=len(CATALOG))
+
+        import_cars_from_xml(job.pk)
+        status_code, payload = self.get(job.pk)
+
+        data = payload['data']
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['rows_processed'], 2)
+        self.assertEqual(data['results']['cars_processed'], 2)
+        self.assertEqual(data['bytes_processed'], len(CATALOG))
+        self.assertEqual(data['eta_seconds'], 0)
+        self.assertIsNotNone(data['finished_at'])
+        self.assertEqual(data['error_message'], '')
+
+    def test_failed_job(self):
+        path = write_catalog(CATALOG[:-len('</Catalog>')] + b'<Modification>')
+        self.addCleanup(os.remove, path)
+        job = ImportJob.objects.create(source=path)
+
+        import_cars_from_xml(job.pk)
+        status_code, payload = self.get(job.pk)
+
+        data = payload['data']
+        self.assertEqual(data['status'], 'failed')
+        self.assertTrue(data['error_message'])
+        self.assertEqual(data['eta_seconds'], 0)
+        self.assertIsNotNone(data['finished_at'])
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class QueueImportJobTests(TransactionTestCase):
+    # Представление вызывает close_old_connections(), обычный TestCase с транзакцией не подходит
+
+    def setUp(self):
+        self.path = write_catalog()
+        self.addCleanup(os.remove, self.path)
+        patcher = mock.patch.object(AddCarsFromXML, 'XML_RELATIVE_PATH', self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self):
+        return self.client.post(reverse('add_cars'), data=b'', content_type='text/plain')
+
+    def test_queued_job_is_pending(self):
+        with mock.patch('cars.views.import_cars_from_xml.delay') as delay:
+            response = self.post()
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()['data']
+        delay.assert_called_once_with(data['job_id'])
+        job_response = self.client.get(data['status_url'], HTTP_ACCEPT='application/json')
+        self.assertEqual(job_response.json()['data']['status'], 'pending')
+        self.assertEqual(job_response.json()['data']['total_bytes'], len(CATALOG))
+
+    def test_broker_failure_marks_job_failed(self):
+        with mock.patch('cars.views.import_cars_from_xml.delay', side_effect=ConnectionError('broker down')):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 503)
+        job = ImportJob.objects.get(pk=response.json()['data']['job_id'])
+        self.assertEqual((job.status, job.error_message), ('failed', 'broker down'))
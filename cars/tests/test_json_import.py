@@ -0,0 +1,62 @@
+import io
+import json
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from cars.models import Car
+from cars.utils.json_import import LINE_TOO_LONG_ERROR, MAX_NDJSON_LINE_BYTES, JSONCarImporter, iter_ndjson
+
+
+def ndjson(*lines):
+    return b'\n'.join(lines) + b'\n'
+
+
+CAR = json.dumps({'brand': 'BMW', 'model': 'X5', 'body_type': 'SUV'}).encode()
+LONG_LINE = json.dumps({'brand': 'BMW', 'model': 'X' * MAX_NDJSON_LINE_BYTES, 'body_type': 'SUV'}).encode()
+
+
+class IterNDJSONTests(SimpleTestCase):
+    def test_complete_long_line_is_invalid(self):
+        # Блок чтения больше строки: строка приходит целиком
+        rows = list(iter_ndjson(io.BytesIO(ndjson(LONG_LINE, CAR)), chunk_size=4 * MAX_NDJSON_LINE_BYTES))
+        self.assertEqual(rows, [(None, LINE_TOO_LONG_ERROR), (json.loads(CAR), None)])
+
+    def test_partial_long_line_is_skipped_to_newline(self):
+        rows = list(iter_ndjson(io.BytesIO(ndjson(CAR, LONG_LINE, CAR)), chunk_size=1024))
+        self.assertEqual(rows, [(json.loads(CAR), None), (None, LINE_TOO_LONG_ERROR), (json.loads(CAR), None)])
+
+    def test_long_last_line_without_newline(self):
+        rows = list(iter_ndjson(io.BytesIO(LONG_LINE), chunk_size=1024))
+        self.assertEqual(rows, [(None, LINE_TOO_LONG_ERROR)])
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class JSONCarImporterTests(TestCase):
+    def test_item_statuses_are_capped(self):
+        importer = JSONCarImporter(max_item_results=2)
+        items = [{'brand': 'BMW', 'model': f'M{i}', 'body_type': 'SUV'} for i in range(4)] + [{'brand': 'BMW'}]
+        results = importer.import_items(items)
+
+        self.assertEqual(results['cars_processed'], 4)
+        self.assertEqual(results['invalid_entries'], 1)
+        self.assertEqual(importer.items_total, 5)
+        self.assertTrue(importer.items_truncated)
+        self.assertEqual([item['status'] for item in importer.items], ['created', 'created'])
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class NDJSONEndpointTests(TransactionTestCase):
+    # Представление вызывает close_old_connections(), обычный TestCase с транзакцией не подходит
+
+    def test_ndjson_endpoint_reports_long_line(self):
+        response = self.client.post(
+            reverse('add_cars'), data=ndjson(CAR, LONG_LINE), content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['cars_processed'], 1)
+        self.assertFalse(data['items_truncated'])
+        self.assertEqual(data['items'][1], {'index': 1, 'status': 'invalid', 'error': LINE_TOO_LONG_ERROR})
+        self.assertEqual(Car.objects.count(), 1)
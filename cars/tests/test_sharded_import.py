@@ -0,0 +1,87 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+
+from cars.models import BodyType, Brand, CarModel, ImportJob
+from cars.utils.bulk_import import CarBulkImporter
+from cars.utils.counters import reconcile_counters
+from cars_project.tasks import finish_sharded_import, import_cars_from_xml, import_xml_shard
+
+
+def write_catalog(rows):
+    handle, path = tempfile.mkstemp(suffix='.xml')
+    items = ''.join(
+        f'<Modification><Make>{make}</Make><Model>{model}</Model><BodyType>{body}</BodyType></Modification>'
+        for make, model, body in rows
+    )
+    with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+        stream.write(f'<Catalog>{items}</Catalog>')
+    return path
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class ShardedImportTests(TestCase):
+    def setUp(self):
+        self.path = write_catalog([('BMW', 'X5', 'SUV'), ('bmw', 'x5', 'suv'), ('Audi', 'A4', 'Sedan')])
+        self.addCleanup(os.remove, self.path)
+
+    def test_missing_file_marks_job_failed(self):
+        job = ImportJob.objects.create(source='/nonexistent/catalog.xml', options={'shards': 2})
+
+        result = import_cars_from_xml(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('catalog.xml', job.error_message)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_chord_dispatch_error_marks_job_failed(self):
+        job = ImportJob.objects.create(source=self.path, options={'shards': 2})
+
+        with mock.patch('cars_project.tasks.chord', side_effect=ConnectionError('broker down')):
+            result = import_cars_from_xml(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error_message, 'broker down')
+
+    def test_shards_merge_case_variants(self):
+        job = ImportJob.objects.create(source=self.path, options={'shards': 3})
+        with mock.patch('cars_project.tasks.chord') as dispatch:
+            import_cars_from_xml(job.id)
+        shards = [signature.args for signature in dispatch.call_args.args[0]]
+        self.assertGreater(len(shards), 1)
+
+        results = [import_xml_shard(*args) for args in shards]
+        finish_sharded_import(results, job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'success')
+        self.assertEqual(job.results['cars_processed'], 2)
+        self.assertEqual(Brand.objects.count(), 2)
+        self.assertEqual(CarModel.objects.count(), 2)
+        self.assertEqual(BodyType.objects.count(), 2)
+        self.assertEqual(reconcile_counters(fix=False), [])
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class NameKeyConflictTests(TestCase):
+    def test_name_key_is_unique(self):
+        Brand.objects.create(name='BMW')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Brand.objects.create(name='bmw')
+
+    def test_stale_importer_reuses_case_variant(self):
+        # Справочники загружены до того, как другой шард создал бренд
+        stale = CarBulkImporter()
+        stale.prefetch()
+        CarBulkImporter().import_rows([('BMW', 'X5', 'SUV')])
+
+        self.assertEqual(stale.import_rows([('bmw', 'x5', 'suv')]), [False])
+        self.assertEqual(Brand.objects.get().name, 'BMW')
+        self.assertEqual(reconcile_counters(fix=False), [])
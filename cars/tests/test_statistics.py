@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.db.models import Count
+from django.test import TestCase, override_settings
+
+from cars.models import BodyType, Brand, Car, CarModel, Statistic
+from cars.utils.bulk_import import CarBulkImporter
+from cars.utils.statistics import SECTIONS, TOP_BRANDS_LIMIT, compute_statistics
+from cars.utils.task_lock import MemoryTaskLock
+from cars_project.tasks import collect_and_save_stats
+
+
+ROWS = [
+    ('BMW', 'X5', 'SUV'),
+    ('BMW', 'X5', 'Sedan'),
+    ('BMW', '3 Series', 'Sedan'),
+    ('Audi', 'A4', 'Sedan'),
+    ('Audi', 'Q7', 'SUV'),
+    ('Lada', 'Niva', 'SUV'),
+    ('Kia', 'Rio', 'Hatchback'),
+]
+
+
+def scanned_statistics():
+    """Те же разделы, посчитанные напрямую по таблицам каталога"""
+    brands = Brand.objects.annotate(car_count=Count('carmodel__car'), model_count=Count('carmodel', distinct=True))
+    return {
+        'total_brands': Brand.objects.count(),
+        'total_models': CarModel.objects.count(),
+        'total_cars': Car.objects.count(),
+        'total_body_types': BodyType.objects.count(),
+        'body_type_distribution': dict(
+            BodyType.objects.annotate(car_count=Count('car')).order_by('name').values_list('name', 'car_count')
+        ),
+        'top_brands': [
+            {'name': brand.name, 'model_count': brand.model_count, 'car_count': brand.car_count}
+            for brand in brands.order_by('-car_count', 'pk')[:TOP_BRANDS_LIMIT]
+        ],
+    }
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class CounterStatisticsTests(TestCase):
+    def test_matches_table_scan_after_imports_and_deletes(self):
+        CarBulkImporter(chunk_size=3).import_records(ROWS)
+        self.assertEqual(compute_statistics(), scanned_statistics())
+
+        Car.objects.filter(model__name='Q7').delete()
+        CarModel.objects.get(name='3 Series').delete()
+        BodyType.objects.get(name='Hatchback').delete()
+        Brand.objects.get(name='Lada').delete()
+        CarBulkImporter().import_records([('Audi', 'A6', 'Wagon')])
+
+        self.assertEqual(compute_statistics(), scanned_statistics())
+
+
+def failing_section():
+    raise RuntimeError('section failed')
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+@mock.patch('cars.utils.task_lock._task_lock', MemoryTaskLock())
+class CollectStatisticsTests(TestCase):
+    def setUp(self):
+        CarBulkImporter().import_records(ROWS)
+
+    def test_sections_are_saved_with_timings(self):
+        result = collect_and_save_stats.apply().result
+
+        stat = Statistic.objects.get(pk=result['statistics_id'])
+        self.assertEqual(stat.json_statistics, scanned_statistics())
+        self.assertEqual(set(stat.sections), set(SECTIONS))
+        self.assertTrue(all(report['status'] == 'success' and report['duration'] is not None
+                            for report in stat.sections.values()))
+
+    @mock.patch.dict(SECTIONS, {'top_brands': failing_section})
+    def test_failed_section_is_reported_and_left_out(self):
+        result = collect_and_save_stats.apply().result
+
+        stat = Statistic.objects.get(pk=result['statistics_id'])
+        self.assertEqual(result['failed_sections'], ['top_brands'])
+        self.assertNotIn('top_brands', stat.json_statistics)
+        self.assertEqual(stat.sections['top_brands']['error'], 'section failed')
+
+    @mock.patch.dict(SECTIONS, {'total_cars': failing_section})
+    def test_missing_basic_count_saves_nothing_and_releases_lock(self):
+        result = collect_and_save_stats.apply().result
+
+        self.assertEqual(result['status'], 'error')
+        self.assertFalse(Statistic.objects.exists())
+        # Блокировка освобождена: следующий запуск не объединяется с этим
+        self.assertEqual(collect_and_save_stats.apply().result['status'], 'error')
@@ -0,0 +1,110 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from cars.models import BodyType, Brand, Statistic
+from cars.utils.counters import get_catalog_version, reconcile_counters
+from cars.utils.stats_cache import get_cached_statistics, get_statistics_version
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class StatisticsVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog_change_bumps_version_in_the_same_transaction(self):
+        before = get_statistics_version()
+
+        Brand.objects.create(name='BMW')
+
+        # Версия читается из базы, без ожидания on_commit и общего кэша
+        self.assertNotEqual(get_statistics_version(), before)
+
+    def test_rolled_back_change_keeps_version(self):
+        before = get_statistics_version()
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Brand.objects.create(name='BMW')
+            raise RuntimeError
+
+        self.assertEqual(get_statistics_version(), before)
+
+    def test_new_snapshot_bumps_version(self):
+        before = get_statistics_version()
+
+        Statistic.objects.create(json_statistics={})
+
+        self.assertNotEqual(get_statistics_version(), before)
+
+    def test_cached_payload_is_not_served_after_catalog_change(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(get_cached_statistics(build), 1)
+        self.assertEqual(get_cached_statistics(build), 1)
+
+        Brand.objects.create(name='BMW')
+
+        self.assertEqual(get_cached_statistics(build), 2)
+
+    def test_reconcile_keeps_catalog_version(self):
+        Brand.objects.create(name='BMW')
+        version = get_catalog_version()
+
+        self.assertEqual(reconcile_counters(fix=False), [])
+        self.assertEqual(get_catalog_version(), version)
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class StatisticsEtagTests(TestCase):
+    url = '/api/statistics/'
+
+    def setUp(self):
+        cache.clear()
+        Statistic.objects.create(json_statistics={'total_brands': 0})
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, HTTP_ACCEPT='application/json', **headers)
+
+    def test_matching_etag_returns_not_modified(self):
+        first = self.get()
+
+        second = self.get(first['ETag'])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_catalog_change_invalidates_etag(self):
+        etag = self.get()['ETag']
+
+        Brand.objects.create(name='BMW')
+        response = self.get(etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['current_stats']['total_brands'], 1)
+
+    def test_body_type_rename_invalidates_etag(self):
+        body_type = BodyType.objects.create(name='SUV')
+        etag = self.get()['ETag']
+
+        body_type.name = 'Crossover'
+        body_type.save()
+        response = self.get(etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Crossover', str(response.json()['data']['current_stats']['body_type_distribution']))
+
+    def test_new_snapshot_invalidates_etag(self):
+        etag = self.get()['ETag']
+
+        Statistic.objects.create(json_statistics={'total_brands': 1})
+        response = self.get(etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['statistics'], {'total_brands': 1})
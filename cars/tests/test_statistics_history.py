@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cars.models import Statistic
+
+
+def snapshot(day, hour, total, **fields):
+    stat = Statistic.objects.create(json_statistics={'total_cars': total}, **fields)
+    moment = timezone.make_aware(datetime(2026, 1, day, hour))
+    Statistic.objects.filter(pk=stat.pk).update(date_calculated=moment)
+    return stat
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class StatisticsHistoryViewTests(TestCase):
+    def setUp(self):
+        # По два снимка в день 10-12 января, у двух снимков 11-го одинаковое время
+        self.stats = [
+            snapshot(10, 9, 1), snapshot(10, 18, 2),
+            snapshot(11, 9, 3), snapshot(11, 9, 4),
+            snapshot(12, 9, 5), snapshot(12, 18, 6),
+        ]
+
+    def get(self, url=None, **params):
+        response = self.client.get(url or reverse('statistics_history'), params, HTTP_ACCEPT='application/json')
+        return response.status_code, response.json()
+
+    def totals(self, payload):
+        return [item['statistics']['total_cars'] for item in payload['data']['items']]
+
+    def test_raw_pages_follow_next_links(self):
+        pages = []
+        status_code, payload = self.get(limit=4)
+        pages.append(self.totals(payload))
+        while payload['data']['next']:
+            status_code, payload = self.get(payload['data']['next'])
+            self.assertEqual(status_code, 200)
+            pages.append(self.totals(payload))
+
+        # Снимки с одинаковым временем не теряются и не повторяются на границе страниц
+        self.assertEqual(pages, [[1, 2, 3, 4], [5, 6]])
+        self.assertIsNone(payload['data']['next_cursor'])
+
+    def test_page_boundary_between_equal_timestamps(self):
+        status_code, first = self.get(limit=3)
+        status_code, second = self.get(limit=3, cursor=first['data']['next_cursor'])
+
+        self.assertEqual(self.totals(first), [1, 2, 3])
+        self.assertEqual(self.totals(second), [4, 5, 6])
+
+    def test_day_bucket_keeps_last_snapshot_of_each_day(self):
+        status_code, first = self.get(bucket='day', limit=2)
+        status_code, second = self.get(bucket='day', limit=2, cursor=first['data']['next_cursor'])
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(self.totals(first), [2, 4])
+        self.assertEqual(self.totals(second), [6])
+        self.assertIsNone(second['data']['next'])
+        self.assertEqual(second['data']['bucket'], 'day')
+
+    def test_date_range_filter(self):
+        # Дата без времени в to включает весь день
+        status_code, payload = self.get(**{'from': '2026-01-11', 'to': '2026-01-11'})
+
+        self.assertEqual(self.totals(payload), [3, 4])
+
+    def test_datetime_range_filter(self):
+        start = timezone.make_aware(datetime(2026, 1, 10, 12)).isoformat()
+        end = timezone.make_aware(datetime(2026, 1, 12, 12)).isoformat()
+
+        status_code, payload = self.get(**{'from': start, 'to': end})
+
+        self.assertEqual(self.totals(payload), [2, 3, 4, 5])
+
+    def test_delta_snapshot_is_expanded(self):
+        Statistic.objects.all().delete()
+        base = snapshot(10, 9, 1)
+        Statistic.objects.filter(pk=base.pk).update(json_statistics={'total_cars': 1, 'total_brands': 2})
+        snapshot(11, 9, 7, base=base)
+
+        status_code, payload = self.get()
+
+        self.assertEqual(payload['data']['items'][1]['statistics'], {'total_cars': 7, 'total_brands': 2})
+
+    def test_invalid_parameters(self):
+        for params in ({'bucket': 'month'}, {'limit': 0}, {'limit': 5000}, {'cursor': 'broken'},
+                       {'from': 'yesterday'}):
+            with self.subTest(params=params):
+                status_code, payload = self.get(**params)
+                self.assertEqual(status_code, 400)
+                self.assertIn('Некорректные параметры запроса', payload['metadata']['message'])
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cars.models import Brand, Car, CarModel, Statistic
+from cars.utils.counters import get_catalog_version
+from cars.utils.statistics import compute_statistics, has_catalog_changes
+from cars.utils.stats_refresh import check_refresh_cache, schedule_statistics_refresh
+from cars.utils.task_lock import MemoryTaskLock
+from cars_project.tasks import collect_and_save_stats
+
+
+REDIS_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                            'LOCATION': 'redis://localhost:6379/1'}}
+
+
+def snapshot(catalog_version):
+    return Statistic.objects.create(json_statistics=compute_statistics(), catalog_version=catalog_version)
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class CatalogChangeDetectionTests(TestCase):
+    def test_unchanged_catalog(self):
+        Brand.objects.create(name='BMW')
+
+        self.assertFalse(has_catalog_changes(snapshot(get_catalog_version())))
+
+    def test_change_committed_after_calculation_started(self):
+        brand = Brand.objects.create(name='BMW')
+        model = CarModel.objects.create(brand=brand, name='X5')
+        version = get_catalog_version()
+        previous = snapshot(version)
+
+        # Транзакция, зафиксированная после чтения версии, меняет версию
+        # независимо от того, когда она началась
+        Car.objects.create(model=model)
+
+        self.assertTrue(has_catalog_changes(previous))
+
+    def test_snapshot_without_version_is_stale(self):
+        self.assertTrue(has_catalog_changes(snapshot(None)))
+
+    def test_brand_rename_is_a_change(self):
+        brand = Brand.objects.create(name='BMW')
+        previous = snapshot(get_catalog_version())
+
+        brand.name = 'B.M.W.'
+        brand.save()
+
+        self.assertTrue(has_catalog_changes(previous))
+
+    @mock.patch('cars.utils.task_lock._task_lock', MemoryTaskLock())
+    def test_collect_skips_unchanged_catalog(self):
+        Brand.objects.create(name='BMW')
+        previous = snapshot(get_catalog_version())
+
+        result = collect_and_save_stats.apply().result
+
+        self.assertEqual(result['status'], 'skipped')
+        self.assertEqual(result['statistics_id'], previous.id)
+        self.assertEqual(Statistic.objects.count(), 1)
+
+
+class RefreshCacheCheckTests(SimpleTestCase):
+    @override_settings(STATISTICS_REFRESH_ON_CHANGE=True)
+    def test_process_local_cache_is_rejected(self):
+        self.assertEqual([error.id for error in check_refresh_cache()], ['cars.E001'])
+        with self.assertRaises(ImproperlyConfigured):
+            schedule_statistics_refresh()
+
+    @override_settings(STATISTICS_REFRESH_ON_CHANGE=True, CACHES=REDIS_CACHES)
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_refresh_cache(), [])
+
+    @override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+    def test_disabled_refresh_needs_no_shared_cache(self):
+        self.assertEqual(check_refresh_cache(), [])
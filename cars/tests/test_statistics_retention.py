@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase, override_settings
+
+from cars.models import Statistic
+from cars.utils.statistics_retention import KEYFRAME_INTERVAL, compact_statistics
+
+
+NOW = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+BODY_TYPES = [f'Body {i}' for i in range(40)]
+
+
+def snapshot_json(day, hour):
+    """Крупный снимок, от дня к дню меняются отдельные значения"""
+    stats = {
+        'total_cars': 1000 + day * 10 + hour,
+        'body_type_distribution': {name: 10 + i for i, name in enumerate(BODY_TYPES)},
+        'top_brands': [{'name': 'BMW', 'model_count': 5, 'car_count': 100 + day}],
+    }
+    stats['body_type_distribution'][BODY_TYPES[day % len(BODY_TYPES)]] += day
+    if day % 5 == 0:
+        # Раздел пропал (не посчитан) - дельта должна удалить ключ
+        del stats['top_brands']
+    if day % 7 == 0:
+        # null патчем не выражается: дельта допустима, только если он есть и в ключевом снимке
+        stats['total_body_types'] = None
+    return stats
+
+
+def create_history(days):
+    """По три снимка в день, возвращает {id: исходный JSON}"""
+    originals = {}
+    for day in range(days):
+        for hour in (9, 11, 13):
+            stats = snapshot_json(day, hour)
+            stat = Statistic.objects.create(json_statistics=stats)
+            moment = NOW - timedelta(days=days - day + 30) + timedelta(hours=hour - 12)
+            Statistic.objects.filter(pk=stat.pk).update(date_calculated=moment)
+            originals[stat.pk] = stats
+    return originals
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class StatisticsCompactionTests(TestCase):
+    def assert_reconstructed(self, originals):
+        for stat in Statistic.objects.select_related('base'):
+            self.assertEqual(stat.statistics, originals[stat.pk], f"snapshot {stat.pk}")
+
+    def test_daily_deltas_reproduce_snapshots(self):
+        originals = create_history(KEYFRAME_INTERVAL + 10)
+
+        report = compact_statistics(now=NOW, raw_days=7, daily_days=365)
+
+        self.assertEqual(Statistic.objects.count(), KEYFRAME_INTERVAL + 10)
+        self.assertEqual(report['rows_rolled_up'], KEYFRAME_INTERVAL + 10)
+        self.assertGreater(report['rows_delta_encoded'], 0)
+        self.assertGreater(report['bytes_reclaimed'], 0)
+        # Остается последний снимок дня
+        self.assertEqual(
+            {originals[pk]['total_cars'] % 10 for pk in Statistic.objects.values_list('pk', flat=True)}, {3}
+        )
+        # Дельты опираются только на полные снимки
+        self.assertFalse(Statistic.objects.filter(base__base__isnull=False).exists())
+        self.assert_reconstructed(originals)
+
+    def test_weekly_rollup_expands_deltas_of_deleted_keyframes(self):
+        originals = create_history(21)
+        compact_statistics(now=NOW, raw_days=7, daily_days=365)
+        self.assertTrue(Statistic.objects.filter(base__isnull=False).exists())
+
+        # Повторный проход сворачивает дни до недель: ключевые снимки удаляются
+        report = compact_statistics(now=NOW, raw_days=7, daily_days=7)
+
+        self.assertGreater(report['rows_deleted'], 0)
+        self.assertEqual(set(Statistic.objects.values_list('resolution', flat=True)), {'weekly'})
+        self.assert_reconstructed(originals)
+
+    def test_second_run_changes_nothing(self):
+        originals = create_history(10)
+        compact_statistics(now=NOW, raw_days=7, daily_days=365)
+        stored = list(Statistic.objects.order_by('pk').values_list('pk', 'json_statistics', 'base_id'))
+
+        report = compact_statistics(now=NOW, raw_days=7, daily_days=365)
+
+        self.assertEqual(report['rows_deleted'], 0)
+        self.assertEqual(report['rows_delta_encoded'], 0)
+        self.assertEqual(list(Statistic.objects.order_by('pk').values_list('pk', 'json_statistics', 'base_id')), stored)
+        self.assert_reconstructed(originals)
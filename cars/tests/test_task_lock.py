@@ -0,0 +1,94 @@
+import time
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+
+from cars.utils.task_lock import MemoryTaskLock, RedisTaskLock, acquire_run, finish_run, run_metrics
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis нужен только для тестов блокировки в Redis
+    fakeredis = None
+
+
+NAME = 'collect_statistics'
+
+
+class TaskLockContract:
+    """Общие проверки блокировки; make_lock() задают подклассы"""
+
+    def setUp(self):
+        self.lock = self.make_lock()
+        patcher = mock.patch('cars.utils.task_lock._task_lock', self.lock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_owner_releases(self):
+        self.assertTrue(self.lock.acquire(NAME, 'owner', 10))
+        self.assertFalse(self.lock.acquire(NAME, 'other', 10))
+
+        self.assertFalse(self.lock.release(NAME, 'other'))
+        self.assertTrue(self.lock.release(NAME, 'owner'))
+        self.assertTrue(self.lock.acquire(NAME, 'other', 10))
+
+    def test_expired_lock_can_be_taken_over(self):
+        self.assertTrue(self.lock.acquire(NAME, 'crashed', 0.05))
+        time.sleep(0.1)
+
+        self.assertTrue(self.lock.acquire(NAME, 'next', 10))
+        # Владелец истекшей блокировки не снимает чужую
+        self.assertFalse(self.lock.release(NAME, 'crashed'))
+        self.assertFalse(self.lock.acquire(NAME, 'third', 10))
+
+    def test_run_waits_for_expiring_lock(self):
+        self.lock.acquire(NAME, 'crashed', 0.2)
+
+        token = acquire_run(NAME, wait=5, timeout=10)
+
+        self.assertIsNotNone(token)
+        metrics = run_metrics(NAME)
+        self.assertEqual((metrics['runs'], metrics['waits']), (1, 1))
+        self.assertGreater(metrics['wait_seconds'], 0)
+
+    def test_concurrent_runs_coalesce_into_one_follow_up(self):
+        token = acquire_run(NAME, wait=0, timeout=10)
+
+        skipped = [acquire_run(NAME, wait=0, timeout=10), acquire_run(NAME, full=True, wait=0, timeout=10),
+                   acquire_run(NAME, wait=0, timeout=10)]
+
+        self.assertEqual(skipped, [None, None, None])
+        self.assertEqual(finish_run(NAME, token), {'full': True})
+        # Флаг забран: следующий запуск без повторного
+        second = acquire_run(NAME, wait=0, timeout=10)
+        self.assertIsNone(finish_run(NAME, second))
+        metrics = run_metrics(NAME)
+        self.assertEqual((metrics['runs'], metrics['skipped'], metrics['follow_ups']), (2, 3, 1))
+
+    def test_finish_after_expiry_is_reported(self):
+        token = acquire_run(NAME, wait=0, timeout=0.05)
+        time.sleep(0.1)
+
+        with self.assertLogs('cars.utils.task_lock', 'WARNING'):
+            self.assertIsNone(finish_run(NAME, token))
+
+    def test_run_released_while_requesting_follow_up(self):
+        self.lock.acquire(NAME, 'owner', 10)
+        # Владелец освобождает блокировку между неудачным захватом и флагом
+        with mock.patch.object(self.lock, 'acquire', side_effect=[False, True]):
+            token = acquire_run(NAME, wait=0, timeout=10)
+
+        self.assertIsNotNone(token)
+        # Этот запуск и есть повторный, флаг не остается
+        self.assertIsNone(self.lock.take_follow_up(NAME))
+
+
+class MemoryTaskLockTests(TaskLockContract, SimpleTestCase):
+    def make_lock(self):
+        return MemoryTaskLock()
+
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+class RedisTaskLockTests(TaskLockContract, SimpleTestCase):
+    def make_lock(self):
+        with mock.patch('redis.Redis.from_url', return_value=fakeredis.FakeRedis()):
+            return RedisTaskLock('redis://test')
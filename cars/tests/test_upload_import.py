@@ -0,0 +1,124 @@
+import gzip
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from cars.models import Car
+from cars.utils.upload_import import StreamDecoder
+from cars.utils.xml_stream import READ_CHUNK_SIZE
+
+
+def catalog_xml(*models, make='BMW'):
+    items = ''.join(
+        f'<Modification><Make>{make}</Make><Model>{model}</Model><BodyType>Sedan</BodyType></Modification>'
+        for model in models
+    )
+    return f'<Catalog>{items}</Catalog>'.encode()
+
+
+def decode(data, chunk_size, max_output=16):
+    decoder = StreamDecoder(max_output=max_output)
+    output = b''
+    for start in range(0, len(data), chunk_size):
+        output += b''.join(decoder.decode(data[start:start + chunk_size]))
+    return output + b''.join(decoder.flush())
+
+
+class StreamDecoderTests(SimpleTestCase):
+    def test_plain_data_is_passed_through(self):
+        data = catalog_xml('X5')
+        self.assertEqual(decode(data, chunk_size=1), data)
+
+    def test_gzip_is_decoded_in_bounded_fragments(self):
+        data = catalog_xml(*(f'M{i}' for i in range(50)))
+        decoder = StreamDecoder(max_output=64)
+
+        fragments = list(decoder.decode(gzip.compress(data)))
+
+        self.assertTrue(decoder.compressed)
+        self.assertTrue(all(len(fragment) <= 64 for fragment in fragments))
+        self.assertEqual(b''.join(fragments) + b''.join(decoder.flush()), data)
+
+    def test_multi_member_gzip(self):
+        data = gzip.compress(b'<Catalog>') + gzip.compress(catalog_xml('X5')[9:])
+        # Граница членов попадает внутрь порций чтения
+        self.assertEqual(decode(data, chunk_size=7), catalog_xml('X5'))
+
+    def test_input_shorter_than_signature(self):
+        self.assertEqual(decode(b'<', chunk_size=1), b'<')
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class UploadEndpointTests(TransactionTestCase):
+    # Представление вызывает close_old_connections(), обычный TestCase с транзакцией не подходит
+
+    def post(self, data, content_type):
+        return self.client.post(reverse('add_cars'), data=data, content_type=content_type)
+
+    def test_raw_xml_body(self):
+        response = self.post(catalog_xml('X5', 'X6'), 'application/xml')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['cars_processed'], 2)
+
+    def test_gzip_body(self):
+        response = self.post(gzip.compress(catalog_xml('X5', 'X6')), 'application/gzip')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['cars_processed'], 2)
+        self.assertEqual(Car.objects.count(), 2)
+
+    def test_multi_member_gzip_body(self):
+        body = gzip.compress(b'<Catalog>' + catalog_xml('X5')[9:-10]) + gzip.compress(catalog_xml('X6')[9:])
+
+        response = self.post(body, 'application/gzip')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['cars_processed'], 2)
+
+    def test_multipart_file_is_streamed(self):
+        upload = SimpleUploadedFile('catalog.xml.gz', gzip.compress(catalog_xml('X5', 'X6', 'X7')))
+
+        response = self.client.post(reverse('add_cars'), {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['cars_processed'], 3)
+        self.assertEqual(Car.objects.count(), 3)
+
+    def test_multipart_accepts_one_file(self):
+        first = SimpleUploadedFile('first.xml', catalog_xml('X5'))
+        second = SimpleUploadedFile('second.xml', catalog_xml('A4', make='Audi'))
+
+        response = self.client.post(reverse('add_cars'), {'first': first, 'second': second})
+
+        self.assertEqual(response.status_code, 400)
+        # Второй файл не разбирается
+        self.assertFalse(Car.objects.filter(model__brand__name='Audi').exists())
+
+    def test_multipart_without_file(self):
+        response = self.client.post(reverse('add_cars'), {'comment': 'no file'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['metadata']['message'], 'XML файл не передан')
+
+    def test_parse_error_keeps_partial_results(self):
+        # Документ длиннее блока чтения: начало разобрано до того, как встретилась ошибка
+        valid = catalog_xml(*(f'M{i}' for i in range(2000)))[:-len('</Catalog>')]
+        self.assertGreater(len(valid), READ_CHUNK_SIZE)
+
+        response = self.post(valid + b'<Modification><Make>BMW</Make></Catalog>', 'application/xml')
+
+        self.assertEqual(response.status_code, 400)
+        payload = response.json()
+        self.assertEqual(payload['metadata']['message'], 'Ошибка разбора XML файла')
+        self.assertGreater(payload['data']['cars_processed'], 0)
+        self.assertEqual(Car.objects.count(), payload['data']['cars_processed'])
+
+    def test_corrupted_gzip_is_rejected(self):
+        body = gzip.compress(catalog_xml('X5'))
+
+        response = self.post(body[:10] + b'\x00' * 20 + body[30:], 'application/gzip')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['metadata']['message'], 'Ошибка разбора XML файла')
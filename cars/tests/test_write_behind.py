@@ -0,0 +1,108 @@
+from unittest import mock, skipIf, skipUnless
+
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase, override_settings
+
+from cars.models import Brand, Car
+from cars.utils.bulk_import import CarBulkImporter
+from cars.utils.write_behind import MemoryWriteQueue, RedisWriteQueue, WriteCoalescer, new_entry
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis нужен только для тестов очереди Redis
+    fakeredis = None
+
+
+def statuses(write_queue, entries):
+    return [write_queue.get_ack(entry['ack_id'])['status'] for entry in entries]
+
+
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class WriteCoalescerTests(TransactionTestCase):
+    # Внешние ключи PostgreSQL проверяются при фиксации, нужны настоящие транзакции
+
+    def setUp(self):
+        self.queue = MemoryWriteQueue()
+        self.coalescer = WriteCoalescer(self.queue, batch_size=10, max_wait=0)
+
+    def flush(self, *cars):
+        entries = [new_entry(*car) for car in cars]
+        for entry in entries:
+            self.queue.enqueue(entry)
+        self.assertEqual(self.coalescer.run_once(block_timeout=0.1), len(entries))
+        return statuses(self.queue, entries)
+
+    @skipUnless(connection.vendor == 'postgresql', 'SQLite does not enforce varchar length')
+    def test_failing_row_does_not_fail_siblings(self):
+        # Имя бренда длиннее поля: ошибка БД только для этой строки
+        result = self.flush(('BMW', 'X5', 'SUV'), ('B' * 60, 'X5', 'SUV'), ('Audi', 'A4', 'Sedan'))
+
+        self.assertEqual(result, ['created', 'error', 'created'])
+        self.assertEqual(Car.objects.count(), 2)
+
+    def test_deleted_brand_in_cache_is_resolved_again(self):
+        self.flush(('BMW', 'X5', 'SUV'))
+        Brand.objects.get(name='BMW').delete()
+
+        result = self.flush(('BMW', 'X5', 'SUV'), ('Audi', 'A4', 'Sedan'))
+
+        self.assertEqual(result, ['created', 'created'])
+        self.assertEqual(Car.objects.count(), 2)
+
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+@override_settings(STATISTICS_REFRESH_ON_CHANGE=False)
+class RedisWriteQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeRedis()
+        patcher = mock.patch('redis.Redis.from_url', return_value=self.server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unacknowledged_batch_is_redelivered(self):
+        write_queue = RedisWriteQueue('redis://test', consumer='worker-1')
+        entries = [new_entry('BMW', f'M{i}', 'SUV') for i in range(3)]
+        for entry in entries:
+            write_queue.enqueue(entry)
+
+        # Потребитель забрал порцию и упал до записи в БД
+        self.assertEqual(len(write_queue.pop_batch(10, 0, block_timeout=0.1)), 3)
+        self.assertEqual(write_queue.size(), 0)
+
+        restarted = RedisWriteQueue('redis://test', consumer='worker-1')
+        other = RedisWriteQueue('redis://test', consumer='worker-2')
+        self.assertEqual(other.pop_batch(10, 0, block_timeout=0.1), [])
+
+        self.assertEqual(WriteCoalescer(restarted, batch_size=10, max_wait=0).run_once(block_timeout=0.1), 3)
+        self.assertEqual(statuses(restarted, entries), ['created'] * 3)
+        self.assertEqual(self.server.llen(restarted.processing_key), 0)
+        self.assertEqual(Car.objects.count(), 3)
+
+    def test_database_outage_leaves_batch_unacknowledged(self):
+        write_queue = RedisWriteQueue('redis://test', consumer='worker-1')
+        entries = [new_entry('BMW', f'M{i}', 'SUV') for i in range(3)]
+        for entry in entries:
+            write_queue.enqueue(entry)
+        coalescer = WriteCoalescer(write_queue, batch_size=10, max_wait=0)
+
+        with mock.patch.object(CarBulkImporter, 'import_chunk', side_effect=OperationalError('server closed')):
+            with self.assertRaises(OperationalError):
+                coalescer.run_once(block_timeout=0.1)
+
+        # Порция не отмечена ошибочной и осталась в списке обработки
+        self.assertEqual(statuses(write_queue, entries), ['queued'] * 3)
+        self.assertEqual(self.server.llen(write_queue.processing_key), 3)
+
+        self.assertEqual(coalescer.run_once(block_timeout=0.1), 3)
+        self.assertEqual(statuses(write_queue, entries), ['created'] * 3)
+
+    def test_consumer_name_is_claimed_by_one_process(self):
+        first = RedisWriteQueue('redis://test', consumer='worker-1')
+        second = RedisWriteQueue('redis://test', consumer='worker-1')
+
+        self.assertTrue(first.claim())
+        self.assertFalse(second.claim())
+        self.assertTrue(RedisWriteQueue('redis://test', consumer='worker-2').claim())
+
+        first.release()
+        self.assertTrue(second.claim())
@@ -0,0 +1,66 @@
+import io
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from cars.utils.xml_stream import (
+    ModificationStreamParser, find_shard_ranges, iter_modifications, iter_modifications_in_range
+)
+
+
+def catalog_xml(count, make='BMW'):
+    """XML каталога из count модификаций с разными моделями"""
+    items = ''.join(
+        f'<Modification><Make>{make}</Make><Model>M{i}</Model><BodyType>Sedan</BodyType></Modification>'
+        for i in range(count)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><Catalog><Mark>{items}</Mark></Catalog>'.encode()
+
+
+class ModificationStreamParserTests(SimpleTestCase):
+    def test_records_across_chunk_boundaries(self):
+        data = catalog_xml(20)
+        records = list(iter_modifications(io.BytesIO(data), chunk_size=7))
+        self.assertEqual(len(records), 20)
+        self.assertEqual(records[0], ('BMW', 'M0', 'Sedan'))
+        self.assertEqual(records[-1], ('BMW', 'M19', 'Sedan'))
+
+    def test_missing_fields_are_empty(self):
+        parser = ModificationStreamParser()
+        records = parser.feed(b'<Catalog><Modification><Make> Audi </Make></Modification></Catalog>')
+        records += parser.close()
+        self.assertEqual(records, [('Audi', '', '')])
+
+    def test_completed_elements_are_dropped(self):
+        parser = ModificationStreamParser()
+        parser.feed(catalog_xml(50).removesuffix(b'</Mark></Catalog>'))
+        # Открыты только <Catalog> и <Mark>, обработанные элементы удалены из дерева
+        self.assertEqual([elem.tag for elem in parser._stack], ['Catalog', 'Mark'])
+        self.assertEqual(len(parser._stack[-1]), 0)
+
+    def test_progress_reports_bytes_read(self):
+        data = catalog_xml(5)
+        seen = []
+        list(iter_modifications(io.BytesIO(data), chunk_size=16, progress=seen.append))
+        self.assertEqual(seen[-1], len(data))
+
+
+class ShardRangeTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.xml')
+        with os.fdopen(handle, 'wb') as stream:
+            stream.write(catalog_xml(100))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_shards_cover_every_record_once(self):
+        ranges = find_shard_ranges(self.path, 4)
+        self.assertEqual(len(ranges), 4)
+        records = [
+            record
+            for start, end in ranges
+            for record in iter_modifications_in_range(self.path, start, end, chunk_size=32)
+        ]
+        self.assertEqual(records, list(iter_modifications(self.path)))
@@ -1,11 +1,15 @@
 from django.urls import path
 
-from .views import APIRootView, AddCarsFromXML, StatisticsView
+from .views import (APIRootView, AddCarsFromXML, ImportJobView, StatisticsHistoryView, StatisticsView,
+                    WriteAckView)
 
 
 urlpatterns = [
     path('', APIRootView.as_view(), name='api-root'),
     path('add/', AddCarsFromXML.as_view(), name='add_cars'),
     path('statistics/', StatisticsView.as_view(), name='statistics'),
+    path('statistics/history/', StatisticsHistoryView.as_view(), name='statistics_history'),
+    path('import-jobs/<int:pk>/', ImportJobView.as_view(), name='import_job'),
+    path('write-acks/<str:ack_id>/', WriteAckView.as_view(), name='write_ack'),
 
 ]
\ No newline at end of file
@@ -0,0 +1,92 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from cars.models import AuditLog
+from cars.utils.audit_queue import enqueue_audit_entries
+
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = 1000
+
+_local = threading.local()
+
+
+def write_audit_entries(entries, using=DEFAULT_DB_ALIAS):
+    """
+    Сохраняет записи аудита: в очередь при AUDIT_ASYNC, иначе одним bulk_create
+
+    Если очередь переполнена или недоступна, записи сохраняются сразу.
+    """
+    if settings.AUDIT_ASYNC and enqueue_audit_entries(entries):
+        return
+    AuditLog.objects.using(using).bulk_create(entries, batch_size=AUDIT_BATCH_SIZE)
+
+
+class AuditBuffer:
+    """Записи аудита одной транзакции, сохраняемые после ее фиксации"""
+
+    def __init__(self, using):
+        self.using = using
+        self.entries = []
+
+    def flush(self):
+        if not self.entries:
+            return
+        entries, self.entries = self.entries, []
+        try:
+            write_audit_entries(entries, self.using)
+            logger.debug(f"Audit log: {len(entries)} entries written")
+        except Exception as e:
+            # Данные уже зафиксированы, ошибка аудита не должна до них дойти
+            logger.error(f"Failed to write {len(entries)} audit log entries: {str(e)}")
+
+
+def _current_buffer(using):
+    """
+    Буфер текущей транзакции (и текущей точки сохранения)
+
+    Буфер регистрируется через on_commit, поэтому Django сам отбрасывает
+    его при откате транзакции или точки сохранения, в которой он создан.
+    Список on_commit соединения заменяется при фиксации и любом откате,
+    так что совпадение списка и точек сохранения означает, что буфер
+    еще действителен.
+    """
+    connection = transaction.get_connection(using)
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+
+    hooks = connection.run_on_commit
+    savepoints = tuple(connection.savepoint_ids)
+    current = buffers.get(using)
+    if current is not None and current[0] is hooks and current[1] == savepoints:
+        return current[2]
+
+    buffer = AuditBuffer(using)
+    transaction.on_commit(buffer.flush, using=using)
+    # Ссылка на список нужна для проверки "is": без нее id мог бы повториться
+    buffers[using] = (connection.run_on_commit, savepoints, buffer)
+    return buffer
+
+
+def record_audit(using=DEFAULT_DB_ALIAS, **fields):
+    """
+    Добавляет запись в журнал аудита
+
+    Внутри транзакции запись копится в буфере и сохраняется вместе с
+    остальными одним bulk_create после фиксации (при откате - отбрасывается).
+    Вне транзакции сохраняется сразу. При AUDIT_ASYNC записи уходят в
+    очередь, которую разбирает задача drain_audit_queue.
+
+    Args:
+        using: Алиас базы данных
+        **fields: Поля AuditLog
+    """
+    if not transaction.get_connection(using).in_atomic_block:
+        write_audit_entries([AuditLog(**fields)], using)
+        return
+    _current_buffer(using).entries.append(AuditLog(**fields))
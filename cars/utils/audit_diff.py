@@ -0,0 +1,70 @@
+ORIGINAL_ATTR = '_audit_original'
+
+
+def _json_value(field, value):
+    """Значение поля для журнала: id связей как есть, остальное строкой"""
+    if value is None or field.is_relation:
+        return value
+    return str(value)
+
+
+def field_values(instance, update_fields=None):
+    """
+    Значения полей экземпляра для журнала аудита
+
+    Читаются только загруженные атрибуты: связи - по *_id, без запроса к
+    связанному объекту, отложенные поля (defer/only) не подгружаются.
+
+    Args:
+        instance: Экземпляр модели
+        update_fields: Ограничить полями, переданными в save(update_fields=...)
+
+    Returns:
+        dict: Имя поля -> значение
+    """
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.primary_key or field.attname not in instance.__dict__:
+            continue
+        if update_fields is not None and field.name not in update_fields and field.attname not in update_fields:
+            continue
+        values[field.name] = _json_value(field, instance.__dict__[field.attname])
+    return values
+
+
+def remember_original(instance, update_fields=None):
+    """Запоминает значения полей как исходные для следующего сравнения"""
+    original = instance.__dict__.get(ORIGINAL_ATTR)
+    if original is None or update_fields is None:
+        instance.__dict__[ORIGINAL_ATTR] = field_values(instance)
+    else:
+        original.update(field_values(instance, update_fields))
+
+
+def forget_original(instance):
+    """
+    Отбрасывает исходные значения, снятые не из базы
+
+    post_init срабатывает и для экземпляров, созданных в коде: значения
+    конструктора не совпадают с базой, если такой объект с заданным pk
+    сохраняется поверх существующей строки.
+    """
+    instance.__dict__.pop(ORIGINAL_ATTR, None)
+
+
+def changed_fields(instance, update_fields=None):
+    """
+    Поля, изменившиеся с момента загрузки экземпляра
+
+    Returns:
+        dict или None: Имя поля -> {'old', 'new'} (пустой, если изменений
+        нет) или None, если исходные значения неизвестны
+    """
+    original = instance.__dict__.get(ORIGINAL_ATTR)
+    if original is None:
+        return None
+    return {
+        name: {'old': original.get(name), 'new': value}
+        for name, value in field_values(instance, update_fields).items()
+        if name not in original or original[name] != value
+    }
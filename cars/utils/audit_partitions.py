@@ -0,0 +1,291 @@
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from cars.models import AuditLog
+
+
+logger = logging.getLogger(__name__)
+
+TABLE = AuditLog._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_PATTERN = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+ARCHIVE_BATCH_SIZE = 5000
+
+
+def month_start(value):
+    """Первое число месяца для даты или момента (в UTC, как границы разделов)"""
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        value = value.astimezone(dt_timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def parse_month(value):
+    """Месяц из строки вида 2025-01"""
+    try:
+        year, month = value.split('-')
+        return date(int(year), int(month), 1)
+    except ValueError:
+        raise ValueError(f"Expected month as YYYY-MM, got {value!r}")
+
+
+def archive_path(month, archive_dir=None):
+    return Path(archive_dir or settings.AUDIT_ARCHIVE_DIR) / f'auditlog-{month:%Y-%m}.ndjson.gz'
+
+
+def _bound(month):
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def partitioning_enabled(using=DEFAULT_DB_ALIAS):
+    """Секционирована ли таблица аудита (PostgreSQL после миграции 0009)"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def _tables(cursor, attached):
+    """Помесячные таблицы аудита: подключенные разделы или отключенные от родителя"""
+    if attached:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass", [TABLE]
+        )
+    else:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+            "AND relname LIKE %s", [f'{TABLE}_y%']
+        )
+    months = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return dict(sorted(months.items()))
+
+
+def list_partitions(using=DEFAULT_DB_ALIAS):
+    """
+    Помесячные разделы таблицы аудита
+
+    Returns:
+        dict: attached (месяц -> таблица), detached (отключенные, но еще
+            не заархивированные), default_rows (строк в разделе по умолчанию)
+    """
+    with connections[using].cursor() as cursor:
+        attached = _tables(cursor, attached=True)
+        detached = _tables(cursor, attached=False)
+        cursor.execute(f'SELECT count(*) FROM {DEFAULT_PARTITION}')
+        default_rows = cursor.fetchone()[0]
+    return {'attached': attached, 'detached': detached, 'default_rows': default_rows}
+
+
+def create_partition(month, entries=None, using=DEFAULT_DB_ALIAS):
+    """
+    Создает и подключает раздел месяца
+
+    Таблица создается отдельно и подключается через ATTACH PARTITION:
+    строки этого месяца, уже попавшие в раздел по умолчанию, переносятся
+    в нее, иначе подключение было бы отклонено.
+
+    Args:
+        month: Первое число месяца
+        entries: Строки для загрузки в раздел (словари из архива)
+        using: Алиас базы данных
+
+    Returns:
+        int: Число строк в новом разделе
+    """
+    name = partition_name(month)
+    start, end = _bound(month), _bound(add_months(month, 1))
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+            f'WHERE "timestamp" >= {start} AND "timestamp" < {end} RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        )
+        rows = cursor.rowcount
+        batch = []
+        for entry in entries or ():
+            batch.append(entry)
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                rows += _load_rows(cursor, name, batch)
+                batch = []
+        if batch:
+            rows += _load_rows(cursor, name, batch)
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})')
+    return rows
+
+
+def _load_rows(cursor, name, entries):
+    cursor.execute(
+        f'INSERT INTO {name} SELECT * FROM json_populate_recordset(NULL::{TABLE}, %s::json)',
+        [json.dumps(entries)]
+    )
+    return cursor.rowcount
+
+
+def ensure_partitions(months_ahead=None, now=None, using=DEFAULT_DB_ALIAS):
+    """
+    Создает недостающие разделы с текущего месяца на months_ahead вперед
+
+    Returns:
+        list: Имена созданных разделов
+    """
+    months_ahead = settings.AUDIT_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(now or timezone.now())
+    attached = list_partitions(using)['attached']
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in attached:
+            moved = create_partition(month, using=using)
+            created.append(partition_name(month))
+            logger.info(f"Audit partition {partition_name(month)} created ({moved} rows moved from default)")
+    return created
+
+
+def _export_table(cursor, name, path):
+    """Выгружает таблицу в gzip NDJSON (через временный файл) и возвращает число строк"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    rows = 0
+    with open(tmp_path, 'wb') as raw:
+        with gzip.open(raw, 'wt', encoding='utf-8') as archive:
+            cursor.execute(f'SELECT row_to_json(t)::text FROM {name} t ORDER BY id')
+            while True:
+                batch = cursor.fetchmany(ARCHIVE_BATCH_SIZE)
+                if not batch:
+                    break
+                for (line,) in batch:
+                    archive.write(line + '\n')
+                rows += len(batch)
+        # Таблица удаляется сразу после выгрузки, файл должен быть на диске
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return rows
+
+
+def archive_partitions(retention_months=None, now=None, archive_dir=None, using=DEFAULT_DB_ALIAS):
+    """
+    Переносит разделы старше retention_months месяцев в файлы
+
+    Раздел сначала отключается от таблицы (DETACH PARTITION), затем
+    выгружается в gzip NDJSON и удаляется, только если число строк в
+    файле совпало с таблицей. Таблицы, отключенные прошлым запуском, но
+    не удаленные из-за сбоя, выгружаются повторно.
+
+    Args:
+        retention_months: Сколько месяцев хранить в базе, по умолчанию AUDIT_RETENTION_MONTHS
+        now: Момент отсчета (по умолчанию текущее время)
+        archive_dir: Каталог архива, по умолчанию AUDIT_ARCHIVE_DIR
+        using: Алиас базы данных
+
+    Returns:
+        list: По архивированному месяцу: month, table, rows, path, bytes
+    """
+    retention_months = settings.AUDIT_RETENTION_MONTHS if retention_months is None else retention_months
+    cutoff = add_months(month_start(now or timezone.now()), -retention_months)
+    connection = connections[using]
+
+    partitions = list_partitions(using)
+    for month, name in partitions['attached'].items():
+        if month < cutoff:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            logger.info(f"Audit partition {name} detached")
+
+    archived = []
+    with connection.cursor() as cursor:
+        detached = _tables(cursor, attached=False)
+    for month, name in detached.items():
+        path = archive_path(month, archive_dir)
+        # Серверный курсор не держит весь месяц в памяти
+        with transaction.atomic(using=using):
+            with connection.chunked_cursor() as cursor:
+                rows = _export_table(cursor, name, path)
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT count(*) FROM {name}')
+                expected = cursor.fetchone()[0]
+                if rows != expected:
+                    raise RuntimeError(f"Archive {path} has {rows} rows, table {name} has {expected}")
+                cursor.execute(f'DROP TABLE {name}')
+
+        archived.append({
+            'month': f'{month:%Y-%m}',
+            'table': name,
+            'rows': rows,
+            'path': str(path),
+            'bytes': path.stat().st_size,
+        })
+        logger.info(f"Audit partition {name} archived to {path}: {rows} rows")
+    return archived
+
+
+def iter_archived_entries(month, archive_dir=None, model_name=None, object_id=None, action=None):
+    """
+    Читает записи аудита заархивированного месяца без загрузки в базу
+
+    Args:
+        month: Первое число месяца
+        archive_dir: Каталог архива, по умолчанию AUDIT_ARCHIVE_DIR
+        model_name, object_id, action: Необязательные фильтры по полям
+
+    Yields:
+        dict: Строка AuditLog в виде словаря (как в файле)
+    """
+    path = archive_path(month, archive_dir)
+    if not path.exists():
+        raise FileNotFoundError(f"No audit archive for {month:%Y-%m}: {path}")
+
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            entry = json.loads(line)
+            if model_name is not None and entry['model_name'] != model_name:
+                continue
+            if object_id is not None and entry['object_id'] != object_id:
+                continue
+            if action is not None and entry['action'] != action:
+                continue
+            yield entry
+
+
+def restore_archived_month(month, archive_dir=None, using=DEFAULT_DB_ALIAS):
+    """
+    Возвращает заархивированный месяц в базу отдельным разделом
+
+    После восстановления месяц снова виден через AuditLog и админку.
+    Файл архива не удаляется: следующий запуск archive_audit_log, если
+    месяц по-прежнему старше срока хранения, заархивирует его повторно.
+
+    Returns:
+        int: Число загруженных строк
+    """
+    if month in list_partitions(using)['attached']:
+        raise ValueError(f"Audit partition for {month:%Y-%m} is already attached")
+    return create_partition(month, iter_archived_entries(month, archive_dir), using=using)
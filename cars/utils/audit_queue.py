@@ -0,0 +1,247 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+from cars.models import AuditLog
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = 'cars:audit'
+AUDIT_FIELDS = ('model_name', 'object_id', 'action', 'changes', 'user_id', 'timestamp')
+
+
+def serialize_entry(entry):
+    """Запись AuditLog (еще не сохраненная) в JSON-совместимый словарь"""
+    data = {field: getattr(entry, field) for field in AUDIT_FIELDS}
+    data['timestamp'] = data['timestamp'].isoformat() if data['timestamp'] else None
+    return data
+
+
+def deserialize_entry(data):
+    """Обратное преобразование для потребителя очереди"""
+    fields = dict(data)
+    fields['timestamp'] = parse_datetime(fields['timestamp']) if fields.get('timestamp') else None
+    return AuditLog(**{key: value for key, value in fields.items() if value is not None})
+
+
+class RedisAuditQueue:
+    """
+    Очередь аудита в Redis
+
+    Записи лежат в списке; потребитель читает порцию с головы (LRANGE) и
+    удаляет ее (LTRIM) только после сохранения в AuditLog, поэтому при
+    падении потребителя записи не теряются (возможен повтор порции).
+    """
+
+    def __init__(self, url, prefix=REDIS_KEY_PREFIX):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.queue_key = f"{prefix}:queue"
+        self.metrics_key = f"{prefix}:metrics"
+
+    def push(self, payloads):
+        now = time.time()
+        self.client.rpush(self.queue_key, *(
+            json.dumps({'enqueued_at': now, 'entry': payload}, cls=DjangoJSONEncoder)
+            for payload in payloads
+        ))
+
+    def peek(self, max_size):
+        """
+        Порция записей с головы очереди
+
+        Returns:
+            tuple: (список {'enqueued_at', 'entry'}, метка для ack)
+        """
+        items = [json.loads(raw) for raw in self.client.lrange(self.queue_key, 0, max_size - 1)]
+        return items, len(items)
+
+    def ack(self, marker):
+        self.client.ltrim(self.queue_key, marker, -1)
+
+    def size(self):
+        return self.client.llen(self.queue_key)
+
+    def oldest_enqueued_at(self):
+        head = self.client.lindex(self.queue_key, 0)
+        return json.loads(head)['enqueued_at'] if head else None
+
+    def incr_metric(self, name, amount=1):
+        self.client.hincrbyfloat(self.metrics_key, name, amount)
+
+    def metrics(self):
+        return {key.decode(): float(value) for key, value in self.client.hgetall(self.metrics_key).items()}
+
+
+class SQLiteAuditSpool:
+    """
+    Очередь аудита в локальном файле SQLite
+
+    Для установок без Redis: очередь переживает перезапуск процессов, но
+    web процессы и потребитель должны работать на одной машине.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS audit_queue "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, enqueued_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS audit_metrics (name TEXT PRIMARY KEY, value REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def push(self, payloads):
+        now = time.time()
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT INTO audit_queue (enqueued_at, payload) VALUES (?, ?)",
+                [(now, json.dumps(payload, cls=DjangoJSONEncoder)) for payload in payloads]
+            )
+
+    def peek(self, max_size):
+        rows = self._connection().execute(
+            "SELECT id, enqueued_at, payload FROM audit_queue ORDER BY id LIMIT ?", (max_size,)
+        ).fetchall()
+        items = [{'enqueued_at': enqueued_at, 'entry': json.loads(payload)} for _, enqueued_at, payload in rows]
+        return items, rows[-1][0] if rows else None
+
+    def ack(self, marker):
+        if marker is None:
+            return
+        with self._connection() as connection:
+            connection.execute("DELETE FROM audit_queue WHERE id <= ?", (marker,))
+
+    def size(self):
+        return self._connection().execute("SELECT COUNT(*) FROM audit_queue").fetchone()[0]
+
+    def oldest_enqueued_at(self):
+        row = self._connection().execute(
+            "SELECT enqueued_at FROM audit_queue ORDER BY id LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def incr_metric(self, name, amount=1):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO audit_metrics (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, amount)
+            )
+
+    def metrics(self):
+        return dict(self._connection().execute("SELECT name, value FROM audit_metrics").fetchall())
+
+
+_audit_queue = None
+_audit_queue_lock = threading.Lock()
+
+
+def get_audit_queue():
+    """Очередь аудита из настроек AUDIT_QUEUE_*"""
+    global _audit_queue
+
+    with _audit_queue_lock:
+        if _audit_queue is None:
+            if settings.AUDIT_QUEUE_BACKEND == 'spool':
+                _audit_queue = SQLiteAuditSpool(settings.AUDIT_SPOOL_PATH)
+            else:
+                _audit_queue = RedisAuditQueue(settings.AUDIT_QUEUE_REDIS_URL)
+        return _audit_queue
+
+
+def enqueue_audit_entries(entries):
+    """
+    Отправляет записи аудита в очередь вместо записи в БД
+
+    Противодавление: если потребитель отстал и в очереди уже
+    AUDIT_QUEUE_MAX_SIZE записей, или очередь недоступна, записи
+    сохраняются синхронно - аудит не теряется, а производители замедляются.
+
+    Returns:
+        bool: True, если записи поставлены в очередь
+    """
+    try:
+        audit_queue = get_audit_queue()
+        if audit_queue.size() >= settings.AUDIT_QUEUE_MAX_SIZE:
+            audit_queue.incr_metric('backpressure', len(entries))
+            logger.warning(f"Audit queue is full, writing {len(entries)} entries synchronously")
+            return False
+        audit_queue.push([serialize_entry(entry) for entry in entries])
+        audit_queue.incr_metric('enqueued', len(entries))
+        return True
+    except Exception as e:
+        logger.error(f"Audit queue unavailable, writing {len(entries)} entries synchronously: {str(e)}")
+        return False
+
+
+def consume_audit_queue(audit_queue, batch_size=None, max_seconds=None):
+    """
+    Переносит записи из очереди в AuditLog крупными порциями
+
+    Порция удаляется из очереди только после bulk_create, так что при
+    сбое она будет сохранена повторно (доставка "хотя бы один раз").
+
+    Args:
+        audit_queue: Очередь из get_audit_queue
+        batch_size: Размер порции, по умолчанию AUDIT_CONSUMER_BATCH_SIZE
+        max_seconds: Ограничение времени одного запуска
+
+    Returns:
+        dict: Сохранено записей, порций и задержка последней записи (секунды)
+    """
+    batch_size = batch_size or settings.AUDIT_CONSUMER_BATCH_SIZE
+    deadline = time.monotonic() + (max_seconds or settings.AUDIT_CONSUMER_MAX_SECONDS)
+    written = 0
+    batches = 0
+    lag = None
+
+    while time.monotonic() < deadline:
+        items, marker = audit_queue.peek(batch_size)
+        if not items:
+            break
+        AuditLog.objects.bulk_create([deserialize_entry(item['entry']) for item in items], batch_size=1000)
+        audit_queue.ack(marker)
+        written += len(items)
+        batches += 1
+        lag = round(time.time() - items[-1]['enqueued_at'], 3)
+
+    if written:
+        audit_queue.incr_metric('written', written)
+    return {'written': written, 'batches': batches, 'lag_seconds': lag}
+
+
+def audit_queue_metrics(audit_queue=None):
+    """
+    Метрики очереди аудита
+
+    Returns:
+        dict: depth (записей в очереди), oldest_age_seconds (возраст самой
+            старой записи - отставание потребителя) и накопленные счетчики
+            enqueued, written, backpressure
+    """
+    audit_queue = audit_queue or get_audit_queue()
+    oldest = audit_queue.oldest_enqueued_at()
+    return {
+        'depth': audit_queue.size(),
+        'oldest_age_seconds': round(time.time() - oldest, 3) if oldest is not None else 0,
+        **{name: int(value) for name, value in audit_queue.metrics().items()},
+    }
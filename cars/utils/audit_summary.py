@@ -0,0 +1,179 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from cars.models import BodyType, Brand, Car, CarModel
+from cars.utils.audit_buffer import record_audit
+from cars.utils.bulk_import import serialize_results
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_ACTION = 'import_summary'
+# Таблицы каталога, которые наполняет импорт
+SUMMARY_MODELS = (Brand, CarModel, BodyType, Car)
+
+_local = threading.local()
+
+
+def id_watermarks(using=DEFAULT_DB_ALIAS):
+    """Наибольшие id таблиц каталога: все, что создано позже, получит id больше"""
+    return {
+        model_cls.__name__: model_cls.objects.using(using).aggregate(max_id=Max('pk'))['max_id'] or 0
+        for model_cls in SUMMARY_MODELS
+    }
+
+
+def created_ranges(since, using=DEFAULT_DB_ALIAS):
+    """
+    Количество и диапазон id строк, созданных после снятия since
+
+    Один запрос по первичному ключу на таблицу. Строки, которые в это же
+    время создали другие процессы, тоже попадают в диапазон.
+    """
+    ranges = {}
+    for model_cls in SUMMARY_MODELS:
+        name = model_cls.__name__
+        ranges[name] = model_cls.objects.using(using).filter(pk__gt=since.get(name, 0)).aggregate(
+            count=Count('pk'), min_id=Min('pk'), max_id=Max('pk')
+        )
+    return ranges
+
+
+class AuditSummary:
+    """
+    Одна запись аудита на весь импорт
+
+    Пока сводка активна, обработчики сигналов аудита не пишут записи по
+    объектам, а только считают события. В итоговую запись попадают
+    счетчики импорта, число и диапазоны id созданных строк по таблицам и
+    id задачи импорта.
+    """
+
+    def __init__(self, source, job_id=None, since=None, using=DEFAULT_DB_ALIAS):
+        self.source = source
+        self.job_id = job_id
+        self.using = using
+        self.since = id_watermarks(using) if since is None else since
+        self.started_at = timezone.now()
+        self.results = None
+        self.error = None
+        self.events = defaultdict(lambda: {'count': 0, 'min_id': None, 'max_id': None})
+
+    def add_event(self, action, object_id):
+        """Учитывает событие, вместо которого раньше писалась запись аудита"""
+        event = self.events[action]
+        event['count'] += 1
+        if object_id is not None:
+            event['min_id'] = object_id if event['min_id'] is None else min(event['min_id'], object_id)
+            event['max_id'] = object_id if event['max_id'] is None else max(event['max_id'], object_id)
+
+    def build(self, error=None):
+        error = error if error is not None else self.error
+        changes = {
+            'source': str(self.source),
+            'job_id': self.job_id,
+            'status': 'failed' if error is not None else 'success',
+            'error': str(error) if error is not None else None,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': timezone.now().isoformat(),
+            'created': created_ranges(self.since, self.using),
+            'events': dict(self.events),
+        }
+        if self.results is not None:
+            # Полный список брендов может быть огромным, в сводке - только их число
+            results = serialize_results(self.results)
+            results['brands_count'] = len(results.pop('processed_brands'))
+            changes['results'] = results
+        return changes
+
+    def write(self, error=None):
+        """Сохраняет итоговую запись; ошибка аудита не прерывает импорт"""
+        try:
+            record_audit(
+                using=self.using,
+                model_name='ImportJob',
+                object_id=self.job_id,
+                action=SUMMARY_ACTION,
+                changes=self.build(error),
+                timestamp=timezone.now()
+            )
+        except Exception as e:
+            logger.error(f"Failed to write audit summary for {self.source}: {str(e)}")
+
+
+def current_summary():
+    """Активная в текущем потоке сводка или None"""
+    return getattr(_local, 'summary', None)
+
+
+def summarize_event(action, object_id=None):
+    """
+    Передает событие аудита активной сводке
+
+    Returns:
+        bool: True, если событие учтено сводкой и запись по объекту не нужна
+    """
+    summary = current_summary()
+    if summary is None:
+        return False
+    summary.add_event(action, object_id)
+    return True
+
+
+@contextmanager
+def audit_summary(source, job_id=None, since=None, using=DEFAULT_DB_ALIAS):
+    """
+    Заменяет аудит по объектам одной сводной записью на время импорта
+
+    Действует только в текущем потоке: правки через админку и API в
+    других запросах по-прежнему пишутся по объектам. Сводка сохраняется и
+    при ошибке импорта - порции, зафиксированные до нее, остаются в базе.
+    Вложенный вызов присоединяется к внешней сводке.
+
+    Args:
+        source: Источник импорта (путь к файлу или тип загрузки)
+        job_id: Id ImportJob
+        since: Снятые заранее id_watermarks (например, до запуска шардов)
+        using: Алиас базы данных
+
+    Yields:
+        AuditSummary: Сводка; в summary.results можно передать счетчики
+            импорта, в summary.error - ошибку, обработанную внутри блока
+    """
+    outer = current_summary()
+    if outer is not None:
+        yield outer
+        return
+
+    summary = AuditSummary(source, job_id, since, using)
+    _local.summary = summary
+    error = None
+    try:
+        yield summary
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _local.summary = None
+        summary.write(error)
+
+
+@contextmanager
+def suspend_audit():
+    """
+    Отключает аудит по объектам без записи сводки
+
+    Для шардов импорта: сводку по всему импорту пишет тот, кто их запустил.
+    """
+    outer = current_summary()
+    _local.summary = outer or AuditSummary('shard', since={})
+    try:
+        yield
+    finally:
+        _local.summary = outer
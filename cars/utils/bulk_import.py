@@ -0,0 +1,360 @@
+import logging
+import re
+
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections, transaction
+from django.db.models.signals import post_save
+
+from cars.models import BodyType, Brand, Car, CarModel, normalize_name
+from cars.utils.counters import bulk_car_deltas, counter_batch, record_counter_deltas
+
+
+logger = logging.getLogger(__name__)
+
+CLEAN_PATTERN = re.compile(r'[^\w\s-]', flags=re.UNICODE)
+INSERT_BATCH_SIZE = 500
+
+
+def clean_string(value):
+    """Очищает и нормализует строковое значение"""
+    return CLEAN_PATTERN.sub('', value.strip()) if value else ''
+
+
+def send_created_signal(model_cls, obj):
+    """Отправляет post_save для записи, созданной в обход save()"""
+    # bulk_create не отправляет post_save, а аудит справочников на нем построен
+    post_save.send(
+        sender=model_cls, instance=obj, created=True,
+        update_fields=None, raw=False, using=obj._state.db
+    )
+
+
+def insert_new_rows(model_cls, fields, rows, conflict_fields, using=DEFAULT_DB_ALIAS):
+    """
+    Вставляет строки, пропуская нарушения уникальности, и возвращает вставленные
+
+    В отличие от bulk_create(ignore_conflicts=True) результат содержит
+    только строки, которые вставил этот запрос (INSERT ... ON CONFLICT DO
+    NOTHING RETURNING). Записи, добавленные параллельным импортом, в него
+    не попадают, поэтому сигналы и счетчики не учитывают их второй раз.
+    Строки вставляются в порядке ключа конфликта: параллельные шарды с
+    общими новыми ключами ждут друг друга, но не взаимоблокируются.
+
+    Args:
+        model_cls: Модель
+        fields: Имена полей для вставки
+        rows: Список кортежей значений в порядке fields
+        conflict_fields: Поля уникального ограничения, по которому строка
+            считается уже существующей
+        using: Алиас базы данных
+
+    Returns:
+        list: Экземпляры модели для вставленных строк
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    meta = model_cls._meta
+    columns = ', '.join(qn(meta.get_field(name).column) for name in fields)
+    target = ', '.join(qn(meta.get_field(name).column) for name in conflict_fields)
+    concrete = meta.concrete_fields
+    returning = ', '.join(qn(field.column) for field in concrete)
+    attnames = [field.attname for field in concrete]
+    key_positions = [fields.index(name) for name in conflict_fields]
+    rows = sorted(rows, key=lambda row: [(row[i] is None, row[i]) for i in key_positions])
+
+    created = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+            placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(batch))
+            cursor.execute(
+                f"INSERT INTO {qn(meta.db_table)} ({columns}) VALUES {placeholders} "
+                f"ON CONFLICT ({target}) DO NOTHING RETURNING {returning}",
+                [value for row in batch for value in row]
+            )
+            created.extend(model_cls.from_db(using, attnames, row) for row in cursor.fetchall())
+    return created
+
+
+def rows_seen(results):
+    """Количество строк, учтенных в счетчиках импорта"""
+    return (
+        results['cars_processed'] + results['skipped']
+        + results['invalid_entries'] + results['errors']
+        + results.get('unchanged', 0)
+    )
+
+
+def serialize_results(results):
+    """Приводит счетчики импорта к JSON-совместимому виду"""
+    return {**results, 'processed_brands': sorted(results['processed_brands'])}
+
+
+def new_import_results():
+    """Счетчики импорта в формате ответа AddCarsFromXML"""
+    return {
+        'cars_processed': 0,
+        'errors': 0,
+        'processed_brands': set(),
+        'skipped': 0,
+        'invalid_entries': 0
+    }
+
+
+class CarBulkImporter:
+    """
+    Пакетный импорт автомобилей
+
+    Записи обрабатываются порциями по chunk_size, каждая порция - одна
+    транзакция. Бренды, модели и типы кузова разрешаются через словари,
+    загруженные один раз при первой порции, новые справочные записи и
+    автомобили вставляются через insert_new_rows: сигналы и счетчики
+    получают только строки, вставленные этим импортом.
+    """
+
+    DEFAULT_CHUNK_SIZE = 1000
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk  # callback(results) после каждой порции
+        self.results = new_import_results()
+        self._pending = []
+        self._prefetched = False
+        # Ключи кэша, которые использовала текущая порция: (словарь, ключ)
+        self._chunk_keys = []
+        self._brands = {}
+        self._models = {}
+        self._body_types = {}
+
+    def prefetch(self):
+        """Загружает справочники в память"""
+        self._brands = dict(Brand.objects.values_list('name_key', 'pk'))
+        self._body_types = dict(BodyType.objects.values_list('name_key', 'pk'))
+        self._models = {
+            (brand_id, key): pk
+            for pk, brand_id, key in CarModel.objects.values_list('pk', 'brand_id', 'name_key')
+        }
+        self._prefetched = True
+        logger.info(
+            f"Prefetched {len(self._brands)} brands, {len(self._models)} models, "
+            f"{len(self._body_types)} body types"
+        )
+
+    def import_records(self, records):
+        """
+        Импортирует сырые записи XML
+
+        Args:
+            records: Итерируемый объект кортежей (make, model, body_type)
+
+        Returns:
+            dict: Счетчики импорта
+        """
+        try:
+            for record in records:
+                self.add_record(record)
+        finally:
+            # Строки, прочитанные до ошибки разбора, тоже сохраняются
+            self.finish()
+
+        return self.results
+
+    def add_record(self, record):
+        """Добавляет сырую запись в текущую порцию, сохраняя порцию при заполнении"""
+        row = self.prepare_record(record)
+        if row is None:
+            self.results['invalid_entries'] += 1
+            return
+
+        self._pending.append(row)
+        if len(self._pending) >= self.chunk_size:
+            chunk, self._pending = self._pending, []
+            self._flush(chunk)
+
+    def finish(self):
+        """Сохраняет неполную последнюю порцию"""
+        if self._pending:
+            chunk, self._pending = self._pending, []
+            self._flush(chunk)
+        return self.results
+
+    def import_rows(self, rows):
+        """
+        Сохраняет готовую порцию очищенных строк с откатом на построчный режим
+
+        Args:
+            rows: Список кортежей (brand, model, body_type)
+
+        Returns:
+            list: Исход по каждой строке: True - создан, False - уже был, None - ошибка
+        """
+        return self._flush(list(rows))
+
+    def prepare_record(self, record):
+        """
+        Проверяет и очищает сырую запись
+
+        Returns:
+            tuple: Очищенная строка порции или None для записи с пустыми полями
+        """
+        brand, model, body = record[:3]
+        if not all((brand, model, body)):
+            return None
+        return (clean_string(brand), clean_string(model), clean_string(body))
+
+    def import_chunk(self, rows):
+        """
+        Сохраняет порцию очищенных записей в одной транзакции
+
+        Args:
+            rows: Список кортежей (brand, model, body_type)
+
+        Returns:
+            list: Для каждой строки True, если автомобиль создан, иначе False
+        """
+        if not self._prefetched:
+            self.prefetch()
+
+        self._chunk_keys = []
+        try:
+            # Счетчики каталога меняются в той же транзакции, одним пакетом
+            with transaction.atomic(), counter_batch():
+                return self._save_chunk(rows)
+        except Exception:
+            # Id порции могли быть получены в откаченной транзакции или
+            # устареть (бренд удален после prefetch); они будут разрешены
+            # заново, остальной кэш по-прежнему верен
+            for cache, key in self._chunk_keys:
+                cache.pop(key, None)
+            raise
+        finally:
+            self._chunk_keys = []
+
+    def _flush(self, chunk):
+        """Сохраняет порцию и обновляет счетчики, возвращает исходы по строкам"""
+        try:
+            outcomes = self.import_chunk(chunk)
+        except Exception as e:
+            logger.error(f"Bulk chunk of {len(chunk)} rows failed, retrying row by row: {str(e)}")
+            outcomes = self._import_rows_individually(chunk)
+
+        for (brand, _, _), created in zip(chunk, outcomes):
+            if created is None:
+                self.results['errors'] += 1
+            elif created:
+                self.results['cars_processed'] += 1
+                self.results['processed_brands'].add(brand)
+            else:
+                self.results['skipped'] += 1
+
+        if self.on_chunk:
+            self.on_chunk(self.results)
+        return outcomes
+
+    def _import_rows_individually(self, chunk):
+        outcomes = []
+        for row in chunk:
+            try:
+                outcomes.extend(self.import_chunk([row]))
+            except (OperationalError, InterfaceError):
+                # Ошибка соединения, а не строки: без базы остальные строки
+                # тоже не сохранятся, их нельзя отмечать как ошибочные
+                raise
+            except Exception as e:
+                logger.error(f"Error processing modification {row}: {str(e)}", exc_info=True)
+                outcomes.append(None)
+        return outcomes
+
+    def _save_chunk(self, rows):
+        brand_ids = self._resolve_names(
+            Brand, self._brands, {normalize_name(brand): brand for brand, _, _ in rows}
+        )
+        body_type_ids = self._resolve_names(
+            BodyType, self._body_types, {normalize_name(body): body for _, _, body in rows}
+        )
+        model_ids = self._resolve_models({
+            (brand_ids[normalize_name(brand)], normalize_name(model)): model
+            for brand, model, _ in rows
+        })
+
+        pairs = []
+        for brand, model, body in rows:
+            brand_id = brand_ids[normalize_name(brand)]
+            pairs.append((
+                model_ids[(brand_id, normalize_name(model))],
+                body_type_ids[normalize_name(body)],
+                brand_id
+            ))
+
+        seen = set(
+            Car.objects.filter(model_id__in={model_id for model_id, _, _ in pairs})
+            .values_list('model_id', 'body_type_id')
+        )
+
+        new_cars = {}
+        for model_id, body_type_id, brand_id in pairs:
+            if (model_id, body_type_id) not in seen:
+                new_cars.setdefault((model_id, body_type_id), brand_id)
+
+        # Строка, которую между проверкой и вставкой добавил параллельный
+        # импорт, не вернется из INSERT и будет учтена как пропущенная
+        inserted = set()
+        if new_cars:
+            for car in insert_new_rows(Car, ('model', 'body_type'), list(new_cars),
+                                       ('model', 'body_type')):
+                inserted.add((car.model_id, car.body_type_id))
+            # Сигналы не отправляются, счетчики обновляются явно
+            record_counter_deltas(bulk_car_deltas(
+                (new_cars[(model_id, body_type_id)], body_type_id)
+                for model_id, body_type_id in inserted
+            ))
+
+        outcomes = []
+        for model_id, body_type_id, _ in pairs:
+            key = (model_id, body_type_id)
+            # Повтор строки внутри порции считается пропущенным
+            outcomes.append(key in inserted)
+            inserted.discard(key)
+        logger.debug(f"Chunk saved: {sum(outcomes)} created, {len(rows) - sum(outcomes)} skipped")
+        return outcomes
+
+    def _resolve_names(self, model_cls, cache, names):
+        """Возвращает id для ключей имен, создавая недостающие записи"""
+        self._chunk_keys.extend((cache, key) for key in names)
+        missing = {key: name for key, name in names.items() if key not in cache}
+        if missing:
+            rows = [(name, key) for key, name in missing.items()]
+            for obj in insert_new_rows(model_cls, ('name', 'name_key'), rows, ('name_key',)):
+                cache[obj.name_key] = obj.pk
+                send_created_signal(model_cls, obj)
+            # Остальные записи созданы параллельно другим импортом,
+            # поиск по name_key попадает в индекс
+            concurrent = [key for key in missing if key not in cache]
+            if concurrent:
+                found = model_cls.objects.filter(name_key__in=concurrent)
+                for key, pk in found.values_list('name_key', 'pk'):
+                    cache[key] = pk
+
+        return {key: cache[key] for key in names}
+
+    def _resolve_models(self, models):
+        """Возвращает id моделей по ключам (brand_id, ключ имени)"""
+        self._chunk_keys.extend((self._models, key) for key in models)
+        missing = {key: name for key, name in models.items() if key not in self._models}
+        if missing:
+            rows = [(brand_id, name, key) for (brand_id, key), name in missing.items()]
+            for obj in insert_new_rows(CarModel, ('brand', 'name', 'name_key'), rows,
+                                       ('brand', 'name_key')):
+                self._models[(obj.brand_id, obj.name_key)] = obj.pk
+                send_created_signal(CarModel, obj)
+
+            concurrent = [key for key in missing if key not in self._models]
+            if concurrent:
+                found = CarModel.objects.filter(
+                    brand_id__in={brand_id for brand_id, _ in concurrent},
+                    name_key__in={key for _, key in concurrent}
+                ).values_list('pk', 'brand_id', 'name_key')
+                for pk, brand_id, key in found:
+                    if (brand_id, key) in missing:
+                        self._models[(brand_id, key)] = pk
+
+        return {key: self._models[key] for key in models}
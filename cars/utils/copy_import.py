@@ -0,0 +1,215 @@
+import logging
+import uuid
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+
+from cars.models import BodyType, Brand, Car, CarModel, normalize_name
+from cars.utils.bulk_import import clean_string, new_import_results, send_created_signal
+from cars.utils.counters import car_deltas, counter_batch, record_counter_deltas
+
+
+logger = logging.getLogger(__name__)
+
+STAGING_COLUMNS = ('brand', 'model', 'body_type', 'brand_key', 'model_key', 'body_type_key')
+
+
+class CopyRowStream:
+    """
+    Файловый объект для COPY FROM STDIN в текстовом формате
+
+    Строки формируются из записей XML по мере чтения, поэтому COPY
+    получает данные потоком без промежуточного файла.
+    """
+
+    def __init__(self, records, results):
+        self._records = iter(records)
+        self._results = results
+        self._buffer = b''
+        self.rows = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = self._next_line()
+            if line is None:
+                break
+            self._buffer += line
+
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _next_line(self):
+        for brand, model, body, *_ in self._records:
+            if not all((brand, model, body)):
+                self._results['invalid_entries'] += 1
+                continue
+
+            values = [clean_string(brand), clean_string(model), clean_string(body)]
+            values += [normalize_name(value) for value in values]
+            self.rows += 1
+            return ('\t'.join(_escape(value) for value in values) + '\n').encode('utf-8')
+        return None
+
+
+def _escape(value):
+    """Экранирование для текстового формата COPY"""
+    return (
+        value.replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class PostgresCopyImporter:
+    """
+    Загрузка каталога через COPY в staging таблицу
+
+    Очищенные строки потоком загружаются командой COPY FROM STDIN в
+    UNLOGGED таблицу, после чего Brand, BodyType, CarModel и Car
+    заполняются на стороне БД запросами INSERT ... SELECT ... ON CONFLICT
+    DO NOTHING. Весь импорт выполняется в одной транзакции; счетчики
+    совпадают с handle_xml_import. Требует PostgreSQL и psycopg2.
+    """
+
+    def __init__(self, using='default'):
+        self.using = using
+        self.results = new_import_results()
+
+    def import_records(self, records):
+        """
+        Импортирует сырые записи XML
+
+        Args:
+            records: Итерируемый объект кортежей (make, model, body_type)
+
+        Returns:
+            dict: Счетчики импорта
+
+        Raises:
+            ImproperlyConfigured: Если база данных не PostgreSQL
+        """
+        connection = connections[self.using]
+        if connection.vendor != 'postgresql':
+            raise ImproperlyConfigured("COPY import engine requires PostgreSQL")
+
+        qn = connection.ops.quote_name
+        staging = qn(f"cars_import_staging_{uuid.uuid4().hex[:12]}")
+        tables = {
+            'brand': qn(Brand._meta.db_table),
+            'body_type': qn(BodyType._meta.db_table),
+            'model': qn(CarModel._meta.db_table),
+            'car': qn(Car._meta.db_table),
+        }
+
+        with transaction.atomic(using=self.using), counter_batch(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {staging} ("
+                + ', '.join(f"{column} text NOT NULL" for column in STAGING_COLUMNS)
+                + ")"
+            )
+
+            stream = CopyRowStream(records, self.results)
+            cursor.copy_expert(
+                f"COPY {staging} ({', '.join(STAGING_COLUMNS)}) FROM STDIN",
+                stream
+            )
+            cursor.execute(f"ANALYZE {staging}")
+            logger.info(f"COPY loaded {stream.rows} rows into {staging}")
+
+            created_brands = self._insert_names(cursor, tables['brand'], staging, 'brand')
+            created_body_types = self._insert_names(cursor, tables['body_type'], staging, 'body_type')
+            created_models = self._insert_models(cursor, tables, staging)
+            inserted = self._insert_cars(cursor, tables, staging)
+
+            cursor.execute(f"DROP TABLE {staging}")
+
+            # Аудит и счетчики справочников построены на post_save, как и в CarBulkImporter
+            for model_cls, ids in ((Brand, created_brands), (BodyType, created_body_types),
+                                   (CarModel, created_models)):
+                for obj in model_cls.objects.using(self.using).filter(pk__in=ids):
+                    send_created_signal(model_cls, obj)
+
+            for brand_id, brand_name, body_type_id, count in inserted:
+                record_counter_deltas({
+                    key: delta * count for key, delta in car_deltas(brand_id, body_type_id).items()
+                })
+                self.results['cars_processed'] += count
+                self.results['processed_brands'].add(brand_name)
+
+        self.results['skipped'] = stream.rows - self.results['cars_processed']
+
+        logger.info(
+            f"COPY import finished: {len(created_brands)} brands, {len(created_models)} models, "
+            f"{len(created_body_types)} body types created. Stats: {self.results}"
+        )
+        return self.results
+
+    @staticmethod
+    def _insert_names(cursor, table, staging, column):
+        """Создает отсутствующие записи справочника с полем name"""
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (name, name_key)
+            SELECT DISTINCT ON (s.{column}_key) s.{column}, s.{column}_key
+            FROM {staging} s
+            WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.name_key = s.{column}_key)
+            ORDER BY s.{column}_key, s.{column}
+            ON CONFLICT (name_key) DO NOTHING
+            RETURNING id
+            """
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def _insert_models(cursor, tables, staging):
+        cursor.execute(
+            f"""
+            INSERT INTO {tables['model']} (brand_id, name, name_key)
+            SELECT DISTINCT ON (b.id, s.model_key) b.id, s.model, s.model_key
+            FROM {staging} s
+            JOIN {tables['brand']} b ON b.name_key = s.brand_key
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {tables['model']} m
+                WHERE m.brand_id = b.id AND m.name_key = s.model_key
+            )
+            ORDER BY b.id, s.model_key, s.model
+            ON CONFLICT (brand_id, name_key) DO NOTHING
+            RETURNING id
+            """
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def _insert_cars(cursor, tables, staging):
+        """Вставляет новые автомобили, возвращает (id бренда, бренд, id кузова, количество)"""
+        cursor.execute(
+            f"""
+            WITH pairs AS (
+                SELECT DISTINCT m.id AS model_id, bt.id AS body_type_id
+                FROM {staging} s
+                JOIN {tables['brand']} b ON b.name_key = s.brand_key
+                JOIN {tables['model']} m ON m.brand_id = b.id AND m.name_key = s.model_key
+                JOIN {tables['body_type']} bt ON bt.name_key = s.body_type_key
+            ),
+            inserted AS (
+                INSERT INTO {tables['car']} (model_id, body_type_id)
+                SELECT p.model_id, p.body_type_id FROM pairs p
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {tables['car']} c
+                    WHERE c.model_id = p.model_id AND c.body_type_id = p.body_type_id
+                )
+                ON CONFLICT (model_id, body_type_id) DO NOTHING
+                RETURNING model_id, body_type_id
+            )
+            SELECT b.id, b.name, i.body_type_id, COUNT(*)
+            FROM inserted i
+            JOIN {tables['model']} m ON m.id = i.model_id
+            JOIN {tables['brand']} b ON b.id = m.brand_id
+            GROUP BY b.id, b.name, i.body_type_id
+            """
+        )
+        return cursor.fetchall()
@@ -0,0 +1,253 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from cars.models import BodyType, Brand, Car, CarModel, CatalogCounter
+from cars.utils.stats_refresh import notify_catalog_changed
+
+
+logger = logging.getLogger(__name__)
+
+# Увеличивается при каждом применении приращений: по ней читатели
+# (кэш и ETag статистики) узнают об изменении каталога после фиксации
+CATALOG_VERSION_KEY = (CatalogCounter.CATALOG_VERSION, 0)
+
+_local = threading.local()
+
+
+def _buffers():
+    if not hasattr(_local, 'buffers'):
+        _local.buffers = []
+    return _local.buffers
+
+
+def _merge(target, deltas):
+    for key, delta in deltas.items():
+        target[key] += delta
+
+
+def apply_counter_deltas(deltas):
+    """
+    Применяет приращения счетчиков в текущей транзакции
+
+    Недостающие строки создаются с нулем, затем значения увеличиваются
+    через F(), по одному UPDATE на каждую пару (scope, приращение).
+    Вместе с ними увеличивается версия каталога (CATALOG_VERSION_KEY).
+
+    Строки блокируются в едином порядке - по (scope, object_id), версия
+    каталога последней, - поэтому параллельные импорты и одиночные
+    записи не взаимоблокируются на общих счетчиках.
+
+    Args:
+        deltas: Словарь (scope, object_id) -> приращение; нулевое
+            приращение только создает строку счетчика
+    """
+    if not deltas:
+        return
+
+    # Блокировки строк держатся до конца транзакции; вне транзакции
+    # (запись из автокоммита) select_for_update без atomic недопустим
+    with transaction.atomic():
+        keys = sorted(key for key in deltas if key != CATALOG_VERSION_KEY)
+
+        CatalogCounter.objects.bulk_create(
+            [CatalogCounter(scope=scope, object_id=object_id) for scope, object_id in [*keys, CATALOG_VERSION_KEY]],
+            ignore_conflicts=True
+        )
+
+        grouped = defaultdict(list)
+        for scope, object_id in keys:
+            if deltas[(scope, object_id)]:
+                grouped[(scope, deltas[(scope, object_id)])].append(object_id)
+        if grouped:
+            by_scope = defaultdict(list)
+            for (scope, _), object_ids in grouped.items():
+                by_scope[scope].extend(object_ids)
+            locked = Q()
+            for scope, object_ids in by_scope.items():
+                locked |= Q(scope=scope, object_id__in=object_ids)
+            list(CatalogCounter.objects.select_for_update().filter(locked).order_by(
+                'scope', 'object_id'
+            ).values_list('pk', flat=True))
+        for (scope, delta), object_ids in sorted(grouped.items()):
+            CatalogCounter.objects.filter(scope=scope, object_id__in=object_ids).update(
+                value=F('value') + delta
+            )
+        CatalogCounter.objects.filter(scope=CATALOG_VERSION_KEY[0], object_id=CATALOG_VERSION_KEY[1]).update(
+            value=F('value') + deltas.get(CATALOG_VERSION_KEY, 0) + 1
+        )
+    notify_catalog_changed(CatalogCounter)
+
+
+def record_counter_deltas(deltas):
+    """Применяет приращения сразу или копит их в открытом counter_batch()"""
+    buffers = _buffers()
+    if buffers:
+        _merge(buffers[-1], deltas)
+    else:
+        apply_counter_deltas(deltas)
+
+
+def drop_counters(keys):
+    """Удаляет счетчики удаленных брендов и типов кузова"""
+    for buffer in _buffers():
+        for key in keys:
+            buffer.pop(key, None)
+    for scope, object_id in keys:
+        CatalogCounter.objects.filter(scope=scope, object_id=object_id).delete()
+    # Версия увеличится при применении приращений (сразу или в конце пакета)
+    record_counter_deltas({CATALOG_VERSION_KEY: 0})
+
+
+@contextmanager
+def counter_batch():
+    """
+    Копит приращения счетчиков и применяет их одним пакетом при выходе
+
+    Должен находиться внутри transaction.atomic() той же операции, тогда
+    счетчики фиксируются и откатываются вместе с данными. При исключении
+    накопленные приращения отбрасываются.
+    """
+    buffers = _buffers()
+    buffer = defaultdict(int)
+    buffers.append(buffer)
+    try:
+        yield buffer
+    finally:
+        buffers.pop()
+
+    # Сюда попадаем только без исключения
+    if buffers:
+        _merge(buffers[-1], buffer)
+    else:
+        apply_counter_deltas(buffer)
+
+
+def car_deltas(brand_id, body_type_id, sign=1):
+    """Приращения счетчиков для добавленного (sign=1) или удаленного (-1) автомобиля"""
+    deltas = {(CatalogCounter.TOTAL_CARS, 0): sign}
+    if brand_id is not None:
+        deltas[(CatalogCounter.BRAND_CARS, brand_id)] = sign
+    if body_type_id is not None:
+        deltas[(CatalogCounter.BODY_TYPE_CARS, body_type_id)] = sign
+    return deltas
+
+
+def bulk_car_deltas(cars):
+    """
+    Приращения для пакета добавленных автомобилей
+
+    Args:
+        cars: Итерируемый объект пар (brand_id, body_type_id)
+    """
+    deltas = defaultdict(int)
+    for brand_id, body_type_id in cars:
+        _merge(deltas, car_deltas(brand_id, body_type_id))
+    return deltas
+
+
+def get_counter(scope, object_id=0):
+    """Текущее значение счетчика"""
+    value = CatalogCounter.objects.filter(scope=scope, object_id=object_id).values_list(
+        'value', flat=True
+    ).first()
+    return value or 0
+
+
+def get_catalog_version():
+    """
+    Версия каталога из базы
+
+    Меняется в той же транзакции, что и счетчики, поэтому одинакова для
+    всех процессов и становится видна вместе с изменением каталога.
+    """
+    return get_counter(*CATALOG_VERSION_KEY)
+
+
+def scan_counters():
+    """
+    Считает все счетчики по таблицам каталога
+
+    Фиксированное число GROUP BY запросов, используется для сверки.
+
+    Returns:
+        dict: (scope, object_id) -> значение
+    """
+    expected = {
+        (CatalogCounter.TOTAL_BRANDS, 0): Brand.objects.count(),
+        (CatalogCounter.TOTAL_MODELS, 0): CarModel.objects.count(),
+        (CatalogCounter.TOTAL_CARS, 0): Car.objects.count(),
+        (CatalogCounter.TOTAL_BODY_TYPES, 0): BodyType.objects.count(),
+    }
+    grouped = (
+        (CatalogCounter.BRAND_CARS, Brand.objects.annotate(value=Count('carmodel__car'))),
+        (CatalogCounter.BRAND_MODELS, Brand.objects.annotate(value=Count('carmodel'))),
+        (CatalogCounter.BODY_TYPE_CARS, BodyType.objects.annotate(value=Count('car'))),
+    )
+    for scope, queryset in grouped:
+        for object_id, value in queryset.order_by().values_list('pk', 'value'):
+            expected[(scope, object_id)] = value
+    return expected
+
+
+def reconcile_counters(fix=True):
+    """
+    Сверяет счетчики с таблицами каталога и при fix=True исправляет расхождения
+
+    На PostgreSQL таблица счетчиков блокируется на время сверки, поэтому
+    параллельные импорты дожидаются ее окончания, а их изменения не теряются.
+
+    Returns:
+        list: Расхождения (scope, object_id, сохранено, ожидается);
+            None в "сохранено" - строки нет, в "ожидается" - лишняя строка
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {connection.ops.quote_name(CatalogCounter._meta.db_table)} "
+                    f"IN SHARE ROW EXCLUSIVE MODE"
+                )
+
+        expected = scan_counters()
+        stored = {
+            (scope, object_id): (pk, value)
+            for pk, scope, object_id, value in CatalogCounter.objects.exclude(
+                scope=CatalogCounter.CATALOG_VERSION
+            ).values_list('pk', 'scope', 'object_id', 'value')
+        }
+
+        drift = []
+        for key, value in expected.items():
+            current = stored.get(key)
+            if current is None or current[1] != value:
+                drift.append((*key, current and current[1], value))
+        for key, (_, value) in stored.items():
+            if key not in expected:
+                drift.append((*key, value, None))
+
+        if fix and drift:
+            stale = [stored[(scope, object_id)][0] for scope, object_id, _, value in drift
+                     if value is None]
+            CatalogCounter.objects.filter(pk__in=stale).delete()
+
+            changed = []
+            missing = []
+            for scope, object_id, current, value in drift:
+                if value is None:
+                    continue
+                if current is None:
+                    missing.append(CatalogCounter(scope=scope, object_id=object_id, value=value))
+                else:
+                    changed.append(CatalogCounter(pk=stored[(scope, object_id)][0], value=value))
+            CatalogCounter.objects.bulk_create(missing)
+            CatalogCounter.objects.bulk_update(changed, ['value'], batch_size=1000)
+            apply_counter_deltas({CATALOG_VERSION_KEY: 0})
+
+    if drift:
+        logger.warning(f"Catalog counters drift: {len(drift)} counters differ{' (fixed)' if fix else ''}")
+    return drift
@@ -3,9 +3,9 @@ import xml.etree.ElementTree as ET
 from datetime import datetime
 
 from django.db import models, transaction
-from django.db.models import Avg, Count
 
 from cars.models import AuditLog, BodyType, Brand, Modification, Model
+from cars.utils.statistics import TOP_BRANDS_LIMIT, body_type_distribution, compute_statistics, top_brands
 
 
 logger = logging.getLogger(__name__)
@@ -133,17 +133,8 @@ class CarDataProcessor:
         try:
             logger.info("Generating car statistics")
 
-            # Базовая статистика
-            stats = {
-                'total_brands': Brand.objects.count(),
-                'total_models': Model.objects.count(),
-                'total_modifications': Modification.objects.count(),
-                'total_body_types': BodyType.objects.count(),
-                'average_power': Modification.objects.aggregate(avg_power=Avg('power'))['avg_power'],
-                'top_brands': self._calculate_top_brands(),
-                'fuel_type_distribution': self._get_fuel_distribution(),
-                'body_type_distribution': self._get_body_type_distribution()
-            }
+            # Все разделы считаются общим движком фиксированным числом запросов
+            stats = compute_statistics()
 
             logger.info("Statistics generated successfully")
             return stats
@@ -152,43 +143,17 @@ class CarDataProcessor:
             logger.error(f"Failed to generate statistics: {str(e)}")
             raise
 
-    def _calculate_top_brands(self, limit=5):
+    def _calculate_top_brands(self, limit=TOP_BRANDS_LIMIT):
         """
-        Рассчитывает топ-N брендов по количеству моделей
+        Рассчитывает топ-N брендов по количеству автомобилей
 
         Args:
             limit: Количество брендов в топе
 
         Returns:
-            list: Список брендов и количество моделей
-        """
-        top_brands = Brand.objects.annotate(
-            models_count=Count('model')
-        ).order_by('-models_count')[:limit]
-
-        return [
-            {
-                'brand': brand.name,
-                'models_count': brand.models_count,
-                'average_power': Modification.objects.filter(
-                    model__brand=brand
-                ).aggregate(avg=Avg('power'))['avg'] or 0
-            }
-            for brand in top_brands
-        ]
-
-    def _get_fuel_distribution(self):
-        """
-        Рассчитывает распределение по типам топлива
-
-        Returns:
-            dict: Распределение по типам топлива
+            list: Список брендов с количеством моделей и автомобилей
         """
-        fuel_types = Modification.objects.values('fuel_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        return {item['fuel_type'] or 'Unknown': item['count'] for item in fuel_types}
+        return top_brands(limit)
 
     def _get_body_type_distribution(self):
         """
@@ -197,8 +162,4 @@ class CarDataProcessor:
         Returns:
             dict: Распределение по типам кузова
         """
-        body_types = Modification.objects.values('body_type__name').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        return {item['body_type__name'] or 'Unknown': item['count'] for item in body_types}
\ No newline at end of file
+        return body_type_distribution()
@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+
+from django.utils import timezone
+
+from cars.models import ImportedFile, ImportFingerprint, normalize_name
+from cars.utils.bulk_import import CarBulkImporter
+
+
+logger = logging.getLogger(__name__)
+
+FILE_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """
+    Считает SHA-256 файла потоково
+
+    Args:
+        path: Путь к файлу
+
+    Returns:
+        str: Хэш содержимого в hex
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(FILE_READ_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_file_unchanged(source, sha256):
+    """Проверяет, совпадает ли хэш с последним успешно импортированным файлом источника"""
+    latest = ImportedFile.objects.filter(source=source).order_by('-imported_at').first()
+    return latest is not None and latest.sha256 == sha256
+
+
+def record_imported_file(source, sha256, job=None):
+    """Запоминает хэш полностью импортированного файла"""
+    return ImportedFile.objects.create(
+        source=source,
+        sha256=sha256,
+        size=os.path.getsize(source),
+        job=job
+    )
+
+
+def fingerprint_key(brand, model, body_type):
+    """Ключ отпечатка по нормализованной тройке бренд/модель/кузов"""
+    normalized = '\x1f'.join(normalize_name(value) for value in (brand, model, body_type))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def forget_fingerprints(triples):
+    """
+    Удаляет отпечатки записей, автомобили которых удалены из каталога
+
+    Иначе следующий дельта-импорт счел бы такую запись неизменной и не
+    создал бы автомобиль заново.
+
+    Args:
+        triples: Итерируемый объект кортежей (бренд, модель, кузов)
+    """
+    keys = {fingerprint_key(*triple) for triple in triples}
+    if keys:
+        ImportFingerprint.objects.filter(key__in=keys).delete()
+
+
+class DeltaCarImporter(CarBulkImporter):
+    """
+    Импорт только новых и измененных записей
+
+    Записи должны содержать отпечаток остальных полей <Modification>
+    четвертым элементом (iter_modifications(..., digest=True)). Строки,
+    отпечаток которых совпадает с сохраненным для той же тройки
+    бренд/модель/кузов, не доходят до таблиц каталога и учитываются в
+    счетчике unchanged. Повтор тройки в том же импорте учитывается как
+    skipped и не переписывает ее отпечаток, иначе строки одной тройки
+    чередовали бы его от импорта к импорту. Отпечатки обновляются только
+    для строк, сохраненных без ошибок, и удаляются вместе с автомобилем
+    (см. cars.signals.fingerprint_signals).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.results['unchanged'] = 0
+        self._seen_keys = set()
+
+    def prepare_record(self, record):
+        row = super().prepare_record(record)
+        if row is None:
+            return None
+        return row + (record[3],)
+
+    def _flush(self, chunk):
+        keys = [fingerprint_key(brand, model, body) for brand, model, body, _ in chunk]
+        known = dict(
+            ImportFingerprint.objects.filter(key__in=set(keys)).values_list('key', 'digest')
+        )
+
+        changed = []
+        changed_flags = []
+        for key, row in zip(keys, chunk):
+            if key in self._seen_keys:
+                is_changed = False
+                self.results['skipped'] += 1
+            else:
+                self._seen_keys.add(key)
+                is_changed = known.get(key) != row[3]
+                if not is_changed:
+                    self.results['unchanged'] += 1
+            changed_flags.append(is_changed)
+            if is_changed:
+                changed.append((key, row))
+
+        if not changed:
+            if self.on_chunk:
+                self.on_chunk(self.results)
+            return [False] * len(chunk)
+
+        changed_outcomes = super()._flush([row[:3] for _, row in changed])
+        # Тройку, сохранить которую не удалось, повтор в этом импорте пробует снова
+        self._seen_keys.difference_update(
+            key for (key, _), outcome in zip(changed, changed_outcomes) if outcome is None
+        )
+
+        fingerprints = {
+            key: row[3]
+            for (key, row), outcome in zip(changed, changed_outcomes)
+            if outcome is not None
+        }
+        if fingerprints:
+            now = timezone.now()
+            ImportFingerprint.objects.bulk_create(
+                [
+                    ImportFingerprint(key=key, digest=digest, updated_at=now)
+                    for key, digest in fingerprints.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=['digest', 'updated_at']
+            )
+
+        logger.debug(f"Delta chunk: {len(chunk) - len(changed)} unchanged, {len(changed)} sent to DB")
+
+        # Исходы выравниваются по исходной порции, неизмененные строки - False
+        outcomes = iter(changed_outcomes)
+        return [next(outcomes) if is_changed else False for is_changed in changed_flags]
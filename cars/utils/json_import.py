@@ -0,0 +1,181 @@
+import json
+import logging
+
+from cars.utils.bulk_import import CarBulkImporter, clean_string
+
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ('brand', 'model', 'body_type')
+NDJSON_READ_CHUNK_SIZE = 64 * 1024
+# Максимальная длина одной строки NDJSON (одного автомобиля)
+MAX_NDJSON_LINE_BYTES = 64 * 1024
+LINE_TOO_LONG_ERROR = f"Строка длиннее {MAX_NDJSON_LINE_BYTES} байт"
+# Сколько статусов элементов возвращается в ответе, дальше - только счетчики
+MAX_ITEM_RESULTS = 10000
+
+
+def clean_car_item(item):
+    """
+    Проверяет и очищает один автомобиль из JSON
+
+    Args:
+        item: Объект {brand, model, body_type}
+
+    Returns:
+        tuple: (строка (brand, model, body_type), None) или (None, текст ошибки)
+    """
+    if not isinstance(item, dict):
+        return None, "Ожидается объект с полями brand, model, body_type"
+
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in item]
+    if missing_fields:
+        return None, f"Отсутствуют обязательные поля: {', '.join(missing_fields)}"
+
+    if not all(isinstance(item[field], str) for field in REQUIRED_FIELDS):
+        return None, "Поля должны быть строками"
+
+    row = tuple(clean_string(item[field]) for field in REQUIRED_FIELDS)
+    if not all(row):
+        return None, "Все поля должны содержать непустые значения"
+    return row, None
+
+
+def iter_ndjson(stream, chunk_size=NDJSON_READ_CHUNK_SIZE):
+    """
+    Потоково читает NDJSON из бинарного потока
+
+    Пустые строки пропускаются, строка с некорректным JSON не прерывает
+    чтение остальных. Строка длиннее MAX_NDJSON_LINE_BYTES возвращается
+    как ошибка, ее байты не накапливаются в памяти до конца строки.
+
+    Args:
+        stream: Бинарный файловый объект (тело запроса)
+        chunk_size: Размер блока чтения в байтах
+
+    Yields:
+        tuple: (объект, None) или (None, текст ошибки) для каждой строки
+    """
+    buffer = b''
+    # Начало текущей строки уже превысило лимит и отброшено
+    oversized = False
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        buffer += data
+
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            if oversized or len(line) > MAX_NDJSON_LINE_BYTES:
+                oversized = False
+                yield None, LINE_TOO_LONG_ERROR
+            elif line.strip():
+                yield _parse_line(line)
+
+        if len(buffer) > MAX_NDJSON_LINE_BYTES:
+            oversized = True
+            buffer = b''
+
+    if oversized:
+        yield None, LINE_TOO_LONG_ERROR
+    elif buffer.strip():
+        yield _parse_line(buffer)
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line), None
+    except ValueError:
+        return None, "Некорректный JSON"
+
+
+class JSONCarImporter(CarBulkImporter):
+    """
+    Пакетный импорт автомобилей из JSON массива или NDJSON
+
+    Каждый элемент проверяется и очищается так же, как одиночный
+    JSON запрос, корректные строки сохраняются порциями CarBulkImporter.
+    Для первых max_item_results элементов запоминается статус: created,
+    exists, invalid или error; остальные учитываются только в счетчиках,
+    чтобы длинный NDJSON поток не копил статусы в памяти.
+    """
+
+    def __init__(self, *args, max_item_results=MAX_ITEM_RESULTS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_item_results = max_item_results
+        self.items = []
+        self.items_total = 0
+        self.items_truncated = False
+        self._pending_items = []
+
+    def import_items(self, items):
+        """
+        Импортирует элементы JSON массива
+
+        Args:
+            items: Список словарей {brand, model, body_type}
+
+        Returns:
+            dict: Счетчики импорта
+        """
+        try:
+            for item in items:
+                self.add_item(item)
+        finally:
+            self.finish()
+
+        return self.results
+
+    def import_ndjson(self, stream):
+        """
+        Импортирует NDJSON по мере чтения потока
+
+        Args:
+            stream: Бинарный файловый объект
+
+        Returns:
+            dict: Счетчики импорта
+        """
+        try:
+            for item, error in iter_ndjson(stream):
+                self.add_item(item, error)
+        finally:
+            # Строки, прочитанные до ошибки, тоже сохраняются
+            self.finish()
+
+        return self.results
+
+    def add_item(self, item, error=None):
+        """Проверяет элемент и добавляет его в текущую порцию"""
+        entry = {'index': self.items_total, 'status': None}
+        self.items_total += 1
+        if len(self.items) < self.max_item_results:
+            self.items.append(entry)
+        else:
+            self.items_truncated = True
+
+        row = None
+        if error is None:
+            row, error = clean_car_item(item)
+        if error:
+            entry.update(status='invalid', error=error)
+            self.results['invalid_entries'] += 1
+            return
+
+        self._pending_items.append(entry)
+        self.add_record(row)
+
+    def _flush(self, chunk):
+        entries = self._pending_items[:len(chunk)]
+        self._pending_items = self._pending_items[len(chunk):]
+
+        outcomes = super()._flush(chunk)
+
+        for entry, created in zip(entries, outcomes):
+            if created is None:
+                entry['status'] = 'error'
+            else:
+                entry['status'] = 'created' if created else 'exists'
+        return outcomes
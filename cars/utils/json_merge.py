@@ -0,0 +1,48 @@
+"""JSON Merge Patch (RFC 7386) для хранения снимков статистики дельтами"""
+
+
+def apply_merge_patch(target, patch):
+    """
+    Применяет merge patch к документу
+
+    Args:
+        target: Исходный JSON документ
+        patch: Патч; null в объекте удаляет ключ, не-объект заменяет значение
+
+    Returns:
+        Новый документ (исходный не изменяется)
+    """
+    if not isinstance(patch, dict):
+        return patch
+
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def create_merge_patch(source, target):
+    """
+    Строит merge patch, переводящий source в target
+
+    Значения null в target патчем не выражаются (null означает удаление),
+    поэтому результат нужно проверять через apply_merge_patch.
+
+    Returns:
+        Патч: словарь изменений или целиком target, если это не объекты
+    """
+    if not isinstance(source, dict) or not isinstance(target, dict):
+        return target
+
+    patch = {}
+    for key in source.keys() - target.keys():
+        patch[key] = None
+    for key, value in target.items():
+        if key not in source:
+            patch[key] = value
+        elif source[key] != value:
+            patch[key] = create_merge_patch(source[key], value)
+    return patch
@@ -0,0 +1,130 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from cars.models import ImportJob
+from cars.utils.audit_summary import suspend_audit
+from cars.utils.bulk_import import CarBulkImporter, rows_seen, serialize_results
+from cars.utils.delta_import import DeltaCarImporter
+from cars.utils.xml_stream import find_shard_ranges, iter_modifications_in_range
+
+
+logger = logging.getLogger(__name__)
+
+COUNTER_KEYS = ('cars_processed', 'errors', 'skipped', 'invalid_entries')
+
+
+def import_shard(path, start, end, job_id=None, chunk_size=CarBulkImporter.DEFAULT_CHUNK_SIZE,
+                 delta=False):
+    """
+    Импортирует один шард XML файла
+
+    Бренды и модели, которые одновременно создают несколько шардов,
+    дедуплицируются уникальными ограничениями по name_key (ON CONFLICT).
+
+    Args:
+        path: Путь к XML файлу
+        start: Смещение начала шарда
+        end: Смещение конца шарда
+        job_id: Id ImportJob для инкрементального обновления прогресса
+        chunk_size: Размер порции для bulk вставки
+        delta: Пропускать записи с неизменившимся отпечатком
+
+    Returns:
+        dict: JSON-совместимые счетчики импорта шарда
+    """
+    progress = {'bytes': 0, 'reported_bytes': 0, 'reported_rows': 0}
+
+    def track_bytes(bytes_read):
+        progress['bytes'] = bytes_read
+
+    def checkpoint(results):
+        # Шарды пишут приращения, а не абсолютные значения
+        rows = rows_seen(results)
+        ImportJob.objects.filter(pk=job_id).update(
+            rows_processed=F('rows_processed') + (rows - progress['reported_rows']),
+            bytes_processed=F('bytes_processed') + (progress['bytes'] - progress['reported_bytes']),
+            updated_at=timezone.now()
+        )
+        progress['reported_rows'] = rows
+        progress['reported_bytes'] = progress['bytes']
+
+    importer_class = DeltaCarImporter if delta else CarBulkImporter
+    importer = importer_class(chunk_size=chunk_size, on_chunk=checkpoint if job_id else None)
+    # Аудит по объектам отключен: сводку по импорту пишет запустивший шарды
+    with suspend_audit():
+        importer.import_records(
+            iter_modifications_in_range(path, start, end, progress=track_bytes, digest=delta)
+        )
+    logger.info(f"Shard {start}-{end} of {path} imported: {importer.results}")
+    return serialize_results(importer.results)
+
+
+def merge_results(shard_results):
+    """
+    Объединяет счетчики шардов
+
+    Args:
+        shard_results: Итерируемый объект результатов import_shard
+
+    Returns:
+        dict: Счетчики импорта в формате handle_xml_import
+    """
+    merged = {key: 0 for key in COUNTER_KEYS}
+    merged['processed_brands'] = set()
+
+    for results in shard_results:
+        for key in COUNTER_KEYS:
+            merged[key] += results[key]
+        if 'unchanged' in results:
+            merged['unchanged'] = merged.get('unchanged', 0) + results['unchanged']
+        merged['processed_brands'].update(results['processed_brands'])
+
+    return merged
+
+
+def run_parallel_import(path, shards=None, job_id=None, chunk_size=CarBulkImporter.DEFAULT_CHUNK_SIZE,
+                        delta=False):
+    """
+    Импортирует XML файл параллельно в пуле процессов
+
+    Args:
+        path: Путь к XML файлу
+        shards: Количество шардов (по умолчанию число CPU)
+        job_id: Id ImportJob для обновления прогресса
+        chunk_size: Размер порции для bulk вставки
+        delta: Пропускать записи с неизменившимся отпечатком
+
+    Returns:
+        dict: Объединенные счетчики импорта
+    """
+    ranges = find_shard_ranges(path, shards or os.cpu_count() or 1)
+    logger.info(f"Importing {path} in {len(ranges)} shards with a process pool")
+
+    # Дочерние процессы не должны наследовать открытые соединения с БД
+    connections.close_all()
+
+    with ProcessPoolExecutor(max_workers=len(ranges) or 1, initializer=_init_worker) as pool:
+        futures = [
+            pool.submit(import_shard, path, start, end, job_id, chunk_size, delta)
+            for start, end in ranges
+        ]
+        return merge_results(future.result() for future in futures)
+
+
+def can_use_process_pool():
+    """Демонические процессы (воркеры Celery prefork) не могут порождать дочерние"""
+    return not multiprocessing.current_process().daemon
+
+
+def _init_worker():
+    # При методе запуска spawn Django нужно инициализировать заново
+    if not apps.ready:
+        django.setup()
@@ -1,9 +1,35 @@
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from django.http import HttpResponse, HttpResponseNotModified
 from datetime import datetime
+import gzip
 import logging
 
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него отдаем gzip
+    brotli = None
+
 logger = logging.getLogger(__name__)
 
+# Минимальный размер тела, которое имеет смысл сжимать
+MIN_COMPRESS_SIZE = 200
+
+
+def build_response_envelope(data=None, status=200, message="Success", metadata=None):
+    """Стандартная обертка ответа API (metadata + data)"""
+    return {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "status": status,
+            "message": message,
+            "service": "Car Statistics API",
+            "version": "1.0",
+            **(metadata or {})
+        },
+        "data": data
+    }
+
 
 def create_json_response(data=None, status=200, message="Success", metadata=None):
     """
@@ -19,17 +45,7 @@ def create_json_response(data=None, status=200, message="Success", metadata=None
         Response: Стандартизированный DRF Response
     """
     try:
-        response_data = {
-            "metadata": {
-                "timestamp": datetime.now().isoformat(),
-                "status": status,
-                "message": message,
-                "service": "Car Statistics API",
-                "version": "1.0",
-                **(metadata or {})
-            },
-            "data": data
-        }
+        response_data = build_response_envelope(data, status, message, metadata)
 
         # Логирование успешного формирования ответа
         logger.info(f"Response created with status {status}")
@@ -46,4 +62,97 @@ def create_json_response(data=None, status=200, message="Success", metadata=None
                 "error": str(e)
             },
             "data": None
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+def render_json_bodies(data=None, status=200, message="Success", metadata=None):
+    """
+    Сериализует и заранее сжимает стандартный JSON-ответ
+
+    Args:
+        data: Основные данные ответа
+        status: HTTP статус код
+        message: Сообщение для пользователя
+        metadata: Дополнительные метаданные
+
+    Returns:
+        dict: Статус и тела ответа по кодировкам (identity, gzip, br)
+    """
+    body = JSONRenderer().render(build_response_envelope(data, status, message, metadata))
+    bodies = {'identity': body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        bodies['gzip'] = gzip.compress(body, mtime=0)
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body)
+    return {'status': status, 'bodies': bodies}
+
+
+def _accepted_encodings(request):
+    """Кодировки из Accept-Encoding с ненулевым q"""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    if '*' in accepted:
+        accepted.update(('br', 'gzip'))
+    return accepted
+
+
+def _etag(version, encoding):
+    # Сильный ETag отдельный для каждого представления (кодировки)
+    suffix = '' if encoding == 'identity' else f'-{encoding}'
+    return f'"{version}{suffix}"'
+
+
+def conditional_json_response(request, version, build):
+    """
+    JSON-ответ с ETag и поддержкой If-None-Match
+
+    При совпадении ETag с версией данных отвечает 304 без вызова build,
+    то есть без пересчета и сериализации. Иначе отдает заранее
+    сериализованное и сжатое тело из build() в лучшей кодировке,
+    которую принимает клиент.
+
+    Args:
+        request: Запрос
+        version: Строка версии данных, из которой строится ETag
+        build: Функция без аргументов, возвращающая результат render_json_bodies
+
+    Returns:
+        HttpResponse: Ответ 200/304 (или другой статус из build без ETag)
+    """
+    etags = {_etag(version, encoding) for encoding in ('identity', 'gzip', 'br')}
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    requested = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',') if tag.strip()}
+    matched = requested & etags
+    if matched:
+        response = HttpResponseNotModified()
+        response['ETag'] = matched.pop()
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    rendered = build()
+    bodies = rendered['bodies']
+    accepted = _accepted_encodings(request)
+    encoding = next((coding for coding in ('br', 'gzip') if coding in bodies and coding in accepted),
+                    'identity')
+
+    response = HttpResponse(bodies[encoding], status=rendered['status'],
+                            content_type='application/json')
+    response['Vary'] = 'Accept-Encoding'
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    # ETag выдаем только для успешного ответа: 304 подтверждает именно его
+    if rendered['status'] == 200:
+        response['ETag'] = _etag(version, encoding)
+        response['Cache-Control'] = 'no-cache'
+    return response
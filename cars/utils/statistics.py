@@ -0,0 +1,163 @@
+import logging
+import time
+
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from cars.models import BodyType, Brand, CatalogCounter
+from cars.utils.counters import get_catalog_version, get_counter
+
+
+logger = logging.getLogger(__name__)
+
+TOP_BRANDS_LIMIT = 5
+
+# Общие счетчики: без них статистика не сохраняется
+COUNT_SECTIONS = ('total_brands', 'total_models', 'total_cars', 'total_body_types')
+
+# Разделы, которые StatisticsView считает на лету поверх сохраненной статистики
+CURRENT_SECTIONS = ('total_brands', 'total_models', 'total_cars', 'body_type_distribution')
+
+
+def total_brands():
+    return get_counter(CatalogCounter.TOTAL_BRANDS)
+
+
+def total_models():
+    return get_counter(CatalogCounter.TOTAL_MODELS)
+
+
+def total_cars():
+    return get_counter(CatalogCounter.TOTAL_CARS)
+
+
+def total_body_types():
+    return get_counter(CatalogCounter.TOTAL_BODY_TYPES)
+
+
+def body_type_distribution():
+    """
+    Количество автомобилей по типам кузова из счетчиков каталога
+
+    Returns:
+        dict: Название типа кузова -> количество автомобилей (включая нулевые)
+    """
+    car_count = CatalogCounter.objects.filter(
+        scope=CatalogCounter.BODY_TYPE_CARS, object_id=OuterRef('pk')
+    ).values('value')[:1]
+    return dict(
+        BodyType.objects.annotate(car_count=Coalesce(Subquery(car_count), 0))
+        .order_by('name')
+        .values_list('name', 'car_count')
+    )
+
+
+def top_brands(limit=TOP_BRANDS_LIMIT):
+    """
+    Топ брендов по количеству автомобилей из счетчиков каталога
+
+    Args:
+        limit: Количество брендов в топе
+
+    Returns:
+        list: Словари с названием бренда, количеством моделей и автомобилей
+    """
+    top = list(
+        CatalogCounter.objects.filter(scope=CatalogCounter.BRAND_CARS)
+        .order_by('-value', 'object_id')
+        .values_list('object_id', 'value')[:limit]
+    )
+    brand_ids = [brand_id for brand_id, _ in top]
+    names = dict(Brand.objects.filter(pk__in=brand_ids).values_list('pk', 'name'))
+    model_counts = dict(
+        CatalogCounter.objects.filter(scope=CatalogCounter.BRAND_MODELS, object_id__in=brand_ids)
+        .values_list('object_id', 'value')
+    )
+    return [
+        {'name': names[brand_id], 'model_count': model_counts.get(brand_id, 0), 'car_count': car_count}
+        for brand_id, car_count in top
+        if brand_id in names
+    ]
+
+
+# Реестр разделов статистики: ключ в json_statistics -> функция расчета.
+# Разделы читают CatalogCounter (см. cars.utils.counters), поэтому число
+# запросов и их стоимость не зависят от размера таблицы Car.
+SECTIONS = {
+    'total_brands': total_brands,
+    'total_models': total_models,
+    'total_cars': total_cars,
+    'total_body_types': total_body_types,
+    'body_type_distribution': body_type_distribution,
+    'top_brands': top_brands,
+}
+
+
+def run_section(name, raise_errors=False):
+    """
+    Считает один раздел статистики с замером времени
+
+    Args:
+        name: Имя раздела из SECTIONS
+        raise_errors: Пробросить исключение раздела вместо результата с ошибкой
+
+    Returns:
+        dict: name, status ('success' или 'error'), value, duration (секунды)
+            и error (текст ошибки или None)
+    """
+    start_time = time.time()
+    try:
+        value = SECTIONS[name]()
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.error(f"Error calculating statistics section {name}: {str(e)}")
+        return {'name': name, 'status': 'error', 'value': None,
+                'duration': round(time.time() - start_time, 3), 'error': str(e)}
+
+    duration = round(time.time() - start_time, 3)
+    logger.debug(f"Statistics section {name} calculated in {duration:.3f}s")
+    return {'name': name, 'status': 'success', 'value': value, 'duration': duration, 'error': None}
+
+
+def section_report(result):
+    """Запись о расчете раздела для Statistic.sections (без самого значения)"""
+    return {key: result[key] for key in ('status', 'duration', 'error')}
+
+
+def compute_statistics(sections=None, fail_soft=False, report=None):
+    """
+    Считает разделы статистики
+
+    Args:
+        sections: Имена разделов из SECTIONS (по умолчанию все)
+        fail_soft: Пропустить раздел с ошибкой вместо исключения
+        report: Словарь, в который записываются время и результат
+            расчета каждого раздела (см. section_report)
+
+    Returns:
+        dict: Имя раздела -> значение (без разделов с ошибкой)
+    """
+    stats = {}
+    for name in sections or SECTIONS:
+        result = run_section(name, raise_errors=not fail_soft)
+        if report is not None:
+            report[name] = section_report(result)
+        if result['status'] == 'success':
+            stats[name] = result['value']
+    return stats
+
+
+def has_catalog_changes(previous):
+    """
+    Менялся ли каталог после снимка previous
+
+    Сравнивает версию каталога, прочитанную перед расчетом снимка, с
+    текущей. Версия увеличивается в самой транзакции изменения, поэтому
+    изменение, зафиксированное после начала прошлого расчета, не теряется,
+    сколько бы ни шла его транзакция. Снимок без версии или без части
+    разделов тоже считается устаревшим.
+    """
+    if previous.catalog_version is None or any(name not in previous.statistics for name in SECTIONS):
+        return True
+    return previous.catalog_version != get_catalog_version()
@@ -0,0 +1,158 @@
+import base64
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from cars.models import Statistic
+
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ('raw', 'hour', 'day', 'week')
+BUCKET_LENGTH = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def parse_moment(value, end_of_day=False):
+    """
+    Разбирает дату или дату-время из параметра запроса
+
+    Args:
+        value: ISO 8601 дата-время или дата (YYYY-MM-DD)
+        end_of_day: Для даты без времени взять начало следующего дня
+
+    Returns:
+        datetime: Aware datetime в текущей временной зоне
+
+    Raises:
+        ValueError: Если значение не распознано
+    """
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day, time.min)
+        if end_of_day:
+            moment += timedelta(days=1)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"некорректная дата: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def encode_cursor(moment, pk=None):
+    """Непрозрачный курсор keyset пагинации"""
+    raw = json.dumps([moment.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Разбирает курсор
+
+    Returns:
+        tuple: (datetime, id или None)
+
+    Raises:
+        ValueError: Если курсор поврежден
+    """
+    try:
+        moment, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return parse_moment(moment), pk
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("некорректный cursor") from e
+
+
+def statistics_history(start=None, end=None, bucket='raw', cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Страница истории снимков Statistic по возрастанию date_calculated
+
+    Для bucket=hour|day|week в каждом интервале остается последний снимок
+    (статистика накопительная, последний снимок описывает весь интервал).
+    Пагинация по ключу: курсор указывает на последний элемент страницы,
+    поэтому стоимость запроса не зависит от номера страницы.
+
+    Args:
+        start: Начало диапазона включительно
+        end: Конец диапазона не включительно
+        bucket: Интервал прореживания или 'raw'
+        cursor: Курсор из next_cursor предыдущей страницы
+        limit: Размер страницы
+
+    Returns:
+        tuple: (список снимков, курсор следующей страницы или None)
+    """
+    # base нужен для развертывания снимков, хранящихся дельтами
+    queryset = Statistic.objects.select_related('base')
+    if start is not None:
+        queryset = queryset.filter(date_calculated__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date_calculated__lt=end)
+
+    after = decode_cursor(cursor) if cursor else None
+
+    if bucket == 'raw':
+        if after:
+            moment, pk = after
+            queryset = queryset.filter(
+                Q(date_calculated__gt=moment) | Q(date_calculated=moment, id__gt=pk or 0)
+            )
+        rows = list(queryset.order_by('date_calculated', 'id')[:limit + 1])
+        items = [_serialize(stat) for stat in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last.date_calculated, last.pk)
+        return items, next_cursor
+
+    queryset = queryset.annotate(bucket=Trunc('date_calculated', bucket))
+    if after:
+        # Курсор - начало последнего интервала страницы, продолжаем со следующего.
+        # Граница считается в локальном времени, как и Trunc, а условие
+        # по date_calculated использует индекс
+        moment, _ = after
+        local_start = timezone.localtime(moment).replace(tzinfo=None)
+        queryset = queryset.filter(
+            date_calculated__gte=timezone.make_aware(local_start + BUCKET_LENGTH[bucket])
+        )
+
+    if connection.vendor == 'postgresql':
+        # DISTINCT ON: последний снимок каждого интервала одним запросом без подзапросов
+        rows = list(
+            queryset.order_by('bucket', '-date_calculated', '-id').distinct('bucket')[:limit + 1]
+        )
+    else:
+        latest = (
+            queryset.filter(bucket=OuterRef('bucket'))
+            .order_by('-date_calculated', '-id')
+            .values('id')[:1]
+        )
+        rows = list(queryset.filter(id=Subquery(latest)).order_by('bucket')[:limit + 1])
+
+    items = [_serialize(stat, stat.bucket) for stat in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1].bucket) if len(rows) > limit else None
+    return items, next_cursor
+
+
+def _serialize(stat, bucket=None):
+    item = {
+        'id': stat.pk,
+        'date_calculated': stat.date_calculated,
+        'resolution': stat.resolution,
+        'statistics': stat.statistics
+    }
+    if bucket is not None:
+        item['bucket'] = bucket
+    return item
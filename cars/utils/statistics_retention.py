@@ -0,0 +1,214 @@
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Func, IntegerField, Sum, TextField
+from django.db.models.functions import Cast, Length
+from django.utils import timezone
+
+from cars.models import Statistic
+from cars.utils.json_merge import apply_merge_patch, create_merge_patch
+
+
+logger = logging.getLogger(__name__)
+
+# Уровни прореживания: (исходное разрешение, итоговое, интервал, настройка окна хранения)
+LEVELS = (
+    ('raw', 'daily', 'day', 'STATISTICS_RAW_RETENTION_DAYS'),
+    ('daily', 'weekly', 'week', 'STATISTICS_DAILY_RETENTION_DAYS'),
+)
+# Дельта хранится, только если она не больше этой доли полного снимка
+DELTA_MAX_RATIO = 0.5
+# Не больше стольких дельт подряд на один полный снимок
+KEYFRAME_INTERVAL = 30
+BATCH_SIZE = 500
+
+
+def _period_start(moment, interval):
+    """Начало локального дня или недели (с понедельника), как у Trunc"""
+    day = timezone.localtime(moment).date()
+    if interval == 'week':
+        day -= timedelta(days=day.weekday())
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _json_size(value):
+    return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _batches(items):
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def stored_bytes():
+    """
+    Объем JSON снимков статистики в базе
+
+    На PostgreSQL - pg_column_size (размер значения с учетом сжатия TOAST),
+    на остальных базах - длина текстового представления.
+    """
+    if connection.vendor == 'postgresql':
+        size = Func('json_statistics', function='pg_column_size', output_field=IntegerField())
+    else:
+        size = Length(Cast('json_statistics', TextField()))
+    return Statistic.objects.aggregate(total=Sum(size))['total'] or 0
+
+
+def _delete_snapshots(ids):
+    """
+    Удаляет снимки пакетами
+
+    Остающиеся дельты, опирающиеся на удаляемые полные снимки, сначала
+    разворачиваются. Затем удаляются дельты и только потом полные снимки,
+    чтобы не нарушать PROTECT на base.
+
+    Returns:
+        int: Число удаленных снимков
+    """
+    doomed = set(ids)
+    for batch in _batches(ids):
+        dependents = [
+            stat for stat in Statistic.objects.filter(base_id__in=batch).select_related('base')
+            if stat.pk not in doomed
+        ]
+        for stat in dependents:
+            stat.json_statistics = stat.statistics
+            stat.base = None
+        Statistic.objects.bulk_update(dependents, ['json_statistics', 'base'])
+
+    deleted = 0
+    for batch in _batches(ids):
+        deleted += Statistic.objects.filter(pk__in=batch, base__isnull=False).delete()[0]
+    for batch in _batches(ids):
+        deleted += Statistic.objects.filter(pk__in=batch).delete()[0]
+    return deleted
+
+
+def _roll_up(source, target, interval, cutoff):
+    """
+    Оставляет по последнему снимку source в каждом интервале до cutoff
+
+    Статистика накопительная, поэтому последний снимок интервала описывает
+    его целиком; он получает разрешение target, остальные удаляются.
+
+    Returns:
+        tuple: (удалено, переведено в target)
+    """
+    rows = Statistic.objects.filter(
+        resolution=source, date_calculated__lt=cutoff
+    ).order_by('date_calculated', 'id').values_list('id', 'date_calculated')
+
+    last_in_period = {}
+    doomed = []
+    for pk, moment in rows.iterator(chunk_size=2000):
+        period = _period_start(moment, interval)
+        previous = last_in_period.get(period)
+        if previous is not None:
+            doomed.append(previous)
+        last_in_period[period] = pk
+
+    kept = list(last_in_period.values())
+    deleted = _delete_snapshots(doomed)
+    for batch in _batches(kept):
+        Statistic.objects.filter(pk__in=batch).update(resolution=target)
+    return deleted, len(kept)
+
+
+def _delta_encode():
+    """
+    Хранит прореженные снимки дельтами (JSON Merge Patch) к полному снимку
+
+    Полный снимок ("ключевой") начинается с первого снимка, после
+    KEYFRAME_INTERVAL дельт и везде, где дельта не дает выигрыша. Дельты
+    строятся от ключевого снимка, а не от соседнего, чтобы чтение любого
+    снимка стоило одного дополнительного объекта, а не цепочки.
+
+    Returns:
+        int: Число снимков, переведенных в дельты
+    """
+    with_dependents = set(
+        Statistic.objects.filter(base__isnull=False).values_list('base_id', flat=True).distinct()
+    )
+    rows = Statistic.objects.exclude(resolution='raw').order_by('date_calculated', 'id')
+
+    keyframe = None
+    since_keyframe = 0
+    encoded = []
+    for stat in rows.iterator(chunk_size=BATCH_SIZE):
+        if stat.base_id is not None:
+            if keyframe is not None and stat.base_id == keyframe.pk:
+                since_keyframe += 1
+            continue
+
+        full = stat.json_statistics
+        if (keyframe is not None and since_keyframe < KEYFRAME_INTERVAL
+                and stat.pk not in with_dependents):
+            patch = create_merge_patch(keyframe.json_statistics, full)
+            # null в снимке патчем не выражается, поэтому результат проверяется
+            if (apply_merge_patch(keyframe.json_statistics, patch) == full
+                    and _json_size(patch) <= _json_size(full) * DELTA_MAX_RATIO):
+                stat.json_statistics = patch
+                stat.base_id = keyframe.pk
+                encoded.append(stat)
+                since_keyframe += 1
+                continue
+
+        keyframe = stat
+        since_keyframe = 0
+
+    for batch in _batches(encoded):
+        Statistic.objects.bulk_update(batch, ['json_statistics', 'base'])
+    return len(encoded)
+
+
+def compact_statistics(now=None, raw_days=None, daily_days=None):
+    """
+    Прореживание и сжатие истории снимков Statistic
+
+    Снимки младше raw_days дней хранятся как есть, более старые
+    сворачиваются до одного на день, старше daily_days - до одного на
+    неделю. Прореженные снимки хранятся дельтами, где это экономит место.
+    Границы окон выравниваются на начало локального дня/недели, поэтому
+    интервал никогда не сворачивается частично.
+
+    Args:
+        now: Момент отсчета окон (по умолчанию текущее время)
+        raw_days: Окно полных снимков, по умолчанию STATISTICS_RAW_RETENTION_DAYS
+        daily_days: Окно дневных снимков, по умолчанию STATISTICS_DAILY_RETENTION_DAYS
+
+    Returns:
+        dict: Отчет: удалено, свернуто, переведено в дельты и объем до/после
+    """
+    now = now or timezone.now()
+    windows = {
+        'STATISTICS_RAW_RETENTION_DAYS': raw_days,
+        'STATISTICS_DAILY_RETENTION_DAYS': daily_days,
+    }
+    report = {
+        'rows_deleted': 0,
+        'rows_rolled_up': 0,
+        'rows_delta_encoded': 0,
+        'bytes_before': stored_bytes(),
+    }
+
+    for source, target, interval, setting in LEVELS:
+        days = windows[setting]
+        if days is None:
+            days = getattr(settings, setting)
+        cutoff = _period_start(now - timedelta(days=days), interval)
+        with transaction.atomic():
+            deleted, rolled_up = _roll_up(source, target, interval, cutoff)
+        report['rows_deleted'] += deleted
+        report['rows_rolled_up'] += rolled_up
+        logger.info(f"Statistics compaction {source}->{target} before {cutoff.isoformat()}: "
+                    f"{deleted} deleted, {rolled_up} kept")
+
+    with transaction.atomic():
+        report['rows_delta_encoded'] = _delta_encode()
+
+    report['bytes_after'] = stored_bytes()
+    report['bytes_reclaimed'] = report['bytes_before'] - report['bytes_after']
+    return report
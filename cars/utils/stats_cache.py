@@ -0,0 +1,93 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from cars.models import Statistic
+from cars.utils.counters import get_catalog_version
+
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_KEY = 'cars:statistics:payload:{version}'
+# Пока один запрос пересчитывает статистику, остальные ждут его результат
+LOCK_TIMEOUT = 30
+LOCK_WAIT_SECONDS = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _cache():
+    return caches[settings.STATISTICS_CACHE_ALIAS]
+
+
+def latest_statistic_id():
+    """Id последнего снимка статистики (0, если снимков нет)"""
+    latest = Statistic.objects.order_by('-date_calculated', '-id').values_list('pk', flat=True).first()
+    return latest or 0
+
+
+def get_statistics_version():
+    """
+    Версия ответа статистики из состояния базы
+
+    Складывается из id последнего снимка Statistic и версии каталога: оба
+    значения меняются в транзакциях, изменивших данные, и видны всем
+    процессам сразу после фиксации. Кэш хранит только ответы под этой
+    версией, поэтому кэш в памяти процесса так же корректен, как общий
+    (Redis), лишь не разделяется между процессами.
+
+    Returns:
+        str: Версия вида "<id снимка>-<версия каталога>"
+    """
+    return f"{latest_statistic_id()}-{get_catalog_version()}"
+
+
+def get_cached_statistics(build, version=None):
+    """
+    Возвращает ответ статистики из кэша, вычисляя его при промахе
+
+    Параллельные промахи объединяются: пересчет выполняет только запрос,
+    захвативший блокировку через cache.add, остальные ждут его результат
+    до LOCK_WAIT_SECONDS и только потом считают сами.
+
+    Args:
+        build: Функция без аргументов, возвращающая ответ для кэширования
+        version: Версия, уже прочитанная вызывающим кодом (например, для ETag)
+
+    Returns:
+        Результат build() (из кэша или вычисленный)
+    """
+    cache = _cache()
+    try:
+        if version is None:
+            version = get_statistics_version()
+        key = PAYLOAD_KEY.format(version=version)
+        cached = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Statistics cache unavailable, computing directly: {str(e)}")
+        return build()
+
+    # Значение обернуто в словарь, чтобы кэшировать и пустой ответ (None)
+    if cached is not None:
+        return cached['payload']
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            payload = build()
+            cache.set(key, {'payload': payload}, timeout=settings.STATISTICS_CACHE_TIMEOUT)
+            logger.debug(f"Statistics cache filled for {key}")
+            return payload
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached['payload']
+
+    logger.warning(f"Timed out waiting for statistics recompute of {key}, computing directly")
+    return build()
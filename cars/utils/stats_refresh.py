@@ -0,0 +1,117 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from cars.signals import catalog_changed
+
+
+logger = logging.getLogger(__name__)
+
+LAST_CHANGE_KEY = 'cars:statistics:refresh:last_change'
+FIRST_CHANGE_KEY = 'cars:statistics:refresh:first_change'
+SCHEDULED_KEY = 'cars:statistics:refresh:scheduled'
+# Бэкенды, данные которых видны только своему процессу
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _cache():
+    return caches[settings.STATISTICS_CACHE_ALIAS]
+
+
+def has_shared_cache():
+    """Общий ли для всех процессов кэш STATISTICS_CACHE_ALIAS"""
+    backend = settings.CACHES[settings.STATISTICS_CACHE_ALIAS]['BACKEND']
+    return backend not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def check_refresh_cache(app_configs=None, **kwargs):
+    """
+    Системная проверка: отложенному пересчету нужен общий кэш
+
+    Метки серии изменений и запланированной задачи хранятся в кэше. В
+    памяти процесса каждый процесс ведет свою серию: импорт в воркере
+    не откладывает пересчет, запланированный веб-процессом, и пересчеты
+    не схлопываются.
+    """
+    if settings.STATISTICS_REFRESH_ON_CHANGE and not has_shared_cache():
+        return [checks.Error(
+            "STATISTICS_REFRESH_ON_CHANGE requires a cache shared between processes",
+            hint="Set CACHE_REDIS_URL or disable STATISTICS_REFRESH_ON_CHANGE.",
+            id='cars.E001',
+        )]
+    return []
+
+
+def _send_catalog_changed(sender):
+    # Данные уже зафиксированы: ошибка обработчика не должна дойти до
+    # вызывающего кода, статистику догонит следующий плановый расчет
+    for receiver, response in catalog_changed.send_robust(sender=sender):
+        if isinstance(response, Exception):
+            logger.warning(f"catalog_changed handler {receiver.__name__} failed: {str(response)}")
+
+
+def notify_catalog_changed(sender=None):
+    """Отправляет catalog_changed после фиксации текущей транзакции"""
+    transaction.on_commit(lambda: _send_catalog_changed(sender))
+
+
+def schedule_statistics_refresh():
+    """
+    Планирует отложенный пересчет статистики после изменения каталога
+
+    Серия изменений (например, порции большого импорта) схлопывается в
+    один пересчет: он выполняется, когда изменений не было
+    STATISTICS_REFRESH_QUIET_SECONDS секунд, но не позже
+    STATISTICS_REFRESH_MAX_DELAY секунд после первого изменения серии.
+    """
+    if not settings.STATISTICS_REFRESH_ON_CHANGE:
+        return
+    if not has_shared_cache():
+        raise ImproperlyConfigured("STATISTICS_REFRESH_ON_CHANGE requires a cache shared between processes")
+
+    cache = _cache()
+    now = time.time()
+    cache.set(LAST_CHANGE_KEY, now, timeout=None)
+    cache.add(FIRST_CHANGE_KEY, now, timeout=None)
+
+    quiet = settings.STATISTICS_REFRESH_QUIET_SECONDS
+    # Ключ истекает сам, если запланированная задача потерялась
+    scheduled_timeout = settings.STATISTICS_REFRESH_MAX_DELAY + 2 * quiet
+    if cache.add(SCHEDULED_KEY, now, timeout=scheduled_timeout):
+        from cars_project.tasks import refresh_statistics
+
+        refresh_statistics.apply_async(countdown=quiet)
+        logger.info(f"Statistics refresh scheduled in {quiet} seconds")
+
+
+def refresh_delay(now=None):
+    """
+    Сколько секунд еще ждать до пересчета
+
+    Returns:
+        float: 0, если каталог не менялся QUIET секунд или серия изменений
+            длится дольше MAX_DELAY, иначе оставшееся время тишины
+    """
+    cache = _cache()
+    now = now or time.time()
+    values = cache.get_many([LAST_CHANGE_KEY, FIRST_CHANGE_KEY])
+    last_change = values.get(LAST_CHANGE_KEY)
+    first_change = values.get(FIRST_CHANGE_KEY)
+    if last_change is None:
+        return 0
+    if first_change is not None and now - first_change >= settings.STATISTICS_REFRESH_MAX_DELAY:
+        return 0
+    return max(last_change + settings.STATISTICS_REFRESH_QUIET_SECONDS - now, 0)
+
+
+def start_statistics_refresh():
+    """Закрывает серию изменений: следующее изменение запланирует новый пересчет"""
+    _cache().delete_many([FIRST_CHANGE_KEY, SCHEDULED_KEY])
@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = 'cars:task_lock'
+LOCK_POLL_INTERVAL = 0.1
+
+# Снятие блокировки только владельцем (по токену)
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisTaskLock:
+    """
+    Распределенная блокировка задач в Redis
+
+    Блокировка - ключ с токеном владельца и TTL (SET NX PX), поэтому
+    упавший воркер не держит ее дольше таймаута. Рядом хранятся флаг
+    отложенного повторного запуска и счетчики ожиданий/пропусков.
+    """
+
+    def __init__(self, url, prefix=REDIS_KEY_PREFIX):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self, name, token, timeout):
+        return bool(self.client.set(self._key(name), token, nx=True, px=int(timeout * 1000)))
+
+    def release(self, name, token):
+        return bool(self._release(keys=[self._key(name)], args=[token]))
+
+    def request_follow_up(self, name, full=False):
+        pipe = self.client.pipeline()
+        pipe.hset(self._key(name, 'pending'), 'requested', 1)
+        if full:
+            pipe.hset(self._key(name, 'pending'), 'full', 1)
+        pipe.execute()
+
+    def take_follow_up(self, name):
+        """Забирает флаг повторного запуска: None или {'full': bool}"""
+        pipe = self.client.pipeline()
+        pipe.hgetall(self._key(name, 'pending'))
+        pipe.delete(self._key(name, 'pending'))
+        pending, _ = pipe.execute()
+        if not pending:
+            return None
+        return {'full': b'full' in pending}
+
+    def incr_metric(self, name, metric, amount=1):
+        if isinstance(amount, float):
+            self.client.hincrbyfloat(self._key(name, 'metrics'), metric, amount)
+        else:
+            self.client.hincrby(self._key(name, 'metrics'), metric, amount)
+
+    def metrics(self, name):
+        return {
+            key.decode(): float(value) if b'.' in value else int(value)
+            for key, value in self.client.hgetall(self._key(name, 'metrics')).items()
+        }
+
+    def _key(self, name, suffix='lock'):
+        return f"{self.prefix}:{name}:{suffix}"
+
+
+class MemoryTaskLock:
+    """
+    Блокировка задач внутри процесса
+
+    Заменяет RedisTaskLock в тестах и при локальной разработке с
+    CELERY_TASK_ALWAYS_EAGER; между процессами не работает.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locks = {}
+        self._pending = {}
+        self._metrics = {}
+
+    def acquire(self, name, token, timeout):
+        with self._mutex:
+            current = self._locks.get(name)
+            if current is not None and current[1] > time.monotonic():
+                return False
+            self._locks[name] = (token, time.monotonic() + timeout)
+            return True
+
+    def release(self, name, token):
+        with self._mutex:
+            current = self._locks.get(name)
+            if current is None or current[0] != token:
+                return False
+            del self._locks[name]
+            # Как и ключ Redis с истекшим TTL, истекшая блокировка уже не удерживается
+            return current[1] > time.monotonic()
+
+    def request_follow_up(self, name, full=False):
+        with self._mutex:
+            pending = self._pending.setdefault(name, {'full': False})
+            pending['full'] = pending['full'] or full
+
+    def take_follow_up(self, name):
+        with self._mutex:
+            return self._pending.pop(name, None)
+
+    def incr_metric(self, name, metric, amount=1):
+        with self._mutex:
+            metrics = self._metrics.setdefault(name, {})
+            metrics[metric] = metrics.get(metric, 0) + amount
+
+    def metrics(self, name):
+        with self._mutex:
+            return dict(self._metrics.get(name, {}))
+
+
+_task_lock = None
+_task_lock_guard = threading.Lock()
+
+
+def get_task_lock():
+    """Блокировка задач из настроек TASK_LOCK_*"""
+    global _task_lock
+
+    with _task_lock_guard:
+        if _task_lock is None:
+            if settings.TASK_LOCK_BACKEND == 'memory':
+                _task_lock = MemoryTaskLock()
+            else:
+                _task_lock = RedisTaskLock(settings.TASK_LOCK_REDIS_URL)
+        return _task_lock
+
+
+def acquire_run(name, full=False, wait=None, timeout=None):
+    """
+    Захватывает блокировку запуска задачи или объединяет запуск с текущим
+
+    Если блокировка занята дольше wait секунд, запуск не выполняется, а
+    превращается в флаг повторного запуска: сколько бы запусков ни пришло
+    за время текущего, после него выполнится ровно один.
+
+    Args:
+        name: Имя блокировки
+        full: Запрошен полный пересчет (сохраняется во флаге повторного запуска)
+        wait: Сколько ждать освобождения, по умолчанию TASK_LOCK_WAIT
+        timeout: TTL блокировки, по умолчанию TASK_LOCK_TIMEOUT
+
+    Returns:
+        str или None: Токен владельца или None, если запуск объединен с текущим
+    """
+    lock = get_task_lock()
+    wait = settings.TASK_LOCK_WAIT if wait is None else wait
+    timeout = settings.TASK_LOCK_TIMEOUT if timeout is None else timeout
+    token = uuid.uuid4().hex
+
+    start_time = time.monotonic()
+    waited = False
+    while not lock.acquire(name, token, timeout):
+        waited = True
+        if time.monotonic() - start_time >= wait:
+            lock.request_follow_up(name, full)
+            # Владелец мог освободить блокировку раньше, чем увидел флаг
+            if lock.acquire(name, token, timeout):
+                # Этот запуск и есть повторный: флаг больше не нужен
+                lock.take_follow_up(name)
+                break
+            lock.incr_metric(name, 'skipped')
+            logger.info(f"Task {name} already running, run coalesced into a follow-up")
+            return None
+        time.sleep(LOCK_POLL_INTERVAL)
+
+    if waited:
+        lock.incr_metric(name, 'waits')
+        lock.incr_metric(name, 'wait_seconds', round(time.monotonic() - start_time, 3))
+    lock.incr_metric(name, 'runs')
+    return token
+
+
+def finish_run(name, token):
+    """
+    Освобождает блокировку запуска
+
+    Блокировка снимается до чтения флага: запуск, который не смог ее
+    захватить и поставил флаг позже, повторит захват сам.
+
+    Returns:
+        dict или None: Запрос повторного запуска ({'full': bool}) или None
+    """
+    lock = get_task_lock()
+    if not lock.release(name, token):
+        logger.warning(f"Task lock {name} expired before the run finished")
+    follow_up = lock.take_follow_up(name)
+    if follow_up is not None:
+        lock.incr_metric(name, 'follow_ups')
+    return follow_up
+
+
+def run_metrics(name):
+    """Счетчики блокировки: runs, waits, wait_seconds, skipped, follow_ups"""
+    return get_task_lock().metrics(name)
@@ -0,0 +1,167 @@
+import logging
+import zlib
+from xml.etree import ElementTree as ET
+
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from cars.utils.xml_stream import READ_CHUNK_SIZE, ModificationStreamParser
+
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b'\x1f\x8b'
+# Максимальный размер одного распакованного фрагмента (защита от gzip-бомб)
+DECOMPRESSED_CHUNK_SIZE = 256 * 1024
+
+
+class StreamDecoder:
+    """
+    Распаковывает gzip на лету
+
+    Формат определяется по сигнатуре первых байтов, несжатые данные
+    передаются как есть. Каждый распакованный фрагмент не больше
+    DECOMPRESSED_CHUNK_SIZE, поэтому память не зависит от степени сжатия.
+    """
+
+    def __init__(self, max_output=DECOMPRESSED_CHUNK_SIZE):
+        self.max_output = max_output
+        self.compressed = None
+        self._head = b''
+        self._decompressor = None
+
+    def decode(self, data):
+        """
+        Декодирует очередную порцию входных байтов
+
+        Yields:
+            bytes: Фрагменты несжатого XML
+        """
+        if self.compressed is None:
+            self._head += data
+            if len(self._head) < len(GZIP_MAGIC):
+                return
+            self.compressed = self._head.startswith(GZIP_MAGIC)
+            data, self._head = self._head, b''
+
+        if not self.compressed:
+            if data:
+                yield data
+            return
+
+        while data:
+            if self._decompressor is None:
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            output = self._decompressor.decompress(data, self.max_output)
+            if output:
+                yield output
+            data = self._decompressor.unconsumed_tail
+            # Поддержка gzip из нескольких членов (cat a.gz b.gz)
+            if self._decompressor.eof:
+                data = data or self._decompressor.unused_data
+                self._decompressor = None
+
+    def flush(self):
+        """Возвращает байты, оставшиеся после конца потока"""
+        if self.compressed is None and self._head:
+            yield self._head
+            self._head = b''
+        elif self._decompressor is not None:
+            output = self._decompressor.flush()
+            if output:
+                yield output
+
+
+class XMLUploadImporter:
+    """
+    Импорт XML по мере поступления байтов запроса
+
+    Связывает распаковку gzip, инкрементальный парсер <Modification> и
+    пакетный импортер; ни тело запроса, ни документ целиком не хранятся.
+    """
+
+    def __init__(self, importer, digest=False):
+        self.importer = importer
+        self.decoder = StreamDecoder()
+        self.parser = ModificationStreamParser(digest=digest)
+        self.bytes_received = 0
+
+    @property
+    def results(self):
+        return self.importer.results
+
+    def feed(self, data):
+        """Передает очередную порцию сырых (возможно сжатых) байтов"""
+        self.bytes_received += len(data)
+        for chunk in self.decoder.decode(data):
+            self._add(self.parser.feed(chunk))
+
+    def feed_stream(self, stream, chunk_size=READ_CHUNK_SIZE):
+        """Читает файловый объект блоками до конца"""
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            self.feed(data)
+
+    def close(self):
+        """
+        Завершает разбор и сохраняет последнюю порцию
+
+        Returns:
+            dict: Счетчики импорта
+        """
+        try:
+            for chunk in self.decoder.flush():
+                self._add(self.parser.feed(chunk))
+            self._add(self.parser.close())
+        finally:
+            self.importer.finish()
+        return self.results
+
+    def _add(self, records):
+        for record in records:
+            self.importer.add_record(record)
+
+
+class StreamingXMLUploadHandler(FileUploadHandler):
+    """
+    Обработчик загрузки, импортирующий XML прямо из multipart потока
+
+    Фрагменты файла не передаются следующим обработчикам, поэтому Django
+    не буферизует загрузку ни в памяти, ни во временном файле.
+    """
+
+    def __init__(self, upload_importer, request=None):
+        super().__init__(request)
+        self.upload_importer = upload_importer
+        self.files_received = 0
+        self.error = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.files_received += 1
+        if self.files_received > 1:
+            self.error = "Допускается загрузка только одного XML файла"
+            raise StopUpload(connection_reset=False)
+        logger.info(f"Streaming XML upload started: {self.file_name}")
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.upload_importer.feed(raw_data)
+        except (ET.ParseError, zlib.error) as e:
+            self._abort(e)
+        return None
+
+    def file_complete(self, file_size):
+        try:
+            self.upload_importer.close()
+        except (ET.ParseError, zlib.error) as e:
+            self._abort(e)
+        logger.info(f"Streaming XML upload {self.file_name} completed: {file_size} bytes")
+        return None
+
+    def _abort(self, error):
+        logger.error(f"XML upload {self.file_name} rejected: {str(error)}")
+        self.error = str(error)
+        self.upload_importer.importer.finish()
+        raise StopUpload(connection_reset=False)
@@ -0,0 +1,318 @@
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from cars.utils.bulk_import import CarBulkImporter
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = 'cars:write_behind'
+# Сколько хранится подтверждение записи
+ACK_TTL_SECONDS = 24 * 60 * 60
+# Сколько живет захват имени потребителя без продления (продлевается каждой порцией)
+CONSUMER_CLAIM_TTL = 60
+# Максимум подтверждений в памяти для очереди внутри процесса
+MAX_MEMORY_ACKS = 100000
+
+
+def new_entry(brand, model, body_type):
+    """Запись очереди для одного автомобиля"""
+    return {
+        'ack_id': uuid.uuid4().hex,
+        'brand': brand,
+        'model': model,
+        'body_type': body_type,
+        'enqueued_at': time.time()
+    }
+
+
+def ack_payload(entry, status):
+    """Подтверждение записи в формате ответа WriteAckView"""
+    return {
+        'status': status,
+        'brand': entry['brand'],
+        'model': entry['model'],
+        'body_type': entry['body_type'],
+        'updated_at': timezone.now().isoformat()
+    }
+
+
+class RedisWriteQueue:
+    """
+    Очередь отложенной записи в Redis
+
+    Записи хранятся в списке, подтверждения - в отдельных ключах с TTL,
+    поэтому web процессы и потребители (run_write_coalescer) могут
+    работать на разных машинах. Порция переносится из очереди в список
+    обработки потребителя (BLMOVE/LMOVE) и удаляется из него только после
+    фиксации в БД и записи подтверждений (ack_batch). Порцию, оставшуюся
+    после падения потребителя, он же обработает первой при перезапуске:
+    доставка "не менее одного раза", повтор дает статус exists.
+    """
+
+    def __init__(self, url, prefix=REDIS_KEY_PREFIX, consumer='default'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.consumer = consumer
+        self.queue_key = f"{prefix}:queue"
+        self.processing_key = f"{prefix}:processing:{consumer}"
+        self.claim_key = f"{prefix}:consumer:{consumer}"
+        self.ack_prefix = f"{prefix}:ack"
+        self._claim_token = None
+
+    def claim(self):
+        """
+        Захватывает имя потребителя
+
+        Два процесса с одним именем делили бы список обработки и
+        повторно обрабатывали порции друг друга.
+
+        Returns:
+            bool: False, если потребитель с этим именем уже работает
+        """
+        token = uuid.uuid4().hex
+        if not self.client.set(self.claim_key, token, nx=True, ex=CONSUMER_CLAIM_TTL):
+            return False
+        self._claim_token = token
+        return True
+
+    def release(self):
+        """Освобождает имя потребителя, если оно еще принадлежит этому процессу"""
+        if self._claim_token is not None and self.client.get(self.claim_key) == self._claim_token.encode():
+            self.client.delete(self.claim_key)
+        self._claim_token = None
+
+    def enqueue(self, entry):
+        pipe = self.client.pipeline()
+        pipe.set(self._ack_key(entry['ack_id']), json.dumps(ack_payload(entry, 'queued')),
+                 ex=ACK_TTL_SECONDS)
+        pipe.rpush(self.queue_key, json.dumps(entry))
+        pipe.execute()
+
+    def pop_batch(self, max_size, max_wait, block_timeout=1.0):
+        """
+        Переносит порцию записей из очереди в список обработки
+
+        Если в списке обработки остались записи неподтвержденной порции,
+        возвращает их. Иначе ждет первую запись не дольше block_timeout,
+        затем добирает порцию до max_size, но не дольше max_wait секунд.
+
+        Returns:
+            list: Записи очереди
+        """
+        if self._claim_token is not None:
+            self.client.set(self.claim_key, self._claim_token, ex=CONSUMER_CLAIM_TTL)
+
+        pending = self.client.lrange(self.processing_key, 0, -1)
+        if pending:
+            logger.warning(
+                f"Write-behind consumer {self.consumer}: redelivering {len(pending)} unacknowledged entries"
+            )
+            return [json.loads(item) for item in pending]
+
+        first = self.client.blmove(self.queue_key, self.processing_key, block_timeout, 'LEFT', 'RIGHT')
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_size:
+            # Один запрос на весь остаток порции
+            pipe = self.client.pipeline(transaction=False)
+            for _ in range(max_size - len(batch)):
+                pipe.lmove(self.queue_key, self.processing_key, 'LEFT', 'RIGHT')
+            items = [item for item in pipe.execute() if item is not None]
+            if items:
+                batch.extend(items)
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            item = self.client.blmove(self.queue_key, self.processing_key, remaining, 'LEFT', 'RIGHT')
+            if item is None:
+                break
+            batch.append(item)
+
+        return [json.loads(item) for item in batch]
+
+    def ack_batch(self):
+        """Удаляет обработанную порцию из списка обработки"""
+        self.client.delete(self.processing_key)
+
+    def set_acks(self, acks):
+        pipe = self.client.pipeline()
+        for ack_id, payload in acks.items():
+            pipe.set(self._ack_key(ack_id), json.dumps(payload), ex=ACK_TTL_SECONDS)
+        pipe.execute()
+
+    def get_ack(self, ack_id):
+        payload = self.client.get(self._ack_key(ack_id))
+        return json.loads(payload) if payload else None
+
+    def size(self):
+        return self.client.llen(self.queue_key)
+
+    def _ack_key(self, ack_id):
+        return f"{self.ack_prefix}:{ack_id}"
+
+
+class MemoryWriteQueue:
+    """
+    Очередь отложенной записи внутри процесса
+
+    Подходит для одного процесса (runserver, один worker gunicorn):
+    очередь сбрасывается фоновым потоком того же процесса, а записи,
+    не успевшие попасть в БД, теряются при его остановке.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._acks = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def enqueue(self, entry):
+        self.set_acks({entry['ack_id']: ack_payload(entry, 'queued')})
+        self._queue.put(entry)
+
+    def pop_batch(self, max_size, max_wait, block_timeout=1.0):
+        try:
+            batch = [self._queue.get(timeout=block_timeout)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def ack_batch(self):
+        # Порция уже снята с очереди, при остановке процесса она теряется
+        pass
+
+    def set_acks(self, acks):
+        with self._lock:
+            self._acks.update(acks)
+            while len(self._acks) > MAX_MEMORY_ACKS:
+                self._acks.popitem(last=False)
+
+    def get_ack(self, ack_id):
+        with self._lock:
+            return self._acks.get(ack_id)
+
+    def size(self):
+        return self._queue.qsize()
+
+    def start_worker(self, coalescer):
+        """Запускает фоновый поток сброса очереди, если он еще не запущен"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=coalescer.run_forever, name='cars-write-coalescer', daemon=True
+                )
+                self._worker.start()
+
+
+class WriteCoalescer:
+    """
+    Сброс очереди отложенной записи порциями
+
+    Каждая порция ограничена по размеру (batch_size) и по времени
+    ожидания (max_wait) и сохраняется одной транзакцией через
+    CarBulkImporter. Если порция не сохранилась, записи сохраняются по
+    одной, и ошибка одной записи (например, слишком длинное имя)
+    отмечает статусом error только ее. Исход каждой записи сохраняется
+    как подтверждение, после чего порция подтверждается в очереди.
+    Ошибка соединения с БД прерывает порцию без подтверждения: очередь
+    Redis доставит ее повторно.
+    """
+
+    def __init__(self, write_queue, batch_size=None, max_wait=None):
+        self.queue = write_queue
+        self.batch_size = batch_size or settings.CARS_WRITE_BEHIND_BATCH_SIZE
+        self.max_wait = settings.CARS_WRITE_BEHIND_MAX_WAIT if max_wait is None else max_wait
+        self.importer = CarBulkImporter(chunk_size=self.batch_size)
+
+    def run_once(self, block_timeout=1.0):
+        """
+        Сохраняет одну порцию
+
+        Returns:
+            int: Количество обработанных записей
+        """
+        entries = self.queue.pop_batch(self.batch_size, self.max_wait, block_timeout)
+        if not entries:
+            return 0
+
+        close_old_connections()
+        # OperationalError/InterfaceError (БД недоступна) пробрасывается
+        # импортером, порция остается в списке обработки
+        outcomes = self.importer.import_rows(
+            [(entry['brand'], entry['model'], entry['body_type']) for entry in entries]
+        )
+
+        acks = {}
+        for entry, created in zip(entries, outcomes):
+            if created is None:
+                status = 'error'
+            else:
+                status = 'created' if created else 'exists'
+            acks[entry['ack_id']] = ack_payload(entry, status)
+        self.queue.set_acks(acks)
+        self.queue.ack_batch()
+
+        lag = time.time() - min(entry['enqueued_at'] for entry in entries)
+        logger.info(f"Write-behind batch of {len(entries)} cars flushed, max lag {lag:.3f}s")
+        return len(entries)
+
+    def run_forever(self, stop_event=None):
+        """Сбрасывает очередь до установки stop_event"""
+        while stop_event is None or not stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {str(e)}", exc_info=True)
+                time.sleep(1)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    """
+    Очередь отложенной записи из настроек CARS_WRITE_BEHIND_*
+
+    Для очереди внутри процесса при первом обращении запускается фоновый
+    поток сброса; очередь Redis сбрасывает команда run_write_coalescer.
+    """
+    global _write_queue
+
+    with _write_queue_lock:
+        if _write_queue is None:
+            if settings.CARS_WRITE_BEHIND_BACKEND == 'memory':
+                _write_queue = MemoryWriteQueue()
+                _write_queue.start_worker(WriteCoalescer(_write_queue))
+            else:
+                _write_queue = RedisWriteQueue(
+                    settings.CARS_WRITE_BEHIND_REDIS_URL, consumer=settings.CARS_WRITE_BEHIND_CONSUMER
+                )
+        return _write_queue
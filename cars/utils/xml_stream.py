@@ -0,0 +1,270 @@
+import hashlib
+import logging
+import os
+import re
+from xml.etree import ElementTree as ET
+
+from cars.models import normalize_name
+
+
+logger = logging.getLogger(__name__)
+
+MODIFICATION_TAG = 'Modification'
+KEY_TAGS = ('Make', 'Model', 'BodyType')
+READ_CHUNK_SIZE = 64 * 1024
+
+# Границы блоков <Modification> для нарезки файла на шарды по байтам
+OPEN_TAG_PATTERN = re.compile(rb'<Modification[\s>/]')
+CLOSE_TAG = b'</Modification>'
+DECLARATION_PATTERN = re.compile(rb'<\?xml[^>]*encoding=["\']([\w.-]+)["\']')
+
+
+def extract_modification(elem, digest=False):
+    """
+    Возвращает кортеж (make, model, body_type) элемента <Modification>
+
+    Args:
+        elem: Элемент <Modification>
+        digest: Добавить четвертым элементом SHA-1 остальных дочерних
+            элементов. Тройка бренд/модель/кузов уже служит ключом отпечатка,
+            поэтому в хэш не входит; значения нормализуются так же, как ключ
+    """
+    record = tuple(elem.findtext(tag, '').strip() for tag in KEY_TAGS)
+    if digest:
+        payload = sorted(
+            f"{child.tag}\x1f{normalize_name(''.join(child.itertext()))}"
+            for child in elem if child.tag not in KEY_TAGS
+        )
+        record += (hashlib.sha1('\x1e'.join(payload).encode('utf-8')).hexdigest(),)
+    return record
+
+
+class ModificationStreamParser:
+    """
+    Инкрементальный парсер элементов <Modification>
+
+    Байты подаются через feed() по мере поступления. Каждый элемент
+    <Modification> возвращается сразу после закрывающего тега и удаляется
+    из дерева, как и все прочие завершенные элементы вне <Modification>,
+    поэтому потребление памяти не зависит от размера документа.
+    """
+
+    def __init__(self, tag=MODIFICATION_TAG, digest=False):
+        self.tag = tag
+        self.digest = digest
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._stack = []
+        self._inside = 0
+
+    def feed(self, data):
+        """
+        Передает очередную порцию байтов парсеру
+
+        Args:
+            data: Фрагмент XML документа
+
+        Returns:
+            list: Кортежи (make, model, body_type) завершенных модификаций
+        """
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self):
+        """
+        Завершает разбор документа
+
+        Returns:
+            list: Модификации, оставшиеся в буфере парсера
+        """
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self):
+        records = []
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                self._stack.append(elem)
+                if elem.tag == self.tag:
+                    self._inside += 1
+                continue
+
+            self._stack.pop()
+            if elem.tag == self.tag:
+                self._inside -= 1
+                if not self._inside:
+                    records.append(extract_modification(elem, self.digest))
+
+            # Дочерние элементы <Modification> нужны до его закрытия,
+            # все остальное удаляем сразу, чтобы дерево не росло
+            if not self._inside and self._stack:
+                self._stack[-1].remove(elem)
+        return records
+
+
+def iter_modifications(source, chunk_size=READ_CHUNK_SIZE, progress=None, digest=False):
+    """
+    Потоково читает модификации из XML файла
+
+    Args:
+        source: Путь к файлу или бинарный файловый объект
+        chunk_size: Размер блока чтения в байтах
+        progress: Необязательный callback, получает число прочитанных байтов
+        digest: Добавлять к записям отпечаток содержимого (см. extract_modification)
+
+    Yields:
+        tuple: (make, model, body_type) для каждого элемента <Modification>
+
+    Raises:
+        xml.etree.ElementTree.ParseError: При некорректном XML
+    """
+    opened = isinstance(source, (str, os.PathLike))
+    stream = open(source, 'rb') if opened else source
+
+    try:
+        parser = ModificationStreamParser(digest=digest)
+        bytes_read = 0
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            bytes_read += len(data)
+            yield from parser.feed(data)
+            if progress:
+                progress(bytes_read)
+        yield from parser.close()
+    finally:
+        if opened:
+            stream.close()
+
+
+def find_shard_ranges(path, shards):
+    """
+    Делит XML файл на диапазоны байтов по границам элементов <Modification>
+
+    Args:
+        path: Путь к XML файлу
+        shards: Желаемое количество шардов
+
+    Returns:
+        list: Кортежи (start, end) смещений; каждый диапазон начинается
+            с открывающего тега <Modification>
+    """
+    size = os.path.getsize(path)
+    starts = []
+
+    with open(path, 'rb') as stream:
+        for index in range(max(shards, 1)):
+            offset = _next_tag_offset(stream, size * index // shards)
+            if offset is None:
+                break
+            if not starts or offset > starts[-1]:
+                starts.append(offset)
+
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def iter_modifications_in_range(path, start, end, chunk_size=READ_CHUNK_SIZE, progress=None,
+                                digest=False):
+    """
+    Читает модификации, открывающий тег которых лежит в диапазоне [start, end)
+
+    Разметка между элементами (обертки, закрывающие теги родителей)
+    пропускается, каждый блок <Modification> разбирается отдельно,
+    поэтому диапазон не обязан быть корректным XML документом.
+
+    Args:
+        path: Путь к XML файлу
+        start: Смещение начала диапазона
+        end: Смещение конца диапазона
+        chunk_size: Размер блока чтения в байтах
+        progress: Необязательный callback, получает число прочитанных байтов диапазона
+        digest: Добавлять к записям отпечаток содержимого (см. extract_modification)
+
+    Yields:
+        tuple: (make, model, body_type) для каждого элемента <Modification>
+    """
+    declaration = _xml_declaration(path)
+    tag_length = len(b'<Modification ')
+
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        offset = start  # смещение buffer[0] в файле
+        buffer = b''
+        pos = 0
+        eof = False
+
+        while True:
+            match = OPEN_TAG_PATTERN.search(buffer, pos)
+            if match:
+                if offset + match.start() >= end:
+                    break
+                block_end = _block_end(buffer, match)
+                if block_end is not None:
+                    elem = ET.fromstring(declaration + buffer[match.start():block_end])
+                    yield extract_modification(elem, digest)
+                    pos = block_end
+                    continue
+            elif offset + len(buffer) - tag_length >= end:
+                break
+
+            if eof:
+                if match:
+                    raise ET.ParseError(f"Unclosed <{MODIFICATION_TAG}> at offset {offset + match.start()}")
+                break
+
+            # Отбрасываем обработанную часть буфера
+            keep_from = match.start() if match else max(pos, len(buffer) - tag_length)
+            offset += keep_from
+            buffer = buffer[keep_from:]
+            pos = 0
+
+            data = stream.read(chunk_size)
+            if data:
+                buffer += data
+                if progress:
+                    progress(min(offset + len(buffer), end) - start)
+            else:
+                eof = True
+
+
+def _block_end(buffer, match):
+    """Конец блока <Modification> в буфере или None, если блок не дочитан"""
+    tag_close = buffer.find(b'>', match.start())
+    if tag_close == -1:
+        return None
+    if buffer[tag_close - 1:tag_close] == b'/':
+        return tag_close + 1
+
+    close = buffer.find(CLOSE_TAG, tag_close)
+    if close == -1:
+        return None
+    return close + len(CLOSE_TAG)
+
+
+def _next_tag_offset(stream, offset):
+    """Смещение первого открывающего тега <Modification> не раньше offset"""
+    overlap = len(b'<Modification ')
+    stream.seek(offset)
+    buffer = b''
+
+    while True:
+        data = stream.read(READ_CHUNK_SIZE)
+        if not data:
+            return None
+        buffer += data
+        match = OPEN_TAG_PATTERN.search(buffer)
+        if match:
+            return offset + match.start()
+        keep = min(overlap, len(buffer))
+        offset += len(buffer) - keep
+        buffer = buffer[len(buffer) - keep:]
+
+
+def _xml_declaration(path):
+    """XML декларация с кодировкой файла для разбора отдельных блоков"""
+    with open(path, 'rb') as stream:
+        head = stream.read(256)
+    match = DECLARATION_PATTERN.match(head.lstrip(b'\xef\xbb\xbf \t\r\n'))
+    if match and match.group(1).lower() not in (b'utf-8', b'utf8'):
+        return b'<?xml version="1.0" encoding="' + match.group(1) + b'"?>'
+    return b''
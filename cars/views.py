@@ -1,17 +1,30 @@
 import logging
 import os
-import re
-from xml.etree.ElementTree import parse
+import zlib
 from xml.etree import ElementTree as ET
 
-from django.db import close_old_connections, transaction
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.urls import reverse
 from rest_framework import status
 from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 
-from .models import BodyType, Brand, Car, CarModel, Statistic
-from .utils.response_utils import create_json_response
+from cars_project.tasks import import_cars_from_xml
+
+from .models import BodyType, Brand, Car, CarModel, ImportJob, Statistic, normalize_name
+from .utils.audit_summary import audit_summary
+from .utils.bulk_import import CLEAN_PATTERN, CarBulkImporter, clean_string, serialize_results
+from .utils.counters import counter_batch
+from .utils.delta_import import DeltaCarImporter
+from .utils.json_import import JSONCarImporter
+from .utils.response_utils import conditional_json_response, create_json_response, render_json_bodies
+from .utils.statistics import CURRENT_SECTIONS, compute_statistics
+from .utils.statistics_history import BUCKETS, DEFAULT_LIMIT, MAX_LIMIT, parse_moment, statistics_history
+from .utils.stats_cache import get_cached_statistics, get_statistics_version
+from .utils.upload_import import StreamingXMLUploadHandler, XMLUploadImporter
+from .utils.write_behind import get_write_queue, new_entry
 
 
 logger = logging.getLogger(__name__)
@@ -33,17 +46,37 @@ class AddCarsFromXML(APIView):
 
     # Константы для путей и настроек
     XML_RELATIVE_PATH = os.path.join('cars_project', 'data', 'Autocatalog.xml')
-    CLEAN_PATTERN = re.compile(r'[^\w\s-]', flags=re.UNICODE)
+    MAX_SHARDS = 64
+    PARALLEL_MODES = ('celery', 'process')
+    IMPORT_MODES = ('full', 'delta')
+    IMPORT_ENGINES = ('orm', 'copy')
+    XML_UPLOAD_CONTENT_TYPES = (
+        'application/xml', 'text/xml', 'application/gzip', 'application/x-gzip'
+    )
+    NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+    MAX_JSON_BATCH_ITEMS = 10000
+    CLEAN_PATTERN = CLEAN_PATTERN
 
     def post(self, request):
         """Handle POST request to import cars from XML or JSON"""
         close_old_connections()
-        logger.info(f"Received request with data: {request.data}")
+        # Тело не читаем заранее: загрузки XML разбираются потоково
+        logger.info(
+            f"Received import request: content_type={request.content_type}, "
+            f"length={request.META.get('CONTENT_LENGTH')}"
+        )
 
         try:
-            if request.content_type == 'application/json':
-                return self.handle_json_import(request.data)
-            return self.handle_xml_import()
+            media_type = request.content_type.split(';')[0].strip().lower()
+            if media_type == 'application/json':
+                if isinstance(request.data, list):
+                    return self.handle_json_batch_import(request.data)
+                return self.handle_json_import(request.data, request)
+            if media_type in self.NDJSON_CONTENT_TYPES:
+                return self.handle_ndjson_import(request)
+            if media_type == 'multipart/form-data' or media_type in self.XML_UPLOAD_CONTENT_TYPES:
+                return self.handle_upload_import(request, media_type)
+            return self.handle_xml_import(request)
         except Exception as e:
             logger.error(f"Unexpected error in post handler: {str(e)}", exc_info=True)
             return create_json_response(
@@ -51,87 +84,152 @@ class AddCarsFromXML(APIView):
                 message="Внутренняя ошибка сервера"
             )
 
-    def handle_xml_import(self):
-        """Process XML file import"""
-        logger.info("Starting XML import process")
+    def handle_xml_import(self, request):
+        """Queue XML file import as a background Celery job"""
+        logger.info("Queueing XML import job")
 
-        try:
-            # Получаем абсолютный путь к XML файлу
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            xml_path = os.path.abspath(os.path.join(base_dir, self.XML_RELATIVE_PATH))
+        # Получаем абсолютный путь к XML файлу
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        xml_path = os.path.abspath(os.path.join(base_dir, self.XML_RELATIVE_PATH))
 
-            # Проверяем существование файла перед парсингом
-            if not os.path.exists(xml_path):
-                logger.error(f"XML file not found at: {xml_path}")
-                return create_json_response(
-                    status=status.HTTP_400_BAD_REQUEST,
-                    message="XML файл не найден",
-                    data={"expected_path": xml_path}
-                )
+        # Проверяем существование файла до постановки задачи
+        if not os.path.exists(xml_path):
+            logger.error(f"XML file not found at: {xml_path}")
+            return create_json_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message="XML файл не найден",
+                data={"expected_path": xml_path}
+            )
 
-            # Парсинг XML
-            tree = parse(xml_path)
-            root = tree.getroot()
+        try:
+            options = self._import_options(request.query_params)
+        except ValueError as e:
+            return create_json_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message=f"Некорректные параметры импорта: {str(e)}"
+            )
 
-            results = {
-                'cars_processed': 0,
-                'errors': 0,
-                'processed_brands': set(),
-                'skipped': 0,
-                'invalid_entries': 0
-            }
+        job = ImportJob.objects.create(
+            source=xml_path,
+            options=options,
+            total_bytes=os.path.getsize(xml_path)
+        )
 
-            # Обработка модификаций
-            for modification in root.findall('.//Modification'):
-                try:
-                    brand = modification.findtext('Make', '').strip()
-                    model = modification.findtext('Model', '').strip()
-                    body = modification.findtext('BodyType', '').strip()
-
-                    # Пропускаем записи с пустыми полями
-                    if not all((brand, model, body)):
-                        results['invalid_entries'] += 1
-                        continue
-
-                    # Очистка данных
-                    clean_data = {
-                        'brand': self._clean_string(brand),
-                        'model': self._clean_string(model),
-                        'body_type': self._clean_string(body)
-                    }
-
-                    # Сохранение в БД
-                    if self.save_car_data(**clean_data):
-                        results['cars_processed'] += 1
-                        results['processed_brands'].add(clean_data['brand'])
-                    else:
-                        results['skipped'] += 1
-
-                except Exception as e:
-                    results['errors'] += 1
-                    logger.error(f"Error processing modification: {str(e)}", exc_info=True)
-
-            logger.info(f"XML import completed. Stats: {results}")
+        try:
+            import_cars_from_xml.delay(job.id)
+        except Exception as e:
+            logger.error(f"Failed to enqueue import job {job.id}: {str(e)}", exc_info=True)
+            job.status = 'failed'
+            job.error_message = str(e)
+            job.save(update_fields=['status', 'error_message', 'updated_at'])
             return create_json_response(
-                status=status.HTTP_200_OK,
-                data=results,
-                message=f"Обработано {results['cars_processed']} автомобилей"
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                message="Очередь задач недоступна",
+                data={"job_id": job.id}
             )
 
-        except ET.ParseError as e:
-            logger.error(f"XML parsing error: {str(e)}")
+        logger.info(f"XML import job {job.id} queued for {xml_path}")
+        return create_json_response(
+            status=status.HTTP_202_ACCEPTED,
+            message=f"Импорт поставлен в очередь, задача #{job.id}",
+            data={
+                "job_id": job.id,
+                "status_url": request.build_absolute_uri(reverse('import_job', args=[job.id]))
+            }
+        )
+
+    def handle_upload_import(self, request, media_type):
+        """Import XML (optionally gzip-compressed) streamed from the request body"""
+        logger.info(f"Starting streamed XML upload import ({media_type})")
+
+        try:
+            options = self._import_options(request.query_params)
+        except ValueError as e:
             return create_json_response(
                 status=status.HTTP_400_BAD_REQUEST,
-                message="Ошибка разбора XML файла"
+                message=f"Некорректные параметры импорта: {str(e)}"
             )
-        except Exception as e:
-            logger.error(f"Unexpected error in XML import: {str(e)}", exc_info=True)
+
+        delta = options.get('delta', False)
+        importer = DeltaCarImporter() if delta else CarBulkImporter()
+        upload = XMLUploadImporter(importer, digest=delta)
+        error = None
+
+        with audit_summary(f'upload:{media_type}') as summary:
+            summary.results = upload.results
+            if media_type == 'multipart/form-data':
+                # Файл разбирается внутри обработчика загрузки по мере чтения multipart
+                handler = StreamingXMLUploadHandler(upload, request._request)
+                request._request.upload_handlers = [handler]
+                request.FILES  # noqa: B018 - запускает потоковый разбор тела
+                error = handler.error
+                if not error and not handler.files_received:
+                    return create_json_response(
+                        status=status.HTTP_400_BAD_REQUEST,
+                        message="XML файл не передан"
+                    )
+            else:
+                try:
+                    upload.feed_stream(request.stream)
+                    upload.close()
+                except (ET.ParseError, zlib.error) as e:
+                    importer.finish()
+                    error = str(e)
+            summary.error = error
+
+        results = serialize_results(upload.results)
+        if error:
+            logger.error(f"XML upload parsing error: {error}. Partial stats: {results}")
             return create_json_response(
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                message="Внутренняя ошибка при обработке XML"
+                status=status.HTTP_400_BAD_REQUEST,
+                message="Ошибка разбора XML файла",
+                data=results
             )
 
-    def handle_json_import(self, data):
+        logger.info(f"XML upload import completed ({upload.bytes_received} bytes). Stats: {results}")
+        return create_json_response(
+            status=status.HTTP_200_OK,
+            data=results,
+            message=f"Обработано {results['cars_processed']} автомобилей"
+        )
+
+    def _import_options(self, params):
+        """Parse import job options from query parameters"""
+        options = {}
+
+        # Дельта-импорт: ?mode=delta пропускает неизменившийся файл и записи
+        mode = params.get('mode', 'full')
+        if mode not in self.IMPORT_MODES:
+            raise ValueError(f"mode должен быть одним из: {', '.join(self.IMPORT_MODES)}")
+        if mode == 'delta':
+            options['delta'] = True
+
+        # Параллельный импорт: ?shards=8&parallel=celery|process
+        if params.get('shards'):
+            shards = int(params['shards'])
+            if not 1 <= shards <= self.MAX_SHARDS:
+                raise ValueError(f"shards должен быть от 1 до {self.MAX_SHARDS}")
+            options['shards'] = shards
+
+        if params.get('parallel'):
+            if params['parallel'] not in self.PARALLEL_MODES:
+                raise ValueError(f"parallel должен быть одним из: {', '.join(self.PARALLEL_MODES)}")
+            options['parallel'] = params['parallel']
+
+        # Полная перезагрузка через COPY: ?engine=copy (только PostgreSQL)
+        engine = params.get('engine', 'orm')
+        if engine not in self.IMPORT_ENGINES:
+            raise ValueError(f"engine должен быть одним из: {', '.join(self.IMPORT_ENGINES)}")
+        if engine == 'copy':
+            if connection.vendor != 'postgresql':
+                raise ValueError("engine=copy доступен только на PostgreSQL")
+            if options.get('delta') or options.get('shards', 1) > 1:
+                raise ValueError("engine=copy не совместим с mode=delta и shards")
+            options['engine'] = engine
+
+        return options
+
+    def handle_json_import(self, data, request=None):
         """Process JSON data import"""
         logger.info("Processing JSON data import")
 
@@ -157,6 +255,11 @@ class AddCarsFromXML(APIView):
                     message="Все поля должны содержать непустые значения"
                 )
 
+            if settings.CARS_WRITE_BEHIND:
+                response = self.queue_car_data(clean_data, request)
+                if response is not None:
+                    return response
+
             if self.save_car_data(**clean_data):
                 return create_json_response(
                     status=status.HTTP_201_CREATED,
@@ -176,41 +279,121 @@ class AddCarsFromXML(APIView):
                 message="Ошибка при обработке данных"
             )
 
+    def queue_car_data(self, clean_data, request=None):
+        """Queue car for write-behind batch insert, None if the queue is unavailable"""
+        entry = new_entry(**clean_data)
+        try:
+            get_write_queue().enqueue(entry)
+        except Exception as e:
+            # Без очереди сохраняем синхронно, как без отложенной записи
+            logger.warning(f"Write-behind queue unavailable, saving synchronously: {str(e)}")
+            return None
+
+        status_url = reverse('write_ack', args=[entry['ack_id']])
+        if request is not None:
+            status_url = request.build_absolute_uri(status_url)
+        return create_json_response(
+            status=status.HTTP_202_ACCEPTED,
+            message=f"Автомобиль {clean_data['brand']} {clean_data['model']} поставлен в очередь на запись",
+            data={**clean_data, 'ack_id': entry['ack_id'], 'status_url': status_url}
+        )
+
+    def handle_json_batch_import(self, items):
+        """Process a JSON array of cars in batches with per-item status"""
+        logger.info(f"Processing JSON batch import of {len(items)} items")
+
+        if not items:
+            return create_json_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message="Список автомобилей пуст"
+            )
+        if len(items) > self.MAX_JSON_BATCH_ITEMS:
+            return create_json_response(
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                message=(
+                    f"Не более {self.MAX_JSON_BATCH_ITEMS} автомобилей в одном запросе, "
+                    f"для больших объемов используйте NDJSON"
+                )
+            )
+
+        importer = JSONCarImporter()
+        with audit_summary('json') as summary:
+            summary.results = importer.results
+            importer.import_items(items)
+        return self._batch_response(importer)
+
+    def handle_ndjson_import(self, request):
+        """Process NDJSON cars streamed from the request body"""
+        logger.info("Processing NDJSON import")
+
+        importer = JSONCarImporter()
+        # Тело читается построчно, без загрузки всего запроса в память
+        stream = request.stream
+        # Ошибки отдельных строк (некорректный JSON, длинная строка) не прерывают импорт
+        with audit_summary('ndjson') as summary:
+            summary.results = importer.results
+            if stream is not None:
+                importer.import_ndjson(stream)
+
+        if not importer.items_total:
+            return create_json_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message="Список автомобилей пуст"
+            )
+        return self._batch_response(importer)
+
+    def _batch_response(self, importer):
+        results = serialize_results(importer.results)
+        logger.info(f"JSON batch import completed. Stats: {results}")
+        return create_json_response(
+            status=status.HTTP_200_OK,
+            data={**results, 'items': importer.items, 'items_truncated': importer.items_truncated},
+            message=f"Обработано {results['cars_processed']} автомобилей"
+        )
+
     def _clean_string(self, value):
         """Clean and normalize string data"""
-        return self.CLEAN_PATTERN.sub('', value.strip()) if value else ''
+        return clean_string(value)
 
     @transaction.atomic
     def save_car_data(self, brand, model, body_type):
         """Save car data to database (atomic transaction)"""
         try:
-            if Car.objects.filter(
-                    model__brand__name__iexact=brand,
-                    model__name__iexact=model,
-                    body_type__name__iexact=body_type
-            ).exists():
-                logger.debug(f"Car exists: {brand} {model} {body_type}")
-                return False
-
-            brand_obj = Brand.objects.get_or_create(
-                name__iexact=brand,
-                defaults={'name': brand}
-            )[0]
-
-            model_obj = CarModel.objects.get_or_create(
-                brand=brand_obj,
-                name__iexact=model,
-                defaults={'name': model}
-            )[0]
-
-            body_type_obj = BodyType.objects.get_or_create(
-                name__iexact=body_type,
-                defaults={'name': body_type}
-            )[0]
-
-            Car.objects.create(model=model_obj, body_type=body_type_obj)
-            logger.info(f"Created car: {brand} {model} {body_type}")
-            return True
+            # Приращения счетчиков применяются одним пакетом в конце транзакции,
+            # в том же порядке блокировок, что и у пакетных импортов
+            with counter_batch():
+                # Поиск по нормализованным ключам вместо iexact попадает в индексы
+                brand_key = normalize_name(brand)
+                model_key = normalize_name(model)
+                body_type_key = normalize_name(body_type)
+
+                if Car.objects.filter(
+                        model__brand__name_key=brand_key,
+                        model__name_key=model_key,
+                        body_type__name_key=body_type_key
+                ).exists():
+                    logger.debug(f"Car exists: {brand} {model} {body_type}")
+                    return False
+
+                brand_obj = Brand.objects.get_or_create(
+                    name_key=brand_key,
+                    defaults={'name': brand}
+                )[0]
+
+                model_obj = CarModel.objects.get_or_create(
+                    brand=brand_obj,
+                    name_key=model_key,
+                    defaults={'name': model}
+                )[0]
+
+                body_type_obj = BodyType.objects.get_or_create(
+                    name_key=body_type_key,
+                    defaults={'name': body_type}
+                )[0]
+
+                Car.objects.create(model=model_obj, body_type=body_type_obj)
+                logger.info(f"Created car: {brand} {model} {body_type}")
+                return True
 
         except Exception as e:
             logger.error(f"DB save error: {str(e)}", exc_info=True)
@@ -219,30 +402,60 @@ class AddCarsFromXML(APIView):
 class StatisticsView(APIView):
     """API endpoint for retrieving statistics"""
 
-    def get(self, request):
-        try:
-            stats = {
-                'total_brands': Brand.objects.count(),
-                'total_models': CarModel.objects.count(),
-                'total_cars': Car.objects.count(),
-                'body_type_distribution': {
-                    bt.name: Car.objects.filter(body_type=bt).count()
-                    for bt in BodyType.objects.all()
-                }
-            }
-
-            latest_stat = Statistic.objects.latest('date_calculated')
-            return create_json_response({
-                'statistics': latest_stat.json_statistics,
-                'date_calculated': latest_stat.date_calculated,
-                'current_stats': stats
-            })
+    @staticmethod
+    def build_statistics():
+        """Build statistics payload, None if no snapshot was calculated yet"""
+        latest_stat = Statistic.objects.select_related('base').order_by('-date_calculated', '-id').first()
+        if latest_stat is None:
+            return None
+
+        return {
+            'statistics': latest_stat.statistics,
+            'date_calculated': latest_stat.date_calculated,
+            # Текущие счетчики считаются фиксированным числом запросов
+            'current_stats': compute_statistics(CURRENT_SECTIONS)
+        }
 
-        except Statistic.DoesNotExist:
-            return create_json_response(
+    @classmethod
+    def render_statistics(cls):
+        """Build statistics payload and its serialized, precompressed bodies"""
+        payload = cls.build_statistics()
+        if payload is None:
+            rendered = render_json_bodies(
                 status=status.HTTP_404_NOT_FOUND,
                 message="Статистика недоступна"
             )
+        else:
+            rendered = render_json_bodies(payload)
+        return {**rendered, 'payload': payload}
+
+    def get(self, request):
+        try:
+            # Ответ кэшируется под версией из БД (последний снимок и версия каталога);
+            # та же версия служит ETag, повторный опрос получает 304 после двух
+            # индексных запросов, без пересчета и сериализации
+            try:
+                version = get_statistics_version()
+            except Exception as e:
+                logger.warning(f"Statistics version unavailable: {str(e)}")
+                version = None
+
+            if version is None or request.accepted_renderer.format != 'json':
+                # Browsable API и работа без кэша - обычный ответ DRF
+                payload = get_cached_statistics(self.render_statistics, version)['payload']
+                if payload is None:
+                    return create_json_response(
+                        status=status.HTTP_404_NOT_FOUND,
+                        message="Статистика недоступна"
+                    )
+                return create_json_response(payload)
+
+            return conditional_json_response(
+                request,
+                f"stats-{version}",
+                lambda: get_cached_statistics(self.render_statistics, version)
+            )
+
         except Exception as e:
             logger.error(f"Error fetching statistics: {str(e)}")
             return create_json_response(
@@ -251,6 +464,111 @@ class StatisticsView(APIView):
             )
 
 
+class StatisticsHistoryView(APIView):
+    """API endpoint for statistics snapshots history with downsampling"""
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            start = parse_moment(params['from']) if params.get('from') else None
+            end = parse_moment(params['to'], end_of_day=True) if params.get('to') else None
+            bucket = params.get('bucket', 'raw')
+            if bucket not in BUCKETS:
+                raise ValueError(f"bucket должен быть одним из: {', '.join(BUCKETS)}")
+            limit = int(params.get('limit', DEFAULT_LIMIT))
+            if not 1 <= limit <= MAX_LIMIT:
+                raise ValueError(f"limit должен быть от 1 до {MAX_LIMIT}")
+
+            items, next_cursor = statistics_history(
+                start=start, end=end, bucket=bucket, cursor=params.get('cursor'), limit=limit
+            )
+        except ValueError as e:
+            return create_json_response(
+                status=status.HTTP_400_BAD_REQUEST,
+                message=f"Некорректные параметры запроса: {str(e)}"
+            )
+        except Exception as e:
+            logger.error(f"Error fetching statistics history: {str(e)}", exc_info=True)
+            return create_json_response(
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                message="Ошибка при получении истории статистики"
+            )
+
+        next_url = None
+        if next_cursor:
+            query = params.copy()
+            query['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+        return create_json_response(
+            data={
+                'bucket': bucket,
+                'items': items,
+                'next_cursor': next_cursor,
+                'next': next_url
+            },
+            message=f"Снимков статистики: {len(items)}"
+        )
+
+
+class ImportJobView(APIView):
+    """API endpoint for XML import job progress"""
+
+    def get(self, request, pk):
+        try:
+            job = ImportJob.objects.get(pk=pk)
+        except ImportJob.DoesNotExist:
+            return create_json_response(
+                status=status.HTTP_404_NOT_FOUND,
+                message="Задача импорта не найдена"
+            )
+
+        return create_json_response(
+            data={
+                'job_id': job.id,
+                'status': job.status,
+                'source': job.source,
+                'rows_processed': job.rows_processed,
+                'errors': job.errors,
+                'bytes_processed': job.bytes_processed,
+                'total_bytes': job.total_bytes,
+                'throughput_rows_per_sec': job.throughput,
+                'eta_seconds': job.eta_seconds,
+                'results': job.results,
+                'error_message': job.error_message,
+                'created_at': job.created_at,
+                'started_at': job.started_at,
+                'updated_at': job.updated_at,
+                'finished_at': job.finished_at
+            },
+            message=f"Задача импорта #{job.id}: {job.status}"
+        )
+
+
+class WriteAckView(APIView):
+    """API endpoint for write-behind acknowledgement status"""
+
+    def get(self, request, ack_id):
+        try:
+            ack = get_write_queue().get_ack(ack_id)
+        except Exception as e:
+            logger.error(f"Error fetching write-behind ack {ack_id}: {str(e)}")
+            return create_json_response(
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                message="Очередь записи недоступна"
+            )
+
+        if ack is None:
+            return create_json_response(
+                status=status.HTTP_404_NOT_FOUND,
+                message="Подтверждение записи не найдено или устарело"
+            )
+        return create_json_response(
+            data={'ack_id': ack_id, **ack},
+            message=f"Запись {ack_id}: {ack['status']}"
+        )
+
+
 class APIRootView(APIView):
     def get(self, request):
         endpoints = {
@@ -14,7 +14,20 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.conf.beat_schedule = {
     'collect-stats-every-hour': {
         'task': 'cars_project.tasks.collect_and_save_stats',
-        'schedule': crontab(minute=0),  # каждый час в 0 минут
+        # каждый час в 0 минут; без изменений каталога расчет пропускается
+        'schedule': crontab(minute=0),
+    },
+    'compact-stats-every-night': {
+        'task': 'cars_project.tasks.compact_statistics',
+        'schedule': crontab(hour=3, minute=30),  # каждую ночь в 03:30
+    },
+    'drain-audit-queue': {
+        'task': 'cars_project.tasks.drain_audit_queue',
+        'schedule': 10.0,  # каждые 10 секунд, при AUDIT_ASYNC=False ничего не делает
+    },
+    'archive-audit-log': {
+        'task': 'cars_project.tasks.archive_audit_log',
+        'schedule': crontab(hour=4, minute=0),  # каждую ночь в 04:00
     },
 }
 
@@ -107,15 +107,51 @@ if 'flower' not in sys.argv:  # ← Проверка на запуск Flower
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'cars_statistics',
-        'USER': 'car_user',
-        'PASSWORD': '12345',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.getenv('DB_NAME', 'cars_statistics'),
+        'USER': os.getenv('DB_USER', 'car_user'),
+        'PASSWORD': os.getenv('DB_PASSWORD', '12345'),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
     }
 }
 
 
+# Кэш: Redis, если указан CACHE_REDIS_URL, иначе память процесса (разработка, тесты)
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Кэш ответа GET /api/statistics/ под версией из БД (последний снимок и версия каталога)
+STATISTICS_CACHE_ALIAS = 'default'
+STATISTICS_CACHE_TIMEOUT = int(os.getenv('STATISTICS_CACHE_TIMEOUT', '300'))  # секунды
+
+# Хранение снимков Statistic: полные снимки за последние N дней,
+# затем по одному на день, после STATISTICS_DAILY_RETENTION_DAYS - по одному на неделю
+STATISTICS_RAW_RETENTION_DAYS = int(os.getenv('STATISTICS_RAW_RETENTION_DAYS', '7'))
+STATISTICS_DAILY_RETENTION_DAYS = int(os.getenv('STATISTICS_DAILY_RETENTION_DAYS', '90'))
+
+# Пересчет статистики после изменений каталога: через QUIET секунд без изменений,
+# но не позже MAX_DELAY секунд после первого изменения серии. Серия изменений
+# отслеживается в кэше, поэтому нужен общий кэш (CACHE_REDIS_URL)
+STATISTICS_REFRESH_ON_CHANGE = os.getenv(
+    'STATISTICS_REFRESH_ON_CHANGE', 'True' if CACHE_REDIS_URL else 'False'
+) == 'True'
+STATISTICS_REFRESH_QUIET_SECONDS = int(os.getenv('STATISTICS_REFRESH_QUIET_SECONDS', '60'))
+STATISTICS_REFRESH_MAX_DELAY = int(os.getenv('STATISTICS_REFRESH_MAX_DELAY', '900'))
+
+
 # Celery configuration
 
 CELERY_CACHE_BACKEND = 'django-cache'
@@ -124,6 +160,41 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+
+# Отложенная запись одиночных JSON запросов POST /api/add/
+# (очередь сбрасывается порциями, клиент получает ack_id)
+CARS_WRITE_BEHIND = os.getenv('CARS_WRITE_BEHIND', 'False') == 'True'
+CARS_WRITE_BEHIND_BACKEND = os.getenv('CARS_WRITE_BEHIND_BACKEND', 'redis')  # redis | memory
+CARS_WRITE_BEHIND_REDIS_URL = os.getenv('CARS_WRITE_BEHIND_REDIS_URL', CELERY_BROKER_URL)
+CARS_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('CARS_WRITE_BEHIND_BATCH_SIZE', '500'))
+CARS_WRITE_BEHIND_MAX_WAIT = float(os.getenv('CARS_WRITE_BEHIND_MAX_WAIT', '0.2'))  # секунды
+# Имя потребителя Redis очереди: свой список обработки для каждого процесса run_write_coalescer,
+# постоянное между перезапусками (иначе порция упавшего процесса не будет обработана)
+CARS_WRITE_BEHIND_CONSUMER = os.getenv('CARS_WRITE_BEHIND_CONSUMER')
+
+# Блокировка периодических задач от перекрывающихся запусков (redis | memory)
+TASK_LOCK_BACKEND = os.getenv('TASK_LOCK_BACKEND', 'redis')
+TASK_LOCK_REDIS_URL = os.getenv('TASK_LOCK_REDIS_URL', CELERY_BROKER_URL)
+TASK_LOCK_TIMEOUT = int(os.getenv('TASK_LOCK_TIMEOUT', '1800'))  # секунды, TTL блокировки
+TASK_LOCK_WAIT = float(os.getenv('TASK_LOCK_WAIT', '5'))  # секунды ожидания перед объединением запуска
+
+# Асинхронный аудит: записи AuditLog уходят в очередь (redis | spool - файл SQLite),
+# которую разбирает задача drain_audit_queue
+AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'False') == 'True'
+AUDIT_QUEUE_BACKEND = os.getenv('AUDIT_QUEUE_BACKEND', 'redis')
+AUDIT_QUEUE_REDIS_URL = os.getenv('AUDIT_QUEUE_REDIS_URL', CELERY_BROKER_URL)
+AUDIT_SPOOL_PATH = os.getenv('AUDIT_SPOOL_PATH', str(BASE_DIR / 'audit_spool.sqlite3'))
+AUDIT_QUEUE_MAX_SIZE = int(os.getenv('AUDIT_QUEUE_MAX_SIZE', '1000000'))  # дальше - синхронная запись
+AUDIT_CONSUMER_BATCH_SIZE = int(os.getenv('AUDIT_CONSUMER_BATCH_SIZE', '5000'))
+AUDIT_CONSUMER_MAX_SECONDS = int(os.getenv('AUDIT_CONSUMER_MAX_SECONDS', '50'))
+AUDIT_LAG_WARNING_SECONDS = int(os.getenv('AUDIT_LAG_WARNING_SECONDS', '300'))
+
+# Журнал аудита на PostgreSQL секционирован по месяцам: разделы создаются заранее,
+# а старше AUDIT_RETENTION_MONTHS выгружаются задачей archive_audit_log в gzip NDJSON
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv('AUDIT_PARTITION_MONTHS_AHEAD', '3'))
+AUDIT_RETENTION_MONTHS = int(os.getenv('AUDIT_RETENTION_MONTHS', '12'))
+AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', str(BASE_DIR / 'audit_archive'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,96 +1,461 @@
 import json
+import os
 import time
+import uuid
+from xml.etree import ElementTree as ET
 
-from celery import shared_task
+from celery import chord, shared_task
 from celery.utils.log import get_task_logger
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 
-from cars import models
-from cars.models import (BodyType, Brand, Car, CarModel, Statistic)
+from cars.models import ImportJob, Statistic
+from cars.utils.audit_partitions import archive_partitions, ensure_partitions, partitioning_enabled
+from cars.utils.audit_queue import audit_queue_metrics, consume_audit_queue, get_audit_queue
+from cars.utils.audit_summary import AuditSummary, audit_summary, id_watermarks
+from cars.utils.bulk_import import CarBulkImporter, rows_seen, serialize_results
+from cars.utils.copy_import import PostgresCopyImporter
+from cars.utils.delta_import import DeltaCarImporter, file_digest, is_file_unchanged, record_imported_file
+from cars.utils.parallel_import import (can_use_process_pool, import_shard, merge_results,
+                                        run_parallel_import)
+from cars.utils.counters import get_catalog_version
+from cars.utils.statistics import COUNT_SECTIONS, compute_statistics, has_catalog_changes
+from cars.utils.statistics_retention import compact_statistics as compact_statistic_snapshots
+from cars.utils.stats_refresh import refresh_delay, start_statistics_refresh
+from cars.utils.task_lock import acquire_run, finish_run, get_task_lock, run_metrics
+from cars.utils.xml_stream import find_shard_ranges, iter_modifications
 
 
 logger = get_task_logger(__name__)
 
+STATISTICS_LOCK = 'collect_and_save_stats'
+AUDIT_CONSUMER_LOCK = 'drain_audit_queue'
+
 @shared_task(bind=True)
-def collect_and_save_stats(self):
-    """Сбор и сохранение статистики с подробным логированием"""
-    stats = {}
+def collect_and_save_stats(self, full=False):
+    """
+    Сбор и сохранение статистики с подробным логированием
+
+    Разделы читаются из счетчиков каталога. Если версия каталога не
+    менялась с расчета последнего снимка, новый снимок не создается
+    (full=True пересчитывает в любом случае). Время и ошибка каждого
+    раздела сохраняются в Statistic.sections, разделы с ошибкой в снимок
+    не попадают. Без общих счетчиков снимок не сохраняется.
+    """
     start_time = time.time()
+    # Запуски не перекрываются: пока идет расчет, новые запуски
+    # объединяются в один повторный после его окончания
+    lock_token = acquire_run(STATISTICS_LOCK, full=full)
+    if lock_token is None:
+        return {
+            'status': 'skipped',
+            'reason': 'already running, follow-up scheduled',
+            'lock_metrics': run_metrics(STATISTICS_LOCK)
+        }
 
     try:
-        # 1. Общая статистика
-        try:
-            stats['total_brands'] = Brand.objects.count()
-            stats['total_models'] = CarModel.objects.count()
-            stats['total_cars'] = Car.objects.count()
-            logger.info("Basic counts calculated successfully")
-        except Exception as e:
-            logger.error(f"Error calculating basic counts: {str(e)}")
-            raise
-
-        # 2. Распределение по типам кузова
-        body_stats = {}
-        try:
-            for bt in BodyType.objects.all():
-                try:
-                    count = Car.objects.filter(body_type=bt).count()
-                    body_stats[bt.name] = count
-                    logger.debug(f"Body type {bt.name} count: {count}")
-                except Exception as e:
-                    logger.error(f"Error counting body type {bt.name}: {str(e)}")
-                    body_stats[bt.name] = 'error'
-            stats['body_type_distribution'] = body_stats
-        except Exception as e:
-            logger.error(f"Error calculating body type stats: {str(e)}")
-            stats['body_type_distribution'] = 'error'
-
-        # 3. Топ брендов
-        try:
-            top_brands = []
-            for brand in Brand.objects.annotate(
-                    car_count=models.Count('carmodel__car')
-            ).order_by('-car_count')[:5]:
-                try:
-                    brand_data = {
-                        'name': brand.name,
-                        'model_count': brand.carmodel_set.count(),
-                        'car_count': brand.car_count
-                    }
-                    top_brands.append(brand_data)
-                    logger.debug(f"Processed brand {brand.name}")
-                except Exception as e:
-                    logger.error(f"Error processing brand {brand.name}: {str(e)}")
-            stats['top_brands'] = top_brands
-        except Exception as e:
-            logger.error(f"Error calculating top brands: {str(e)}")
-            stats['top_brands'] = 'error'
-
-        # 4. Сохранение статистики
-        try:
-            with transaction.atomic():
-                stat_record = Statistic.objects.create(
-                    json_statistics=stats,
-                    date_calculated=timezone.now()
-                )
-                logger.info(f"Statistics saved with ID {stat_record.id}")
-
-            execution_time = time.time() - start_time
-            logger.info(f"Statistics collection completed in {execution_time:.2f} seconds")
+        # Версия читается до расчета: изменение, зафиксированное во время
+        # расчета, оставит снимок со старой версией и не будет пропущено
+        catalog_version = get_catalog_version()
+        latest = Statistic.objects.order_by('-date_calculated', '-id').first()
+        if not full and latest is not None and not has_catalog_changes(latest):
+            logger.info(f"Catalog unchanged since snapshot {latest.id}, statistics not recalculated")
+            return {
+                'status': 'skipped',
+                'reason': 'no catalog changes',
+                'statistics_id': latest.id
+            }
+
+        # Разделы - несколько запросов к счетчикам, их рассылка по воркерам
+        # стоила бы дороже самого расчета
+        sections = {}
+        stats = compute_statistics(fail_soft=True, report=sections)
+
+        failed = [name for name, report in sections.items() if report['status'] == 'error']
+        if failed:
+            logger.error(f"Statistics sections failed: {', '.join(failed)}")
 
+        missing = [name for name in COUNT_SECTIONS if name not in stats]
+        if missing:
+            error = f"basic counts unavailable: {', '.join(missing)}"
+            logger.critical(f"Statistics collection failed: {error}")
             return {
-                'status': 'success',
-                'execution_time': execution_time,
-                'statistics_id': stat_record.id
+                'status': 'error',
+                'error': error,
+                'sections': sections
             }
 
-        except Exception as e:
-            logger.error(f"Error saving statistics: {str(e)}")
-            raise
+        return _save_statistics(stats, sections, start_time, catalog_version)
 
     except Exception as e:
         logger.critical(f"Statistics collection failed: {str(e)}")
         return {
             'status': 'error',
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+    finally:
+        _finish_statistics_run(lock_token)
+
+
+@shared_task(bind=True)
+def refresh_statistics(self):
+    """Отложенный пересчет статистики после серии изменений каталога"""
+    delay = refresh_delay()
+    if delay > 0 and not self.request.is_eager:
+        # Изменения еще идут: ждем тишины
+        self.apply_async(countdown=delay)
+        return {'status': 'postponed', 'countdown': delay}
+
+    start_statistics_refresh()
+    return collect_and_save_stats()
+
+
+def _finish_statistics_run(lock_token):
+    """Освобождает блокировку расчета и запускает объединенный повторный расчет"""
+    try:
+        follow_up = finish_run(STATISTICS_LOCK, lock_token)
+    except Exception as e:
+        # Блокировка истечет сама по таймауту
+        logger.error(f"Failed to release statistics lock: {str(e)}")
+        return
+    if follow_up is not None:
+        logger.info(f"Running coalesced statistics follow-up (full={follow_up['full']})")
+        collect_and_save_stats.apply_async(kwargs={'full': follow_up['full']})
+
+
+def _save_statistics(stats, sections, start_time, catalog_version=None):
+    """Сохраняет снимок статистики вместе с отчетом по разделам"""
+    try:
+        with transaction.atomic():
+            stat_record = Statistic.objects.create(
+                json_statistics=stats,
+                date_calculated=timezone.now(),
+                catalog_version=catalog_version,
+                sections=sections
+            )
+            logger.info(f"Statistics saved with ID {stat_record.id}")
+    except Exception as e:
+        logger.error(f"Error saving statistics: {str(e)}")
+        raise
+
+    execution_time = time.time() - start_time
+    logger.info(f"Statistics collection completed in {execution_time:.2f} seconds")
+
+    return {
+        'status': 'success',
+        'execution_time': execution_time,
+        'statistics_id': stat_record.id,
+        'failed_sections': [name for name, report in sections.items() if report['status'] == 'error']
+    }
+
+
+@shared_task(bind=True)
+def compact_statistics(self):
+    """Прореживание старых снимков статистики с отчетом об освобожденном объеме"""
+    start_time = time.time()
+    try:
+        report = compact_statistic_snapshots()
+    except Exception as e:
+        logger.error(f"Statistics compaction failed: {str(e)}")
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+    execution_time = time.time() - start_time
+    logger.info(
+        f"Statistics compaction completed in {execution_time:.2f} seconds: "
+        f"{report['rows_deleted']} deleted, {report['rows_rolled_up']} rolled up, "
+        f"{report['rows_delta_encoded']} delta encoded, {report['bytes_reclaimed']} bytes reclaimed"
+    )
+    return {
+        'status': 'success',
+        'execution_time': execution_time,
+        **report
+    }
+
+
+
+@shared_task(bind=True)
+def drain_audit_queue(self):
+    """Перенос записей аудита из очереди в AuditLog (режим AUDIT_ASYNC)"""
+    if not settings.AUDIT_ASYNC:
+        return {'status': 'skipped', 'reason': 'AUDIT_ASYNC is disabled'}
+
+    # Один потребитель за раз: порции читаются с головы очереди
+    lock = get_task_lock()
+    token = uuid.uuid4().hex
+    if not lock.acquire(AUDIT_CONSUMER_LOCK, token, settings.AUDIT_CONSUMER_MAX_SECONDS * 2):
+        return {'status': 'skipped', 'reason': 'consumer already running'}
+
+    try:
+        audit_queue = get_audit_queue()
+        result = consume_audit_queue(audit_queue)
+        metrics = audit_queue_metrics(audit_queue)
+    except Exception as e:
+        logger.error(f"Audit queue drain failed: {str(e)}")
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+    finally:
+        lock.release(AUDIT_CONSUMER_LOCK, token)
+
+    if result['written']:
+        logger.info(f"Audit queue: {result['written']} entries written in {result['batches']} batches, "
+                    f"depth {metrics['depth']}")
+    if metrics['oldest_age_seconds'] > settings.AUDIT_LAG_WARNING_SECONDS:
+        logger.warning(f"Audit consumer is falling behind: oldest entry waits "
+                       f"{metrics['oldest_age_seconds']:.0f} seconds, depth {metrics['depth']}")
+    return {
+        'status': 'success',
+        **result,
+        'metrics': metrics
+    }
+
+
+@shared_task(bind=True)
+def archive_audit_log(self):
+    """Создание разделов журнала аудита вперед и архивация старых месяцев в файлы"""
+    if not partitioning_enabled():
+        return {'status': 'skipped', 'reason': 'audit log is not partitioned'}
+
+    try:
+        created = ensure_partitions()
+        archived = archive_partitions()
+    except Exception as e:
+        logger.error(f"Audit log archival failed: {str(e)}")
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+    if archived:
+        logger.info(f"Audit log: archived {len(archived)} months, "
+                    f"{sum(item['rows'] for item in archived)} rows")
+    return {
+        'status': 'success',
+        'partitions_created': created,
+        'archived': archived
+    }
+
+
+def _update_job(job_id, **fields):
+    ImportJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **fields)
+
+
+def _finish_job(job_id, results, error=None, **fields):
+    """Сохраняет итоговые счетчики и статус задачи импорта"""
+    if error is not None:
+        fields['error_message'] = str(error)
+    _update_job(
+        job_id,
+        status='failed' if error is not None else 'success',
+        finished_at=timezone.now(),
+        rows_processed=rows_seen(results),
+        errors=results['errors'],
+        results=serialize_results(results),
+        **fields
+    )
+
+
+def _remember_file(job, results):
+    """Сохраняет хэш файла после дельта-импорта без ошибок"""
+    if job.file_sha256 and not results['errors']:
+        record_imported_file(job.source, job.file_sha256, job)
+
+
+@shared_task(bind=True)
+def import_cars_from_xml(self, job_id):
+    """Импорт автомобилей из XML файла порциями с сохранением прогресса в ImportJob"""
+    job = ImportJob.objects.get(pk=job_id)
+    start_time = time.time()
+    chunk_size = job.options.get('chunk_size', CarBulkImporter.DEFAULT_CHUNK_SIZE)
+    shards = int(job.options.get('shards') or 1)
+    delta = bool(job.options.get('delta'))
+    total_bytes = os.path.getsize(job.source) if os.path.exists(job.source) else None
+
+    _update_job(
+        job_id,
+        status='running',
+        started_at=timezone.now(),
+        total_bytes=total_bytes,
+        celery_task_id=self.request.id or ''
+    )
+    logger.info(f"Import job {job_id} started for {job.source}")
+
+    if delta:
+        # Неизменившийся файл пропускается целиком
+        job.file_sha256 = file_digest(job.source)
+        _update_job(job_id, file_sha256=job.file_sha256)
+        if is_file_unchanged(job.source, job.file_sha256):
+            results = DeltaCarImporter().results
+            results['file_unchanged'] = True
+            _finish_job(job_id, results, bytes_processed=total_bytes or 0)
+            logger.info(f"Import job {job_id}: {job.source} unchanged since last import, skipped")
+            return {'status': 'skipped', 'job_id': job_id, 'file_sha256': job.file_sha256}
+
+    if job.options.get('engine') == 'copy':
+        return _import_with_copy(job, total_bytes, start_time)
+
+    if shards > 1:
+        if job.options.get('parallel') == 'process' and can_use_process_pool():
+            return _import_with_process_pool(job, shards, chunk_size, total_bytes, start_time)
+        return _dispatch_sharded_import(job, shards, chunk_size)
+
+    progress = {'bytes': 0}
+
+    def checkpoint(results):
+        # Список брендов сохраняется только в итоговых результатах
+        snapshot = {k: v for k, v in results.items() if k != 'processed_brands'}
+        snapshot['brands_count'] = len(results['processed_brands'])
+        _update_job(
+            job_id,
+            rows_processed=rows_seen(results),
+            errors=results['errors'],
+            bytes_processed=progress['bytes'],
+            results=snapshot
+        )
+
+    def track_bytes(bytes_read):
+        progress['bytes'] = bytes_read
+
+    importer_class = DeltaCarImporter if delta else CarBulkImporter
+    importer = importer_class(chunk_size=chunk_size, on_chunk=checkpoint)
+    results = importer.results
+
+    try:
+        # Одна сводная запись аудита вместо записи на каждый бренд и тип кузова
+        with audit_summary(job.source, job_id=job_id) as summary:
+            summary.results = results
+            importer.import_records(iter_modifications(job.source, progress=track_bytes, digest=delta))
+    except Exception as e:
+        if isinstance(e, ET.ParseError):
+            logger.error(f"Import job {job_id}: XML parsing error: {str(e)}")
+        else:
+            logger.critical(f"Import job {job_id} failed: {str(e)}")
+        _finish_job(job_id, results, error=e, bytes_processed=progress['bytes'])
+        return {'status': 'error', 'job_id': job_id, 'error': str(e)}
+
+    execution_time = time.time() - start_time
+    _finish_job(job_id, results, bytes_processed=progress['bytes'])
+    _remember_file(job, results)
+    logger.info(f"Import job {job_id} completed in {execution_time:.2f} seconds. Stats: {results}")
+
+    return {
+        'status': 'success',
+        'job_id': job_id,
+        'execution_time': execution_time,
+        'cars_processed': results['cars_processed']
+    }
+
+
+def _import_with_copy(job, total_bytes, start_time):
+    """Загрузка через COPY в staging таблицу PostgreSQL"""
+    importer = PostgresCopyImporter()
+    try:
+        with audit_summary(job.source, job_id=job.id) as summary:
+            summary.results = importer.results
+            importer.import_records(iter_modifications(job.source))
+    except Exception as e:
+        # Импорт выполняется одной транзакцией, поэтому изменения откачены
+        logger.critical(f"Import job {job.id} failed in COPY engine: {str(e)}")
+        _update_job(job.id, status='failed', finished_at=timezone.now(), error_message=str(e))
+        return {'status': 'error', 'job_id': job.id, 'error': str(e)}
+
+    execution_time = time.time() - start_time
+    _finish_job(job.id, importer.results, bytes_processed=total_bytes or 0)
+    logger.info(f"Import job {job.id} completed in {execution_time:.2f} seconds. Stats: {importer.results}")
+
+    return {
+        'status': 'success',
+        'job_id': job.id,
+        'execution_time': execution_time,
+        'cars_processed': importer.results['cars_processed']
+    }
+
+
+def _import_with_process_pool(job, shards, chunk_size, total_bytes, start_time):
+    """Параллельный импорт шардов в локальном пуле процессов"""
+    try:
+        with audit_summary(job.source, job_id=job.id) as summary:
+            results = run_parallel_import(
+                job.source, shards, job.id, chunk_size, delta=bool(job.options.get('delta'))
+            )
+            summary.results = results
+    except Exception as e:
+        logger.critical(f"Import job {job.id} failed in process pool: {str(e)}")
+        _update_job(job.id, status='failed', finished_at=timezone.now(), error_message=str(e))
+        return {'status': 'error', 'job_id': job.id, 'error': str(e)}
+
+    execution_time = time.time() - start_time
+    _finish_job(job.id, results, bytes_processed=total_bytes or 0)
+    _remember_file(job, results)
+    logger.info(f"Import job {job.id} completed in {execution_time:.2f} seconds. Stats: {results}")
+
+    return {
+        'status': 'success',
+        'job_id': job.id,
+        'execution_time': execution_time,
+        'cars_processed': results['cars_processed']
+    }
+
+
+def _dispatch_sharded_import(job, shards, chunk_size):
+    """Запускает шарды как Celery chord с объединением результатов в конце"""
+    try:
+        ranges = find_shard_ranges(job.source, shards)
+        delta = bool(job.options.get('delta'))
+        header = [import_xml_shard.s(job.id, start, end, chunk_size, delta) for start, end in ranges]
+        # Границы id снимаются до запуска шардов, сводку аудита пишет callback
+        chord(header)(finish_sharded_import.s(job.id, id_watermarks()))
+    except Exception as e:
+        # Иначе задача осталась бы в статусе running: callback chord не запустится
+        logger.critical(f"Import job {job.id} failed to dispatch shards: {str(e)}")
+        _update_job(job.id, status='failed', finished_at=timezone.now(), error_message=str(e))
+        return {'status': 'error', 'job_id': job.id, 'error': str(e)}
+
+    logger.info(f"Import job {job.id} dispatched as {len(ranges)} shards")
+    return {'status': 'dispatched', 'job_id': job.id, 'shards': len(ranges)}
+
+
+@shared_task(bind=True)
+def import_xml_shard(self, job_id, start, end, chunk_size=CarBulkImporter.DEFAULT_CHUNK_SIZE, delta=False):
+    """Импорт одного шарда XML файла (диапазона байтов с элементами <Modification>)"""
+    job = ImportJob.objects.get(pk=job_id)
+    try:
+        return import_shard(job.source, start, end, job_id, chunk_size, delta)
+    except Exception as e:
+        # Ошибка возвращается в результате, чтобы callback chord все равно выполнился
+        logger.error(f"Import job {job_id}: shard {start}-{end} failed: {str(e)}")
+        return {'error': str(e), 'start': start, 'end': end}
+
+
+@shared_task(bind=True)
+def finish_sharded_import(self, shard_results, job_id, audit_since=None):
+    """Объединяет результаты шардов и завершает задачу импорта"""
+    failed = [result for result in shard_results if 'error' in result]
+    results = merge_results(result for result in shard_results if 'error' not in result)
+
+    error = None
+    if failed:
+        error = '; '.join(f"shard {r['start']}-{r['end']}: {r['error']}" for r in failed)
+        logger.critical(f"Import job {job_id}: {len(failed)} of {len(shard_results)} shards failed")
+
+    job = ImportJob.objects.get(pk=job_id)
+    _finish_job(job_id, results, error=error, bytes_processed=job.total_bytes or 0)
+    if audit_since is not None:
+        summary = AuditSummary(job.source, job_id=job_id, since=audit_since)
+        summary.results = results
+        summary.write(error=error)
+    if not failed:
+        _remember_file(job, results)
+    logger.info(f"Import job {job_id} merged {len(shard_results)} shards. Stats: {results}")
+
+    return {
+        'status': 'error' if failed else 'success',
+        'job_id': job_id,
+        'cars_processed': results['cars_processed']
+    }